@@ -3,21 +3,25 @@
 import os
 import re
 import json
+import shutil
 import asyncio
 from datetime import datetime, timezone
 from argparse import ArgumentError, ArgumentParser, Namespace
-from typing import Dict, Set, Optional, cast
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple, cast
 
 import shtab
 import tqdm  # type: ignore
 
 from redbrick.config import config
 from redbrick.cli.project import CLIProject
+from redbrick.cli.entity import CLITaskStore
 from redbrick.cli.cli_base import CLIExportInterface
 from redbrick.common.constants import MAX_FILE_BATCH_SIZE
 from redbrick.types.taxonomy import Taxonomy
 from redbrick.utils.async_utils import gather_with_concurrency
-from redbrick.utils.logging import assert_validation, logger
+from redbrick.utils.common_utils import hash_sha256
+from redbrick.utils.files import JSONStreamWriter
+from redbrick.utils.logging import assert_validation, log_error, logger
 
 
 class CLIExportController(CLIExportInterface):
@@ -150,152 +154,249 @@ class CLIExportController(CLIExportInterface):
             else not self.project.project.consensus_enabled
         )
 
-        cached_tasks: Set[str] = set()
-        cache_timestamp = None
-        dp_conf = self.project.conf.get_section("datapoints")
-        if dp_conf and "timestamp" in dp_conf:
-            cached_tasks = set(
-                self.project.cache.get_data("tasks", dp_conf["cache"]) or []
+        with self.project.cache.task_store() as store:
+            cache_timestamp = None
+            sync_token = None
+            dp_conf = self.project.conf.get_section("datapoints")
+            if dp_conf and "timestamp" in dp_conf:
+                if "cache" in dp_conf:  # Migration from per-file entities
+                    cached_tasks = self.project.cache.get_data(
+                        "tasks", dp_conf["cache"]
+                    )
+                    if isinstance(cached_tasks, list):
+                        self.project.cache.migrate_entities(cached_tasks, store)
+                        self.project.cache.remove_data("tasks")
+                    cached_dps = self.project.cache.get_data(
+                        "datapoints", dp_conf["cache"]
+                    )
+                    if isinstance(cached_dps, dict):
+                        store.set_tasks(
+                            {**cached_dp, "taskId": task_id}
+                            for task_id, cached_dp in cached_dps.items()
+                        )
+                        self.project.cache.remove_data("datapoints")
+                if len(store):
+                    cache_timestamp = int(dp_conf["timestamp"]) or None
+                    sync_token = dp_conf.get("sync_token") or None
+
+            current_timestamp = int(datetime.now(timezone.utc).timestamp())
+            datapoint_count = self.project.project.context.export.datapoints_in_project(
+                self.project.project.org_id, self.project.project.project_id, None
             )
-            if cached_tasks:
-                cache_timestamp = int(dp_conf["timestamp"]) or None
-            else:  # Migration
-                cached_dps = self.project.cache.get_data("datapoints", dp_conf["cache"])
-                if cached_dps:
-                    for task_id, cached_dp in (
-                        cached_dps if isinstance(cached_dps, dict) else {}
-                    ).items():
-                        cached_tasks.add(task_id)
-                        self.project.cache.set_entity(task_id, cached_dp)
-                    self.project.cache.remove_data("datapoints")
-
-        current_timestamp = int(datetime.now(timezone.utc).timestamp())
-        datapoint_count = self.project.project.context.export.datapoints_in_project(
-            self.project.project.org_id, self.project.project.project_id, None
-        )
-        datapoints = self.project.project.export._get_raw_data_latest(
-            self.args.concurrency,
-            None,
-            cache_timestamp,
-            False,
-            not no_consensus,
-        )
-        fetched = 0
-        with tqdm.tqdm(
-            datapoints,
-            unit=" datapoints",
-            total=datapoint_count,
-            leave=config.log_info,
-        ) as progress:
-            for task in progress:
-                cached_tasks.add(task["taskId"])
-                self.project.cache.set_entity(task["taskId"], task)
-                fetched += 1
-            try:
-                disable = progress.disable
-                progress.disable = False
-                progress.update(datapoint_count - progress.n)
-                progress.disable = disable
-            except Exception:  # pylint: disable=broad-except
-                pass
-
-        logger.info(f"Refreshed {fetched} newly updated tasks")
-
-        cache_hash = self.project.cache.set_data("tasks", list(cached_tasks))
-        self.project.conf.set_section(
-            "datapoints",
-            {
+            datapoints = self.project.project.export._get_raw_data_latest(
+                self.args.concurrency,
+                None,
+                cache_timestamp,
+                False,
+                not no_consensus,
+                None,
+                sync_token,
+            )
+            with tqdm.tqdm(
+                datapoints,
+                unit=" datapoints",
+                total=datapoint_count,
+                leave=config.log_info,
+            ) as progress:
+                fetched = store.set_tasks(progress)
+                try:
+                    disable = progress.disable
+                    progress.disable = False
+                    progress.update(datapoint_count - progress.n)
+                    progress.disable = disable
+                except Exception:  # pylint: disable=broad-except
+                    pass
+
+            logger.info(f"Refreshed {fetched} newly updated tasks")
+
+            # Deletions show up as extra cached tasks, unless hidden by new ones
+            if fetched or len(store) != datapoint_count:
+                try:
+                    removed = self._remove_deleted_tasks(store)
+                    logger.info(f"Removed {removed} deleted tasks from cache")
+                except Exception as error:  # pylint: disable=broad-except
+                    log_error(f"Failed to remove deleted tasks from cache: {error}")
+
+            dp_section = {
                 "timestamp": str(
                     current_timestamp if fetched else (cache_timestamp or 0)
                 ),
-                "cache": cache_hash,
-            },
-        )
-        self.project.conf.save()
-
-        export_dir = self.args.destination
-        os.makedirs(export_dir, exist_ok=True)
-
-        semantic_mask = bool(self.args.semantic)
-        binary_mask = (
-            True
-            if bool(self.args.binary_mask)
-            else False if bool(self.args.single_mask) else None
-        )
-        old_format = bool(self.args.old_format)
-        with_files = bool(self.args.with_files)
-        without_masks = bool(self.args.without_masks)
-        png_mask = bool(self.args.png)
-        rt_struct = bool(self.args.rt_struct)
-        dicom_to_nifti = bool(self.args.dicom_to_nifti)
-
-        task_file = os.path.join(export_dir, "tasks.json")
-
-        image_dir: Optional[str] = None
-        if with_files or rt_struct:
-            image_dir = os.path.join(export_dir, "images")
-            os.makedirs(image_dir, exist_ok=True)
-
-        segmentation_dir: Optional[str] = None
-        if not without_masks:
-            segmentation_dir = os.path.join(export_dir, "segmentations")
-            os.makedirs(segmentation_dir, exist_ok=True)
-
-        class_file = os.path.join(export_dir, "class_map.json")
-        coloured_png = png_mask and not binary_mask
-        class_map, color_map = self.project.project.export.preprocess_export(
-            self.project.project.taxonomy, coloured_png
-        )
-
-        if os.path.isfile(task_file):
-            os.remove(task_file)
+            }
+            # Prefer the server-issued watermark, which is immune to local clock skew
+            sync_token = self.project.project.export.sync_token or sync_token
+            if sync_token:
+                dp_section["sync_token"] = sync_token
+            self.project.conf.set_section("datapoints", dp_section)
+            self.project.conf.save()
+
+            export_dir = self.args.destination
+            os.makedirs(export_dir, exist_ok=True)
+            destination = os.path.abspath(export_dir)
+
+            semantic_mask = bool(self.args.semantic)
+            binary_mask = (
+                True
+                if bool(self.args.binary_mask)
+                else False if bool(self.args.single_mask) else None
+            )
+            old_format = bool(self.args.old_format)
+            with_files = bool(self.args.with_files)
+            without_masks = bool(self.args.without_masks)
+            png_mask = bool(self.args.png)
+            rt_struct = bool(self.args.rt_struct)
+            dicom_to_nifti = bool(self.args.dicom_to_nifti)
+
+            task_file = os.path.join(export_dir, "tasks.json")
+
+            image_dir: Optional[str] = None
+            if with_files or rt_struct:
+                image_dir = os.path.join(export_dir, "images")
+                os.makedirs(image_dir, exist_ok=True)
+
+            segmentation_dir: Optional[str] = None
+            if not without_masks:
+                segmentation_dir = os.path.join(export_dir, "segmentations")
+                os.makedirs(segmentation_dir, exist_ok=True)
+
+            class_file = os.path.join(export_dir, "class_map.json")
+            coloured_png = png_mask and not binary_mask
+            class_map, color_map = self.project.project.export.preprocess_export(
+                self.project.project.taxonomy, coloured_png
+            )
 
-        asyncio.run(
-            gather_with_concurrency(
-                min(self.args.concurrency, MAX_FILE_BATCH_SIZE),
-                [
-                    self._process_task(
-                        cached_task,
-                        self.project.project.taxonomy,
-                        task_file,
-                        image_dir,
-                        segmentation_dir,
+            # Tasks are re-exported only when their signature under these options changes
+            options_hash = hash_sha256(
+                json.dumps(
+                    [
                         semantic_mask,
                         binary_mask,
                         old_format,
-                        no_consensus,
-                        color_map,
-                        dicom_to_nifti,
+                        with_files,
+                        without_masks,
                         png_mask,
                         rt_struct,
-                    )
-                    for cached_task in cached_tasks
-                ],
-                "Processing labels",
+                        dicom_to_nifti,
+                        no_consensus,
+                        self.project.project.taxonomy,
+                        [
+                            stage.stage_name
+                            for stage in self.project.project.export.review_stages
+                        ],
+                    ],
+                    sort_keys=True,
+                )
             )
-        )
 
-        if not os.path.isfile(task_file):
-            with open(task_file, "w", encoding="utf-8") as task_file_:
-                task_file_.write("[]")
-
-        if segmentation_dir:
-            logger.info(f"Exported segmentations to: {segmentation_dir}")
-        if image_dir:
-            logger.info(f"Exported images to: {image_dir}")
-        logger.info(f"Exported: {task_file}")
+            async def _process_tasks() -> List[None]:
+                # Keep one connection pool alive across all processed tasks
+                async with self.project.project.context.client.aio_session():
+                    return await gather_with_concurrency(
+                        min(self.args.concurrency, MAX_FILE_BATCH_SIZE),
+                        [
+                            self._process_task(
+                                store,
+                                destination,
+                                cached_task,
+                                self.project.project.taxonomy,
+                                options_hash,
+                                image_dir,
+                                segmentation_dir,
+                                semantic_mask,
+                                binary_mask,
+                                old_format,
+                                no_consensus,
+                                color_map,
+                                dicom_to_nifti,
+                                png_mask,
+                                rt_struct,
+                            )
+                            for cached_task in self._selected_tasks(store)
+                        ],
+                        "Processing labels",
+                    )
 
-        if coloured_png:
-            with open(class_file, "w", encoding="utf-8") as classes_file:
-                json.dump(class_map, classes_file, indent=2)
+            asyncio.run(_process_tasks())
+
+            # Drop outputs of tasks deleted from the project; filtered ones are kept
+            for task_id in list(store.export_ids(destination)):
+                if task_id not in store:
+                    directory = store.remove_export(destination, task_id)
+                    if directory:
+                        self._remove_task_dirs(
+                            destination, directory, ("segmentations", "images")
+                        )
+
+            with JSONStreamWriter(task_file) as task_writer:
+                for output in store.iter_exports(
+                    destination, self._selected_tasks(store)
+                ):
+                    task_writer.write(output)
+
+            if segmentation_dir:
+                logger.info(f"Exported segmentations to: {segmentation_dir}")
+            if image_dir:
+                logger.info(f"Exported images to: {image_dir}")
+            logger.info(f"Exported: {task_file}")
+
+            if coloured_png:
+                with open(class_file, "w", encoding="utf-8") as classes_file:
+                    json.dump(class_map, classes_file, indent=2)
+
+                logger.info(f"Exported: {class_file}")
+
+    def _remove_deleted_tasks(self, store: CLITaskStore) -> int:
+        """Evict cached tasks that no longer exist in the project."""
+        # pylint: disable=protected-access
+        live_tasks = set(self.project.project.export._get_task_ids())
+        return store.remove_tasks(
+            [task_id for task_id in store.task_ids() if task_id not in live_tasks]
+        )
 
-            logger.info(f"Exported: {class_file}")
+    def _selected_tasks(self, store: CLITaskStore) -> Iterator[str]:
+        """Get ids of cached tasks selected by the export type and stage."""
+        if self.args.type == self.TYPE_LATEST:
+            return store.task_ids(stage_name=self.args.stage or None)
+        if self.args.type == self.TYPE_GROUNDTRUTH:
+            return store.task_ids(stage_name="END")
+        return store.task_ids(task_id=self.args.type.strip().lower())
+
+    @staticmethod
+    def _remove_task_dirs(
+        destination: str,
+        directory: str,
+        parents: Tuple[str, ...] = ("segmentations",),
+    ) -> None:
+        """Delete a task's exported artifacts, never leaving the destination."""
+        for parent in parents:
+            parent_dir = os.path.join(destination, parent)
+            path = os.path.normpath(os.path.join(parent_dir, directory))
+            if os.path.dirname(path) == parent_dir:
+                shutil.rmtree(path, ignore_errors=True)
+
+    @staticmethod
+    def _exported_files(destination: str, output: Any) -> List[str]:
+        """Get paths, relative to destination, of the exported files an output refers to."""
+        files: Set[str] = set()
+        values = [output]
+        while values:
+            value = values.pop()
+            if isinstance(value, dict):
+                values.extend(value.values())
+            elif isinstance(value, list):
+                values.extend(value)
+            elif isinstance(value, str) and value:
+                path = os.path.relpath(os.path.abspath(value), destination)
+                if path.split(os.sep, 1)[0] in ("segmentations", "images"):
+                    files.add(path)
+        return sorted(files)
 
     async def _process_task(
         self,
+        store: CLITaskStore,
+        destination: str,
         cached_task: str,
         taxonomy: Taxonomy,
-        task_file: Optional[str],
+        options_hash: str,
         image_dir: Optional[str],
         segmentation_dir: Optional[str],
         semantic_mask: bool,
@@ -307,31 +408,47 @@ class CLIExportController(CLIExportInterface):
         png_mask: bool,
         rt_struct: bool,
     ) -> None:
-        # pylint: disable=too-many-locals, too-many-boolean-expressions
-        task: Dict = self.project.cache.get_entity(cached_task)  # type: ignore
+        # pylint: disable=too-many-locals
+        task = store.get_task(cached_task)
+        if task is None:
+            return
 
-        if (
-            (
-                self.args.type == self.TYPE_LATEST
-                and self.args.stage
-                and task["currentStageName"].lower() != self.args.stage.lower()
-            )
-            or (
-                self.args.type == self.TYPE_GROUNDTRUTH
-                and task["currentStageName"].lower() != "end"
+        signature = hash_sha256(
+            json.dumps(
+                [
+                    options_hash,
+                    task.get("name"),
+                    task.get("currentStageName"),
+                    task.get("updatedAt"),
+                    [
+                        [
+                            label_map.get("labelName") if label_map else None
+                            for label_map in (task_.get("labelsMap") or [])
+                        ]
+                        for task_ in [task] + (task.get("consensusTasks") or [])
+                    ],
+                ]
             )
-            or (
-                self.args.type != self.TYPE_LATEST
-                and self.args.type != self.TYPE_GROUNDTRUTH
-                and task["taskId"] != self.args.type.strip().lower()
+        )
+        export = store.get_export(destination, task["taskId"])
+        # Files removed since the last export are written again
+        if (
+            export
+            and export[0] == signature
+            and all(
+                os.path.exists(os.path.join(destination, path)) for path in export[2]
             )
         ):
             return
+        if export:
+            directory = store.remove_export(destination, task["taskId"])
+            if directory:
+                self._remove_task_dirs(destination, directory)
 
-        await self.project.project.export.export_nifti_label_data(
+        output = await self.project.project.export.export_nifti_label_data(
             task,
             taxonomy,
-            task_file,
+            None,
             image_dir,
             segmentation_dir,
             semantic_mask,
@@ -342,5 +459,13 @@ class CLIExportController(CLIExportInterface):
             dicom_to_nifti,
             png_mask,
             rt_struct,
-            False,
+            True,
+        )
+        store.set_export(
+            destination,
+            task["taskId"],
+            signature,
+            self.project.project.export.task_dir_name(task),
+            self._exported_files(destination, output),
+            cast(Dict, output),
         )
@@ -1,13 +1,13 @@
 """CLI report command."""
 
 import os
-import json
 from datetime import datetime
 from argparse import ArgumentError, ArgumentParser, Namespace
 from typing import cast
 
 from redbrick.cli.project import CLIProject
 from redbrick.cli.cli_base import CLIReportInterface
+from redbrick.utils.files import JSONStreamWriter
 from redbrick.utils.logging import assert_validation, logger
 
 
@@ -50,24 +50,8 @@ class CLIIReportController(CLIReportInterface):
         )
 
         report_file = os.path.abspath(f"report-{int(datetime.now().timestamp())}.json")
-        if os.path.isfile(report_file):
-            os.remove(report_file)
-
-        for idx, report in enumerate(reports):
-            if idx == 0:
-                with open(report_file, "wb") as report_file_:
-                    report_file_.write(
-                        b"[" + json.dumps(report, indent=2).encode("utf-8") + b"]"
-                    )
-            else:
-                with open(report_file, "rb+") as report_file_:
-                    report_file_.seek(-1, 2)
-                    report_file_.write(
-                        b"," + json.dumps(report, indent=2).encode("utf-8") + b"]"
-                    )
-
-        if not os.path.isfile(report_file):
-            with open(report_file, "w", encoding="utf-8") as report_file_:
-                report_file_.write("[]")
+        with JSONStreamWriter(report_file) as report_writer:
+            for report in reports:
+                report_writer.write(report)
 
         logger.info(f"Exported successfully to: {report_file}")
@@ -12,7 +12,8 @@ from redbrick.cli.project import CLIProject
 from redbrick.cli.cli_base import CLIUploadInterface
 from redbrick.common.enums import StorageMethod, ImportTypes
 from redbrick.utils.logging import assert_validation, logger
-from redbrick.utils.files import find_files_recursive
+from redbrick.utils.files import find_files_recursive, iter_files_recursive
+from redbrick.utils.upload import UploadJournal
 from redbrick.types.task import InputTask
 
 
@@ -109,6 +110,18 @@ but may increase the upload time.""",
 
         self.handle_upload()
 
+    async def _find_items(self, directory: str, import_file_type: str) -> List[Dict]:
+        """Generate items from files in directory, while it is being searched."""
+        return [
+            item
+            async for item in self.project.project.upload.iter_items_list(
+                iter_files_recursive(directory, set(["*"])),
+                import_file_type,
+                self.args.as_study,
+                self.args.concurrency,
+            )
+        ]
+
     def handle_upload(self) -> None:  # noqa: ignore=C901
         """Handle empty sub command."""
         # pylint: disable=protected-access, too-many-branches, too-many-locals, too-many-statements
@@ -156,11 +169,18 @@ but may increase the upload time.""",
         items_list: Union[List[List[str]], List[Dict]]
         if self.args.json and directory.endswith(".json") and os.path.isfile(directory):
             items_list = [[os.path.abspath(directory)]]
+        elif self.args.json:
+            logger.info(f"Searching for items recursively in {directory}")
+            items_list = find_files_recursive(directory, set(["json"]))
         else:
+            import_file_type = CLIInputSelect(
+                self.args.type,
+                "Import file type",
+                [import_type.value for import_type in ImportTypes],
+            ).get()
+
             logger.info(f"Searching for items recursively in {directory}")
-            items_list = find_files_recursive(
-                directory, set(["json" if self.args.json else "*"])
-            )
+            items_list = asyncio.run(self._find_items(directory, import_file_type))
 
         logger.debug(f"Contains {len(items_list)} items")
 
@@ -169,22 +189,6 @@ but may increase the upload time.""",
             self.project.cache.get_data("uploads", upload_cache_hash, True, True) or []
         )
 
-        if not self.args.json and items_list:
-            import_file_type = CLIInputSelect(
-                self.args.type,
-                "Import file type",
-                [import_type.value for import_type in ImportTypes],
-            ).get()
-
-            items_list = asyncio.run(
-                self.project.project.upload.generate_items_list(
-                    items_list,
-                    import_file_type,
-                    self.args.as_study,
-                    self.args.concurrency,
-                )
-            )
-
         segmentation_mapping = {}
         if self.args.segment_map:
             with open(self.args.segment_map, "r", encoding="utf-8") as file_:
@@ -355,18 +359,25 @@ but may increase the upload time.""",
         if points:
             logger.info(f"Found {len(points)} items")
 
-            uploads = asyncio.run(
-                project.upload._create_tasks(
-                    points,
-                    segmentation_mapping,
-                    self.args.ground_truth,
-                    storage_id,
-                    label_storage_id,
-                    self.args.label_validate,
-                    self.args.concurrency,
-                    False,
+            # Resume uploads interrupted by a previous run
+            with UploadJournal(
+                self.project.cache.cache_path("upload-journal.jsonl")
+            ) as journal:
+                uploads = asyncio.run(
+                    project.upload._create_tasks(
+                        points,
+                        segmentation_mapping,
+                        self.args.ground_truth,
+                        storage_id,
+                        label_storage_id,
+                        self.args.label_validate,
+                        self.args.concurrency,
+                        False,
+                        journal,
+                    )
                 )
-            )
+            if all(upload.get("response") for upload in uploads):
+                journal.remove()
 
             for upload in uploads:
                 if upload.get("response"):
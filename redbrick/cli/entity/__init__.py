@@ -3,3 +3,4 @@
 from redbrick.cli.entity.creds import CLICredentials
 from redbrick.cli.entity.conf import CLIConfiguration
 from redbrick.cli.entity.cache import CLICache
+from redbrick.cli.entity.tasks import CLITaskStore
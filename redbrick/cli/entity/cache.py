@@ -4,11 +4,12 @@ import os
 import shutil
 import zlib
 import json
-from typing import Dict, List, Optional, Union
+from typing import Dict, Iterable, List, Optional, Union
 
 from redbrick import __version__ as sdk_version
 from redbrick.utils.common_utils import hash_sha256
 from .conf import CLIConfiguration
+from .tasks import CLITaskStore
 
 
 class CLICache:
@@ -111,6 +112,27 @@ class CLICache:
         if os.path.isfile(cache_file):
             os.remove(cache_file)
 
+    def task_store(self) -> CLITaskStore:
+        """Open the indexed task store."""
+        return CLITaskStore(self.cache_path("tasks.db"))
+
+    def migrate_entities(self, task_ids: List[str], store: CLITaskStore) -> int:
+        """Move per-file task entities into the task store."""
+
+        def _entities() -> Iterable[Dict]:
+            for task_id in task_ids:
+                try:
+                    entity = self.get_entity(task_id)
+                except (OSError, ValueError):
+                    continue
+                if isinstance(entity, dict):
+                    yield entity
+
+        count = store.set_tasks(_entities())
+        for task_id in task_ids:
+            self.remove_entity(task_id)
+        return count
+
     def _task_path(self, task_id: str) -> List[str]:
         """Get task dir from id."""
         return [
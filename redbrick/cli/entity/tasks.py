@@ -0,0 +1,296 @@
+"""CLI task store."""
+
+import json
+import sqlite3
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+class CLITaskStore:
+    """Indexed single-file store for cached project tasks (SQLite in WAL mode)."""
+
+    _path: str
+    _conn: sqlite3.Connection
+
+    BATCH_SIZE: int = 1000
+    # Older SQLite builds bind at most 999 parameters per statement
+    LOOKUP_BATCH_SIZE: int = 500
+
+    # Schema migrations, applied in order on top of `PRAGMA user_version`
+    MIGRATIONS: Tuple[str, ...] = (
+        """
+        CREATE TABLE tasks (
+            task_id TEXT PRIMARY KEY,
+            current_stage_name TEXT COLLATE NOCASE,
+            updated_at TEXT,
+            label_storage_id TEXT,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX tasks_stage ON tasks (current_stage_name, task_id);
+        CREATE INDEX tasks_updated ON tasks (updated_at, task_id);
+        CREATE INDEX tasks_label_storage ON tasks (label_storage_id, task_id);
+        CREATE TABLE exports (
+            destination TEXT NOT NULL,
+            task_id TEXT NOT NULL,
+            signature TEXT NOT NULL,
+            directory TEXT NOT NULL,
+            files TEXT NOT NULL,
+            output TEXT NOT NULL,
+            PRIMARY KEY (destination, task_id)
+        );
+        CREATE INDEX exports_directory ON exports (destination, directory);
+        """,
+    )
+
+    def __init__(self, path: str) -> None:
+        """Open (or create) the task store."""
+        self._path = path
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+        for number, migration in enumerate(self.MIGRATIONS[version:], version + 1):
+            # executescript commits on its own, so the script holds the transaction
+            try:
+                self._conn.executescript(
+                    f"BEGIN;{migration}PRAGMA user_version={number};COMMIT;"
+                )
+            except sqlite3.Error:
+                if self._conn.in_transaction:
+                    self._conn.rollback()
+                self._conn.close()
+                raise
+
+    def __enter__(self) -> "CLITaskStore":
+        """Enter context."""
+        return self
+
+    def __exit__(self, *_: Any) -> None:
+        """Exit context."""
+        self.close()
+
+    def __len__(self) -> int:
+        """Get number of stored tasks."""
+        return self._conn.execute("SELECT COUNT(*) FROM tasks").fetchone()[0]
+
+    def __contains__(self, task_id: object) -> bool:
+        """Check if task is stored."""
+        return (
+            self._conn.execute(
+                "SELECT 1 FROM tasks WHERE task_id = ?", (task_id,)
+            ).fetchone()
+            is not None
+        )
+
+    def close(self) -> None:
+        """Close the task store."""
+        self._conn.close()
+
+    def get_task(self, task_id: str) -> Optional[Dict]:
+        """Get stored task."""
+        row = self._conn.execute(
+            "SELECT data FROM tasks WHERE task_id = ?", (task_id,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set_tasks(self, tasks: Iterable[Dict]) -> int:
+        """Store tasks, committing one transaction per batch."""
+        count = 0
+        iterator = iter(tasks)
+        while True:
+            rows = [self._row(task) for task in islice(iterator, self.BATCH_SIZE)]
+            if not rows:
+                return count
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO tasks VALUES (?, ?, ?, ?, ?)", rows
+                )
+            count += len(rows)
+
+    def remove_tasks(self, task_ids: Iterable[str]) -> int:
+        """Remove stored tasks."""
+        count = 0
+        iterator = iter(task_ids)
+        while True:
+            rows = [(task_id,) for task_id in islice(iterator, self.BATCH_SIZE)]
+            if not rows:
+                return count
+            with self._conn:
+                count += self._conn.executemany(
+                    "DELETE FROM tasks WHERE task_id = ?", rows
+                ).rowcount
+
+    def task_ids(
+        self,
+        *,
+        task_id: Optional[str] = None,
+        stage_name: Optional[str] = None,
+        updated_after: Optional[str] = None,
+        label_storage_id: Optional[str] = None,
+    ) -> Iterator[str]:
+        """Get ids of stored tasks matching the filters.
+
+        Tasks are ordered by task id, or by updatedAt when filtering on it.
+        """
+        for (stored_task_id,) in self._select(
+            "task_id", task_id, stage_name, updated_after, label_storage_id
+        ):
+            yield stored_task_id
+
+    def iter_tasks(
+        self,
+        *,
+        task_id: Optional[str] = None,
+        stage_name: Optional[str] = None,
+        updated_after: Optional[str] = None,
+        label_storage_id: Optional[str] = None,
+    ) -> Iterator[Dict]:
+        """Get stored tasks matching the filters.
+
+        Tasks are ordered by task id, or by updatedAt when filtering on it.
+        """
+        for (data,) in self._select(
+            "data", task_id, stage_name, updated_after, label_storage_id
+        ):
+            yield json.loads(data)
+
+    def get_export(
+        self, destination: str, task_id: str
+    ) -> Optional[Tuple[str, str, List[str]]]:
+        """Get signature, directory name and files of the task's last export to destination."""
+        row = self._conn.execute(
+            "SELECT signature, directory, files FROM exports "
+            "WHERE destination = ? AND task_id = ?",
+            (destination, task_id),
+        ).fetchone()
+        return (row[0], row[1], json.loads(row[2])) if row else None
+
+    def set_export(
+        self,
+        destination: str,
+        task_id: str,
+        signature: str,
+        directory: str,
+        files: List[str],
+        output: Dict,
+    ) -> None:
+        """Store the task's export output, and the files it wrote, for destination."""
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO exports VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    destination,
+                    task_id,
+                    signature,
+                    directory,
+                    json.dumps(files, separators=(",", ":")),
+                    json.dumps(output, separators=(",", ":")),
+                ),
+            )
+
+    def remove_export(self, destination: str, task_id: str) -> Optional[str]:
+        """Remove the task's export, returning its directory name if no other export uses it."""
+        export = self.get_export(destination, task_id)
+        if export is None:
+            return None
+        with self._conn:
+            self._conn.execute(
+                "DELETE FROM exports WHERE destination = ? AND task_id = ?",
+                (destination, task_id),
+            )
+        directory = export[1]
+        if (
+            self._conn.execute(
+                "SELECT 1 FROM exports WHERE destination = ? AND directory = ?",
+                (destination, directory),
+            ).fetchone()
+            is not None
+        ):
+            return None
+        return directory
+
+    def export_ids(self, destination: str) -> Iterator[str]:
+        """Get ids of tasks exported to destination, ordered by task id."""
+        for (task_id,) in self._scan(
+            "exports", "task_id", ["destination = ?"], [destination]
+        ):
+            yield task_id
+
+    def iter_exports(self, destination: str, task_ids: Iterable[str]) -> Iterator[Dict]:
+        """Get export outputs of the tasks (given in task id order) for destination."""
+        iterator = iter(task_ids)
+        while True:
+            batch = list(islice(iterator, self.LOOKUP_BATCH_SIZE))
+            if not batch:
+                return
+            for (output,) in self._conn.execute(
+                "SELECT output FROM exports WHERE destination = ? "
+                f"AND task_id IN ({', '.join('?' * len(batch))}) ORDER BY task_id",
+                [destination] + batch,
+            ).fetchall():
+                yield json.loads(output)
+
+    def _select(
+        self,
+        column: str,
+        task_id: Optional[str],
+        stage_name: Optional[str],
+        updated_after: Optional[str],
+        label_storage_id: Optional[str],
+    ) -> Iterator[Tuple]:
+        """Scan stored tasks matching the filters."""
+        filters: List[str] = []
+        params: List[Any] = []
+        for name, operator, value in (
+            ("task_id", "=", task_id),
+            ("current_stage_name", "=", stage_name),
+            ("updated_at", ">", updated_after),
+            ("label_storage_id", "=", label_storage_id),
+        ):
+            if value is not None:
+                filters.append(f"{name} {operator} ?")
+                params.append(value)
+        order = ("task_id",) if updated_after is None else ("updated_at", "task_id")
+        return self._scan("tasks", column, filters, params, order)
+
+    def _scan(
+        self,
+        table: str,
+        column: str,
+        filters: List[str],
+        params: List[Any],
+        order: Tuple[str, ...] = ("task_id",),
+    ) -> Iterator[Tuple]:
+        """Scan table in batches."""
+        # Page by (indexed) sort keys so no cursor stays open while callers write
+        keys = ", ".join(order)
+        last: Optional[Tuple] = None
+        while True:
+            conditions, values = list(filters), list(params)
+            if last is not None:
+                conditions.append(f"({keys}) > ({', '.join('?' * len(order))})")
+                values.extend(last)
+            where = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+            rows = self._conn.execute(
+                f"SELECT {column}, {keys} FROM {table} {where}"
+                f"ORDER BY {keys} LIMIT ?",
+                values + [self.BATCH_SIZE],
+            ).fetchall()
+            for row in rows:
+                yield row[:1]
+            if len(rows) < self.BATCH_SIZE:
+                return
+            last = tuple(rows[-1][1:])
+
+    @staticmethod
+    def _row(
+        task: Dict,
+    ) -> Tuple[str, Optional[str], Optional[str], Optional[str], str]:
+        """Get indexed columns for task."""
+        return (
+            task["taskId"],
+            task.get("currentStageName"),
+            task.get("updatedAt"),
+            task.get("labelStorageId"),
+            json.dumps(task, separators=(",", ":")),
+        )
@@ -4,8 +4,12 @@ import time
 import json
 import base64
 import gzip
-from typing import Dict
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List
+from weakref import WeakKeyDictionary
 import requests  # type: ignore
+from requests.adapters import HTTPAdapter  # type: ignore
 
 import aiohttp
 import tenacity
@@ -17,10 +21,15 @@ from redbrick import __version__ as sdk_version  # pylint: disable=cyclic-import
 from redbrick.config import config
 from redbrick.common.constants import (
     DEFAULT_URL,
+    DNS_CACHE_TTL,
+    KEEPALIVE_TIMEOUT,
+    MAX_CONNECTIONS,
+    MAX_CONNECTIONS_PER_HOST,
     MAX_RETRY_ATTEMPTS,
     REQUEST_TIMEOUT,
     PEERLESS_ERRORS,
 )
+from redbrick.utils.async_utils import report_congestion
 from redbrick.utils.logging import assert_validation, log_error, logger
 
 
@@ -41,6 +50,17 @@ class RBClient:
 
         self.url += "/graphql/"
         self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=MAX_CONNECTIONS_PER_HOST,
+            pool_maxsize=MAX_CONNECTIONS_PER_HOST,
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        # One pooled aiohttp session per event loop, shared by all nested users
+        self._aio_sessions: "WeakKeyDictionary[asyncio.AbstractEventLoop, List]" = (
+            WeakKeyDictionary()
+        )
 
         self.api_key = api_key
         assert_validation(
@@ -52,6 +72,35 @@ class RBClient:
         """Garbage collect and close session."""
         self.session.close()
 
+    @asynccontextmanager
+    async def aio_session(self) -> AsyncIterator[aiohttp.ClientSession]:
+        """Get the pooled aiohttp session of the running event loop.
+
+        Nested scopes share the same keep-alive connection pool,
+        which is closed when the outermost scope exits.
+        """
+        loop = asyncio.get_running_loop()
+        entry = self._aio_sessions.get(loop)
+        if entry is None or entry[0].closed:
+            connector = aiohttp.TCPConnector(
+                limit=MAX_CONNECTIONS,
+                limit_per_host=MAX_CONNECTIONS_PER_HOST,
+                ttl_dns_cache=DNS_CACHE_TTL,
+                keepalive_timeout=KEEPALIVE_TIMEOUT,
+            )
+            entry = [aiohttp.ClientSession(connector=connector), 0]
+            self._aio_sessions[loop] = entry
+
+        entry[1] += 1
+        try:
+            yield entry[0]
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                self._aio_sessions.pop(loop, None)
+                await entry[0].close()
+                await asyncio.sleep(0.250)  # give time to close ssl connections
+
     @property
     def headers(self) -> Dict:
         """Get request headers."""
@@ -124,6 +173,8 @@ class RBClient:
     def _check_status_msg(response_status: int, start_time: float) -> None:
         total_time = time.time() - start_time
         logger.debug(f"Response status: {response_status} took {total_time} seconds")
+        if response_status in (413, 429) or response_status >= 500:
+            report_congestion()
         if response_status == 413 or response_status >= 500:
             if response_status == 413 or total_time >= 26:
                 raise TimeoutError(
@@ -2,9 +2,22 @@
 
 MAX_CONCURRENCY = 30
 MAX_FILE_BATCH_SIZE = 5
+MAX_PRESIGN_BATCH_SIZE = 500
+UPLOAD_URL_MAX_AGE = 10 * 60
 MAX_RETRY_ATTEMPTS = 3
 REQUEST_TIMEOUT = 30
 
+MAX_CONNECTIONS = 100
+MAX_CONNECTIONS_PER_HOST = 30
+KEEPALIVE_TIMEOUT = 60
+DNS_CACHE_TTL = 300
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+UPLOAD_PART_SIZE = 8 * 1024 * 1024
+MAX_UPLOAD_PARTS = 50000
+MAX_PART_CONCURRENCY = 8
+MAX_SCAN_WORKERS = 16
+TASK_ID_PAGE_SIZE = 1000
+
 DEFAULT_URL = "https://api.redbrickai.com"
 
 PEERLESS_ERRORS = (
@@ -4,6 +4,8 @@ from typing import Optional, List, Dict, Sequence, Tuple, TypedDict
 from abc import ABC, abstractmethod
 from datetime import datetime
 
+import aiohttp
+
 from redbrick.common.enums import ReviewStates, TaskStates
 
 
@@ -53,6 +55,16 @@ class ExportControllerInterface(ABC):
     ) -> Tuple[List[Dict], Optional[str], Optional[datetime]]:
         """Get the latest datapoints."""
 
+    @abstractmethod
+    def get_task_ids(
+        self,
+        org_id: str,
+        project_id: str,
+        first: int = 1000,
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[Dict], Optional[str]]:
+        """Get ids of all tasks in project."""
+
     @abstractmethod
     def task_search(
         self,
@@ -73,6 +85,16 @@ class ExportControllerInterface(ABC):
     ) -> List[Optional[str]]:
         """Presign download items."""
 
+    @abstractmethod
+    async def presign_items_async(
+        self,
+        session: aiohttp.ClientSession,
+        org_id: str,
+        storage_id: str,
+        items: Sequence[Optional[str]],
+    ) -> List[Optional[str]]:
+        """Presign download items."""
+
     @abstractmethod
     def task_events(
         self,
@@ -57,6 +57,17 @@ class UploadControllerInterface(ABC):
     ) -> List[Dict[Any, Any]]:
         """Get a presigned url for uploading items."""
 
+    @abstractmethod
+    async def items_upload_presign_async(
+        self,
+        aio_client: aiohttp.ClientSession,
+        org_id: str,
+        project_id: str,
+        files: List[str],
+        file_type: List[str],
+    ) -> List[Dict[Any, Any]]:
+        """Get a presigned url for uploading items."""
+
     @abstractmethod
     async def delete_tasks(
         self,
@@ -16,6 +16,16 @@ class Config:
         debug: Callable[[], bool]
         verify_ssl: Callable[[], bool]
         log_level: Callable[[], int]
+        mask_workers: Callable[[], int]
+        mask_max_tasks_per_child: Callable[[], int]
+        multipart_threshold: Callable[[], int]
+        upload_dedup: Callable[[], bool]
+        dicom_grouping_workers: Callable[[], int]
+        dicom_grouping_max_tasks_per_child: Callable[[], int]
+        segmentation_workers: Callable[[], int]
+        segmentation_max_tasks_per_child: Callable[[], int]
+        validation_workers: Callable[[], int]
+        validation_max_tasks_per_child: Callable[[], int]
 
     class ConfigState(TypedDict, total=False):
         """RedBrick config state."""
@@ -25,6 +35,16 @@ class Config:
         debug: bool
         verify_ssl: bool
         log_level: int
+        mask_workers: int
+        mask_max_tasks_per_child: int
+        multipart_threshold: int
+        upload_dedup: bool
+        dicom_grouping_workers: int
+        dicom_grouping_max_tasks_per_child: int
+        segmentation_workers: int
+        segmentation_max_tasks_per_child: int
+        validation_workers: int
+        validation_max_tasks_per_child: int
 
     def __init__(self) -> None:
         """Define configs."""
@@ -39,6 +59,32 @@ class Config:
             "log_level": lambda: int(
                 os.environ.get("REDBRICK_SDK_LOG_LEVEL", logging.INFO)
             ),
+            "mask_workers": lambda: int(os.environ.get("REDBRICK_SDK_MASK_WORKERS", 0)),
+            "mask_max_tasks_per_child": lambda: int(
+                os.environ.get("REDBRICK_SDK_MASK_MAX_TASKS_PER_CHILD", 0)
+            ),
+            "multipart_threshold": lambda: int(
+                os.environ.get("REDBRICK_SDK_MULTIPART_THRESHOLD", 64 * 1024 * 1024)
+            ),
+            "upload_dedup": lambda: bool(os.environ.get("REDBRICK_SDK_UPLOAD_DEDUP")),
+            "dicom_grouping_workers": lambda: int(
+                os.environ.get("REDBRICK_SDK_DICOM_GROUPING_WORKERS", 0)
+            ),
+            "dicom_grouping_max_tasks_per_child": lambda: int(
+                os.environ.get("REDBRICK_SDK_DICOM_GROUPING_MAX_TASKS_PER_CHILD", 0)
+            ),
+            "segmentation_workers": lambda: int(
+                os.environ.get("REDBRICK_SDK_SEGMENTATION_WORKERS", 0)
+            ),
+            "segmentation_max_tasks_per_child": lambda: int(
+                os.environ.get("REDBRICK_SDK_SEGMENTATION_MAX_TASKS_PER_CHILD", 0)
+            ),
+            "validation_workers": lambda: int(
+                os.environ.get("REDBRICK_SDK_VALIDATION_WORKERS", 0)
+            ),
+            "validation_max_tasks_per_child": lambda: int(
+                os.environ.get("REDBRICK_SDK_VALIDATION_MAX_TASKS_PER_CHILD", 0)
+            ),
         }
         logger = logging.getLogger("redbrick")
         logger.setLevel(
@@ -133,6 +179,208 @@ class Config:
             del self._state["log_level"]
         self.logger.setLevel(logging.DEBUG if self.debug else self.log_level)
 
+    @property
+    def mask_workers(self) -> int:
+        """Use these many worker processes for mask conversions (0 runs in a thread)."""
+        if "mask_workers" not in self._state:
+            self._state["mask_workers"] = self._options["mask_workers"]()
+        return self._state["mask_workers"]
+
+    @mask_workers.setter
+    def mask_workers(self, val: int) -> None:
+        """Use these many worker processes for mask conversions (0 runs in a thread)."""
+        if isinstance(val, int):
+            self._state["mask_workers"] = val
+
+    @mask_workers.deleter
+    def mask_workers(self) -> None:
+        """Use these many worker processes for mask conversions (0 runs in a thread)."""
+        if "mask_workers" in self._state:
+            del self._state["mask_workers"]
+
+    @property
+    def mask_max_tasks_per_child(self) -> int:
+        """Recycle mask worker processes after these many tasks (0 for never)."""
+        if "mask_max_tasks_per_child" not in self._state:
+            self._state["mask_max_tasks_per_child"] = self._options[
+                "mask_max_tasks_per_child"
+            ]()
+        return self._state["mask_max_tasks_per_child"]
+
+    @mask_max_tasks_per_child.setter
+    def mask_max_tasks_per_child(self, val: int) -> None:
+        """Recycle mask worker processes after these many tasks (0 for never)."""
+        if isinstance(val, int):
+            self._state["mask_max_tasks_per_child"] = val
+
+    @mask_max_tasks_per_child.deleter
+    def mask_max_tasks_per_child(self) -> None:
+        """Recycle mask worker processes after these many tasks (0 for never)."""
+        if "mask_max_tasks_per_child" in self._state:
+            del self._state["mask_max_tasks_per_child"]
+
+    @property
+    def multipart_threshold(self) -> int:
+        """Upload files of at least these many bytes in parallel blocks (0 to disable)."""
+        if "multipart_threshold" not in self._state:
+            self._state["multipart_threshold"] = self._options["multipart_threshold"]()
+        return self._state["multipart_threshold"]
+
+    @multipart_threshold.setter
+    def multipart_threshold(self, val: int) -> None:
+        """Upload files of at least these many bytes in parallel blocks (0 to disable)."""
+        if isinstance(val, int):
+            self._state["multipart_threshold"] = val
+
+    @multipart_threshold.deleter
+    def multipart_threshold(self) -> None:
+        """Upload files of at least these many bytes in parallel blocks (0 to disable)."""
+        if "multipart_threshold" in self._state:
+            del self._state["multipart_threshold"]
+
+    @property
+    def upload_dedup(self) -> bool:
+        """Skip re-uploading files whose contents were already uploaded."""
+        if "upload_dedup" not in self._state:
+            self._state["upload_dedup"] = self._options["upload_dedup"]()
+        return self._state["upload_dedup"]
+
+    @upload_dedup.setter
+    def upload_dedup(self, val: bool) -> None:
+        """Skip re-uploading files whose contents were already uploaded."""
+        if isinstance(val, bool):
+            self._state["upload_dedup"] = val
+
+    @upload_dedup.deleter
+    def upload_dedup(self) -> None:
+        """Skip re-uploading files whose contents were already uploaded."""
+        if "upload_dedup" in self._state:
+            del self._state["upload_dedup"]
+
+    @property
+    def dicom_grouping_workers(self) -> int:
+        """Group DICOM files into series locally with these many processes (0 groups on the server)."""
+        if "dicom_grouping_workers" not in self._state:
+            self._state["dicom_grouping_workers"] = self._options[
+                "dicom_grouping_workers"
+            ]()
+        return self._state["dicom_grouping_workers"]
+
+    @dicom_grouping_workers.setter
+    def dicom_grouping_workers(self, val: int) -> None:
+        """Group DICOM files into series locally with these many processes (0 groups on the server)."""
+        if isinstance(val, int):
+            self._state["dicom_grouping_workers"] = val
+
+    @dicom_grouping_workers.deleter
+    def dicom_grouping_workers(self) -> None:
+        """Group DICOM files into series locally with these many processes (0 groups on the server)."""
+        if "dicom_grouping_workers" in self._state:
+            del self._state["dicom_grouping_workers"]
+
+    @property
+    def dicom_grouping_max_tasks_per_child(self) -> int:
+        """Recycle DICOM grouping worker processes after these many tasks (0 for never)."""
+        if "dicom_grouping_max_tasks_per_child" not in self._state:
+            self._state["dicom_grouping_max_tasks_per_child"] = self._options[
+                "dicom_grouping_max_tasks_per_child"
+            ]()
+        return self._state["dicom_grouping_max_tasks_per_child"]
+
+    @dicom_grouping_max_tasks_per_child.setter
+    def dicom_grouping_max_tasks_per_child(self, val: int) -> None:
+        """Recycle DICOM grouping worker processes after these many tasks (0 for never)."""
+        if isinstance(val, int):
+            self._state["dicom_grouping_max_tasks_per_child"] = val
+
+    @dicom_grouping_max_tasks_per_child.deleter
+    def dicom_grouping_max_tasks_per_child(self) -> None:
+        """Recycle DICOM grouping worker processes after these many tasks (0 for never)."""
+        if "dicom_grouping_max_tasks_per_child" in self._state:
+            del self._state["dicom_grouping_max_tasks_per_child"]
+
+    @property
+    def segmentation_workers(self) -> int:
+        """Merge uploaded segmentations with these many processes (0 merges in a thread)."""
+        if "segmentation_workers" not in self._state:
+            self._state["segmentation_workers"] = self._options[
+                "segmentation_workers"
+            ]()
+        return self._state["segmentation_workers"]
+
+    @segmentation_workers.setter
+    def segmentation_workers(self, val: int) -> None:
+        """Merge uploaded segmentations with these many processes (0 merges in a thread)."""
+        if isinstance(val, int):
+            self._state["segmentation_workers"] = val
+
+    @segmentation_workers.deleter
+    def segmentation_workers(self) -> None:
+        """Merge uploaded segmentations with these many processes (0 merges in a thread)."""
+        if "segmentation_workers" in self._state:
+            del self._state["segmentation_workers"]
+
+    @property
+    def segmentation_max_tasks_per_child(self) -> int:
+        """Recycle segmentation worker processes after these many tasks (0 for never)."""
+        if "segmentation_max_tasks_per_child" not in self._state:
+            self._state["segmentation_max_tasks_per_child"] = self._options[
+                "segmentation_max_tasks_per_child"
+            ]()
+        return self._state["segmentation_max_tasks_per_child"]
+
+    @segmentation_max_tasks_per_child.setter
+    def segmentation_max_tasks_per_child(self, val: int) -> None:
+        """Recycle segmentation worker processes after these many tasks (0 for never)."""
+        if isinstance(val, int):
+            self._state["segmentation_max_tasks_per_child"] = val
+
+    @segmentation_max_tasks_per_child.deleter
+    def segmentation_max_tasks_per_child(self) -> None:
+        """Recycle segmentation worker processes after these many tasks (0 for never)."""
+        if "segmentation_max_tasks_per_child" in self._state:
+            del self._state["segmentation_max_tasks_per_child"]
+
+    @property
+    def validation_workers(self) -> int:
+        """Validate upload tasks locally with these many processes (0 validates in a thread)."""
+        if "validation_workers" not in self._state:
+            self._state["validation_workers"] = self._options["validation_workers"]()
+        return self._state["validation_workers"]
+
+    @validation_workers.setter
+    def validation_workers(self, val: int) -> None:
+        """Validate upload tasks locally with these many processes (0 validates in a thread)."""
+        if isinstance(val, int):
+            self._state["validation_workers"] = val
+
+    @validation_workers.deleter
+    def validation_workers(self) -> None:
+        """Validate upload tasks locally with these many processes (0 validates in a thread)."""
+        if "validation_workers" in self._state:
+            del self._state["validation_workers"]
+
+    @property
+    def validation_max_tasks_per_child(self) -> int:
+        """Recycle validation worker processes after these many tasks (0 for never)."""
+        if "validation_max_tasks_per_child" not in self._state:
+            self._state["validation_max_tasks_per_child"] = self._options[
+                "validation_max_tasks_per_child"
+            ]()
+        return self._state["validation_max_tasks_per_child"]
+
+    @validation_max_tasks_per_child.setter
+    def validation_max_tasks_per_child(self, val: int) -> None:
+        """Recycle validation worker processes after these many tasks (0 for never)."""
+        if isinstance(val, int):
+            self._state["validation_max_tasks_per_child"] = val
+
+    @validation_max_tasks_per_child.deleter
+    def validation_max_tasks_per_child(self) -> None:
+        """Recycle validation worker processes after these many tasks (0 for never)."""
+        if "validation_max_tasks_per_child" in self._state:
+            del self._state["validation_max_tasks_per_child"]
+
     @property
     def log_info(self) -> bool:
         """Show info logs."""
@@ -3,24 +3,44 @@
 import asyncio
 import re
 import shutil
-from typing import Iterator, List, Dict, Optional, Set, Tuple, Any
+from typing import (
+    AsyncIterator,
+    Iterator,
+    List,
+    Dict,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Any,
+)
+from contextlib import nullcontext
 from functools import partial
+from weakref import WeakKeyDictionary
 import os
 import json
 import copy
 from datetime import datetime, timezone
 
 import tqdm  # type: ignore
+from dateutil import parser  # type: ignore
 
 from redbrick.config import config
+from redbrick.common.constants import MAX_PRESIGN_BATCH_SIZE, TASK_ID_PAGE_SIZE
 from redbrick.common.context import RBContext
 from redbrick.common.enums import ReviewStates, TaskFilters, TaskStates
 from redbrick.common.export import TaskFilterParams
 from redbrick.stage import LabelStage, ReviewStage
 from redbrick.types.taxonomy import Taxonomy
+from redbrick.utils.async_utils import (
+    RequestBatcher,
+    iterate_in_event_loop,
+    iterate_with_concurrency,
+)
 from redbrick.utils.files import (
     DICOM_FILE_TYPES,
     IMAGE_FILE_TYPES,
+    JSONStreamWriter,
     NIFTI_FILE_TYPES,
     VIDEO_FILE_TYPES,
     download_files,
@@ -40,6 +60,8 @@ from redbrick.types.task import OutputTask as TypeTask, Series as TypeTaskSeries
 
 # pylint: disable=too-many-lines
 
+PresignBatcher = RequestBatcher[str, Optional[str], Optional[str]]
+
 
 class Export:
     """
@@ -74,6 +96,38 @@ class Export:
         self.label_stages = label_stages
         self.review_stages = review_stages
 
+        self.sync_token: Optional[str] = None
+        # Batchers hold futures and timers of one event loop, so keep one per loop
+        self._presign_batchers: (
+            "WeakKeyDictionary[asyncio.AbstractEventLoop, PresignBatcher]"
+        ) = WeakKeyDictionary()
+
+    async def _presign_items_batch(
+        self, storage_id: str, items: List[Optional[str]]
+    ) -> List[Optional[str]]:
+        async with self.context.client.aio_session() as session:
+            return await self.context.export.presign_items_async(
+                session, self.org_id, storage_id, items
+            )
+
+    async def _presign_items(
+        self, storage_id: str, items: Sequence[Optional[str]]
+    ) -> List[Optional[str]]:
+        """Presign items, batched with concurrent requests for the same storage."""
+        loop = asyncio.get_running_loop()
+        batcher = self._presign_batchers.get(loop)
+        if batcher is None:
+            batcher = self._presign_batchers[loop] = RequestBatcher(
+                self._presign_items_batch, MAX_PRESIGN_BATCH_SIZE
+            )
+        return await batcher.submit(storage_id, items)
+
+    def _close_presign_batcher(self) -> None:
+        """Drop the current event loop's presign batcher and its queued requests."""
+        batcher = self._presign_batchers.pop(asyncio.get_running_loop(), None)
+        if batcher:
+            batcher.close()
+
     def _get_raw_data_latest(
         self,
         concurrency: int,
@@ -82,6 +136,7 @@ class Export:
         presign_items: bool = False,
         with_consensus: bool = False,
         task_id: Optional[str] = None,
+        sync_token: Optional[str] = None,
     ) -> Iterator[Dict]:
         # pylint: disable=too-many-locals
         if task_id:
@@ -93,17 +148,19 @@ class Export:
             yield task
             return
 
+        cache_time: Optional[datetime] = None
+        if sync_token:
+            cache_time = parser.parse(sync_token)
+        elif from_timestamp is not None:
+            cache_time = datetime.fromtimestamp(from_timestamp, tz=timezone.utc)
+
         my_iter = PaginationIterator(
             partial(  # type: ignore
                 self.context.export.get_datapoints_latest,
                 self.org_id,
                 self.project_id,
                 stage_name,
-                (
-                    datetime.fromtimestamp(from_timestamp, tz=timezone.utc)
-                    if from_timestamp is not None
-                    else None
-                ),
+                cache_time,
                 presign_items,
                 with_consensus,
             ),
@@ -112,11 +169,7 @@ class Export:
 
         logger.info(
             "Downloading tasks"
-            + (
-                f" updated since {datetime.fromtimestamp(from_timestamp)}"
-                if from_timestamp is not None
-                else ""
-            )
+            + (f" updated since {cache_time}" if cache_time is not None else "")
         )
 
         for val in my_iter:
@@ -124,6 +177,19 @@ class Export:
             if task:
                 yield task
 
+        self.sync_token = my_iter.watermark.isoformat() if my_iter.watermark else None
+
+    def _get_task_ids(self) -> Iterator[str]:
+        """Get ids of all tasks in project."""
+        my_iter = PaginationIterator(
+            partial(  # type: ignore
+                self.context.export.get_task_ids, self.org_id, self.project_id
+            ),
+            TASK_ID_PAGE_SIZE,
+        )
+        for val in my_iter:
+            yield val["taskId"]
+
     @staticmethod
     def _get_color(class_id: int, color_hex: Optional[str] = None) -> Any:
         """Get a color from class id."""
@@ -304,9 +370,7 @@ class Export:
     ) -> Tuple[TypeTask, List[str]]:
         # pylint: disable=too-many-locals, too-many-branches, too-many-statements
         path_pattern = re.compile(r"[^\w.]+")
-        task_name = re.sub(path_pattern, "-", task.get("name", "")) or task.get(
-            "taskId", ""
-        )
+        task_name = Export.task_dir_name(task)  # type: ignore
         task_dir = os.path.join(parent_dir, task_name)
 
         if os.path.exists(task_dir) and not os.path.isdir(task_dir):
@@ -392,16 +456,18 @@ class Export:
                         )
                     )
 
-            presigned = self.context.export.presign_items(
-                self.org_id, storage_id, to_presign
-            )
+            presigned = await self._presign_items(storage_id, to_presign)
 
             if any(not presigned_path for presigned_path in presigned):
                 raise Exception("Failed to presign some files")
 
-            downloaded = await download_files(
-                list(zip(presigned, local_files)), "Downloading files", False
-            )
+            async with self.context.client.aio_session() as session:
+                downloaded = await download_files(
+                    list(zip(presigned, local_files)),
+                    "Downloading files",
+                    False,
+                    session=session,
+                )
 
             if any(not downloaded_file for downloaded_file in downloaded):
                 raise Exception("Failed to download some files")
@@ -621,14 +687,10 @@ class Export:
         # pylint: disable=too-many-branches, too-many-statements
         from redbrick.utils.dicom import process_nifti_download
 
-        presigned = self.context.export.presign_items(
-            self.org_id, task["labelStorageId"], presign_paths
-        )
+        presigned = await self._presign_items(task["labelStorageId"], presign_paths)
 
         path_pattern = re.compile(r"[^\w.]+")
-        task_name: str = (
-            re.sub(path_pattern, "-", task.get("name", "")) or task["taskId"]
-        )
+        task_name = Export.task_dir_name(task)  # type: ignore
         if segmentation_dir:
             task_dir = os.path.join(segmentation_dir, task_name)
             shutil.rmtree(task_dir, ignore_errors=True)
@@ -670,9 +732,15 @@ class Export:
 
         paths: List[Optional[str]]
         if segmentation_dir:
-            paths = await download_files(
-                files, "Downloading segmentations", False, True, True
-            )
+            async with self.context.client.aio_session() as session:
+                paths = await download_files(
+                    files,
+                    "Downloading segmentations",
+                    False,
+                    True,
+                    True,
+                    session=session,
+                )
         else:
             paths = list(list(zip(*files))[0])
 
@@ -731,6 +799,11 @@ class Export:
                     consensus_label_map["pngMask"] = label_map_data["png_mask"]
                     index += 1
 
+    @staticmethod
+    def task_dir_name(task: Dict) -> str:
+        """Get name of the task's segmentation directory."""
+        return re.sub(r"[^\w.]+", "-", task.get("name", "") or "") or task["taskId"]
+
     def preprocess_export(
         self, taxonomy: Taxonomy, get_color_map: bool
     ) -> Tuple[Dict, Dict]:
@@ -765,7 +838,7 @@ class Export:
         self,
         datapoint: Dict,
         taxonomy: Taxonomy,
-        task_file: Optional[str],
+        task_writer: Optional[JSONStreamWriter],
         image_dir: Optional[str],
         segmentation_dir: Optional[str],
         semantic_mask: bool,
@@ -805,20 +878,8 @@ class Export:
             except Exception as err:  # pylint: disable=broad-except
                 log_error(f"Failed to download files: {err}")
 
-        if not task_file:
-            return task if get_task else None
-
-        if os.path.isfile(task_file):
-            with open(task_file, "rb+") as task_file_:
-                task_file_.seek(-1, 2)
-                task_file_.write(
-                    b"," + json.dumps(task, indent=2).encode("utf-8") + b"]"
-                )
-        else:
-            with open(task_file, "wb") as task_file_:
-                task_file_.write(
-                    b"[" + json.dumps(task, indent=2).encode("utf-8") + b"]"
-                )
+        if task_writer:
+            task_writer.write(task, datapoint.get("taskId"))
 
         return task if get_task else None
 
@@ -841,6 +902,8 @@ class Export:
         png: bool = False,
         rt_struct: bool = False,
         destination: Optional[str] = None,
+        ordered: bool = True,
+        sync_token: Optional[str] = None,
     ) -> Iterator[TypeTask]:
         """Export annotation data.
 
@@ -855,6 +918,7 @@ class Export:
         Parameters
         -----------
         concurrency: int = 10
+            Number of tasks fetched per page and processed concurrently.
 
         only_ground_truth: bool = False
             If set to True, will only return data that has
@@ -917,6 +981,15 @@ class Export:
         destination: Optional[str] = None
             Destination directory (Default: current directory)
 
+        ordered: bool = True
+            Yield tasks in the order they are fetched.
+            If False, tasks are yielded as soon as they are exported.
+
+        sync_token: Optional[str] = None
+            Only export tasks updated since the export that issued this token.
+            Takes precedence over `from_timestamp`. Once the iterator is exhausted,
+            `project.export.sync_token` holds the token for the next incremental run.
+
         Returns
         -----------
         Iterator[:obj:`~redbrick.types.task.OutputTask`]
@@ -969,35 +1042,43 @@ class Export:
             True,
             not no_consensus,
             task_id,
+            None if task_id else sync_token,
         )
 
-        if task_file and os.path.isfile(task_file):
-            os.remove(task_file)
-
-        for datapoint in datapoints:
-            task: TypeTask = asyncio.run(
-                self.export_nifti_label_data(  # type: ignore
-                    datapoint,
-                    self.taxonomy,
-                    task_file,
-                    image_dir,
-                    segmentation_dir,
-                    semantic_mask,
-                    binary_mask,
-                    old_format,
-                    no_consensus,
-                    color_map,
-                    dicom_to_nifti,
-                    png,
-                    rt_struct,
-                    True,
-                )
+        async def _export_task(datapoint: Dict) -> TypeTask:
+            return await self.export_nifti_label_data(  # type: ignore
+                datapoint,
+                self.taxonomy,
+                task_writer,
+                image_dir,
+                segmentation_dir,
+                semantic_mask,
+                binary_mask,
+                old_format,
+                no_consensus,
+                color_map,
+                dicom_to_nifti,
+                png,
+                rt_struct,
+                True,
             )
-            yield task
 
-        if task_file and not os.path.isfile(task_file):
-            with open(task_file, "w", encoding="utf-8") as task_file_:
-                task_file_.write("[]")
+        async def _export_tasks() -> AsyncIterator[TypeTask]:
+            # Keep one connection pool alive across all tasks of this export
+            try:
+                async with self.context.client.aio_session():
+                    async for task in iterate_with_concurrency(
+                        concurrency, datapoints, _export_task, ordered
+                    ):
+                        yield task
+            finally:
+                self._close_presign_batcher()
+
+        # The writer replaces tasks.json only once the export completes
+        with (
+            JSONStreamWriter(task_file, ordered=ordered) if task_file else nullcontext()
+        ) as task_writer:
+            yield from iterate_in_event_loop(_export_tasks())
 
     def list_tasks(
         self,
@@ -162,8 +162,7 @@ class Labeling:
         label_validate: bool,
         existing_labels: bool,
     ) -> List[Dict]:
-        conn = aiohttp.TCPConnector()
-        async with aiohttp.ClientSession(connector=conn) as session:
+        async with self.context.client.aio_session() as session:
             coros = [
                 self._put_task(
                     session,
@@ -179,7 +178,6 @@ class Labeling:
                 for task in tasks
             ]
             temp = await gather_with_concurrency(10, coros, "Uploading tasks")
-        await asyncio.sleep(0.250)  # give time to close ssl connections
         return [val for val in temp if val]
 
     @check_stage
@@ -430,8 +428,7 @@ class Labeling:
         )
 
     async def _tasks_to_start(self, task_ids: List[str]) -> None:
-        conn = aiohttp.TCPConnector()
-        async with aiohttp.ClientSession(connector=conn) as session:
+        async with self.context.client.aio_session() as session:
             coros = [
                 self.context.labeling.move_task_to_start(
                     session, self.org_id, self.project_id, task_id
@@ -439,7 +436,6 @@ class Labeling:
                 for task_id in task_ids
             ]
             await gather_with_concurrency(10, coros, "Moving tasks to Start")
-        await asyncio.sleep(0.250)  # give time to close ssl connections
 
     def move_tasks_to_start(self, task_ids: List[str]) -> None:
         """Move groundtruth tasks back to start."""
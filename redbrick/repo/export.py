@@ -4,6 +4,8 @@ from typing import Any, Optional, List, Dict, Sequence, Tuple
 from datetime import datetime
 from dateutil import parser  # type: ignore
 
+import aiohttp
+
 from redbrick.common.export import ExportControllerInterface, TaskFilterParams
 from redbrick.common.client import RBClient
 from redbrick.repo.shards import datapoint_shard, task_shard, router_task_shard
@@ -125,6 +127,47 @@ class ExportRepo(ExportControllerInterface):
             parser.parse(new_cache_time) if new_cache_time else None,
         )
 
+    def get_task_ids(
+        self,
+        org_id: str,
+        project_id: str,
+        first: int = 1000,
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[Dict], Optional[str]]:
+        """Get ids of all tasks in project."""
+        query_string = """
+        query tasksPagedIdsSDK(
+            $orgId: UUID!
+            $projectId: UUID!
+            $first: Int
+            $after: String
+        ) {
+            tasksPaged(
+                orgId: $orgId
+                projectId: $projectId
+                first: $first
+                after: $after
+            ) {
+                entries {
+                    taskId
+                }
+                cursor
+            }
+        }
+        """
+        # EXECUTE THE QUERY
+        query_variables = {
+            "orgId": org_id,
+            "projectId": project_id,
+            "first": first,
+            "after": cursor,
+        }
+
+        result = self.client.execute_query(query_string, query_variables, False)
+        tasks_paged = result.get("tasksPaged", {}) or {}
+        entries: List[Dict] = tasks_paged.get("entries", []) or []  # type: ignore
+        return entries, tasks_paged.get("cursor")
+
     def task_search(
         self,
         org_id: str,
@@ -229,6 +272,30 @@ class ExportRepo(ExportControllerInterface):
         presigned_items: List[Optional[str]] = response.get("presignItems", [])
         return presigned_items
 
+    async def presign_items_async(
+        self,
+        session: aiohttp.ClientSession,
+        org_id: str,
+        storage_id: str,
+        items: Sequence[Optional[str]],
+    ) -> List[Optional[str]]:
+        """Presign download items."""
+        query = """
+        query presignItemsSDK(
+            $orgId: UUID!
+            $storageId: UUID!
+            $items: [String]!
+        ) {
+            presignItems(orgId: $orgId, storageId: $storageId, items: $items)
+        }
+        """
+
+        variables = {"orgId": org_id, "storageId": storage_id, "items": items}
+
+        response = await self.client.execute_query_async(session, query, variables)
+        presigned_items: List[Optional[str]] = response.get("presignItems", [])
+        return presigned_items
+
     def task_events(
         self,
         org_id: str,
@@ -205,6 +205,49 @@ class UploadRepo(UploadControllerInterface):
         presigned: List[Dict] = result["itemsUploadPresign"]["items"]
         return presigned
 
+    async def items_upload_presign_async(
+        self,
+        aio_client: aiohttp.ClientSession,
+        org_id: str,
+        project_id: str,
+        files: List[str],
+        file_type: List[str],
+    ) -> List[Dict[Any, Any]]:
+        """Return presigned URLs to upload files."""
+        query_string = """
+            query itemsUploadPresignSDK(
+                $orgId:UUID!,
+                $projectId: UUID!,
+                $files: [String]!,
+                $fileType:[String]!
+            ){
+                itemsUploadPresign(
+                    orgId:$orgId,
+                    projectId: $projectId,
+                    files:$files,
+                    fileType:$fileType
+                ) {
+                    items {
+                        presignedUrl,
+                        filePath,
+                        fileName
+                    }
+                }
+            }
+        """
+
+        query_variables = {
+            "orgId": org_id,
+            "projectId": project_id,
+            "files": files,
+            "fileType": file_type,
+        }
+        result = await self.client.execute_query_async(
+            aio_client, query_string, query_variables
+        )
+        presigned: List[Dict] = result["itemsUploadPresign"]["items"]
+        return presigned
+
     async def delete_tasks(
         self,
         aio_client: aiohttp.ClientSession,
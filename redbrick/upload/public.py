@@ -4,23 +4,50 @@ import shutil
 import asyncio
 import os
 import sys
+import time
 from copy import deepcopy
-from typing import List, Dict, Optional, Set
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
 import json
 
 import aiohttp
-import tenacity
-from tenacity.stop import stop_after_attempt
 import tqdm  # type: ignore
 
 from redbrick.config import config
 from redbrick.common.context import RBContext
-from redbrick.common.constants import DUMMY_FILE_PATH, MAX_CONCURRENCY
+from redbrick.common.constants import (
+    DUMMY_FILE_PATH,
+    MAX_CONCURRENCY,
+    MAX_PRESIGN_BATCH_SIZE,
+    UPLOAD_URL_MAX_AGE,
+)
 from redbrick.common.enums import ImportTypes, StorageMethod
 from redbrick.types.taxonomy import Taxonomy
-from redbrick.utils.async_utils import gather_with_concurrency, return_value
-from redbrick.utils.common_utils import config_path
+from redbrick.utils.async_utils import (
+    RequestBatcher,
+    gather_with_concurrency,
+    iterate_async,
+    iterate_in_event_loop,
+    iterate_with_concurrency,
+    stream_pipeline_with_concurrency,
+    return_value,
+    run_in_process_pool,
+)
+from redbrick.utils.common_utils import config_path, hash_file_sha256
 from redbrick.utils.upload import (
+    UploadIndex,
+    UploadJournal,
     convert_rt_struct_to_nii_labels,
     process_segmentation_upload,
     validate_json,
@@ -52,105 +79,123 @@ class Upload:
         self.project_id = project_id
         self.taxonomy = taxonomy
 
-    @tenacity.retry(
-        stop=stop_after_attempt(1),
-        retry_error_callback=lambda _: {},
-    )
-    async def _create_task(
+    async def _presign_task_items(
         self,
-        session: aiohttp.ClientSession,
-        storage_id: str,
+        presigner: RequestBatcher[str, Tuple[str, str], Dict],
         point: Dict,
-        is_ground_truth: bool,
-        label_storage_id: str,
-        project_label_storage_id: str,
-        label_validate: bool,
-        update_items: bool,
-    ) -> Dict:
-        # pylint:disable=too-many-locals
-        logger.debug(
-            f"storage={storage_id}, gt={is_ground_truth}, label_storage={label_storage_id}, "
-            + f"project_label_storage={project_label_storage_id}, validate={label_validate}"
+        journal: Optional[UploadJournal] = None,
+        index: Optional[UploadIndex] = None,
+    ) -> List[Dict]:
+        """Presign the local items and heat maps of a task for upload.
+
+        Returns an entry per file (items, then heat maps). Files already in the
+        journal or the upload index keep their uploaded `filePath` and are not
+        presigned again.
+        """
+        paths = list(point["items"]) + [
+            heat_map["item"] for heat_map in point.get("heatMaps") or []
+        ]
+        uploads = [{"path": path, "fileType": get_file_type(path)[1]} for path in paths]
+        if journal or index:
+            # Hash in threads to overlap with other points' transfers
+            loop = asyncio.get_running_loop()
+            hashes = await asyncio.gather(
+                *(loop.run_in_executor(None, hash_file_sha256, path) for path in paths)
+            )
+            for upload, file_hash in zip(uploads, hashes):
+                upload["hash"] = file_hash
+                upload["filePath"] = (
+                    journal and journal.get_file(point["name"], file_hash)
+                ) or (index and index.get(file_hash))
+
+        await self._presign_uploads(
+            presigner, [upload for upload in uploads if not upload.get("filePath")]
         )
-        if storage_id == StorageMethod.REDBRICK and point.get("items"):
-            logger.debug("Uploading files to Redbrick")
-            file_types, upload_items, presigned_items = [], [], []
-            try:
-                for item in point["items"]:
-                    file_types.append(get_file_type(item)[1])
-                    upload_items.append(os.path.split(item)[-1])
-                for heat_map in point.get("heatMaps") or []:
-                    file_types.append(get_file_type(heat_map["item"])[1])
-                    upload_items.append(os.path.split(heat_map["item"])[-1])
-                presigned_items = self._generate_upload_presigned_url(
-                    upload_items, file_types
-                )
-            except Exception:  # pylint:disable=broad-except
-                log_error(f"Failed to upload {point['name']}")
-                return {
-                    "name": point["name"],
-                    "error": f"Failed to upload {point['name']}",
-                }
+        return uploads
 
-            files = [
-                (
-                    item,
-                    presigned_items[idx]["presignedUrl"],
-                    file_types[idx],
-                )
-                for idx, item in enumerate(point["items"])
-            ]
-            heatmap_start_idx = len(point["items"])
-            heat_maps = [
-                (
-                    heat_map["item"],
-                    presigned_items[heatmap_start_idx + idx]["presignedUrl"],
-                    file_types[heatmap_start_idx + idx],
-                )
-                for idx, heat_map in enumerate(point.get("heatMaps") or [])
-            ]
+    async def _presign_uploads(
+        self,
+        presigner: RequestBatcher[str, Tuple[str, str], Dict],
+        uploads: List[Dict],
+    ) -> None:
+        """Get (new) presigned urls and upload paths for upload entries."""
+        presigned_items = await presigner.submit(
+            self.project_id,
+            [
+                (os.path.split(upload["path"])[-1], upload["fileType"])
+                for upload in uploads
+            ],
+        )
+        for upload, presigned_item in zip(uploads, presigned_items):
+            upload["presignedUrl"] = presigned_item["presignedUrl"]
+            upload["filePath"] = presigned_item["filePath"]
 
-            uploaded_items, uploaded_heatmaps = await asyncio.gather(
-                upload_files(
-                    files,
-                    f"Uploading items for {point['name'][:57]}{point['name'][57:] and '...'}",
-                ),
-                upload_files(
-                    heat_maps,
-                    f"Uploading heat maps for {point['name'][:57]}{point['name'][57:] and '...'}",
-                ),
-            )
+    async def _upload_task_items(
+        self,
+        session: aiohttp.ClientSession,
+        point: Dict,
+        uploads: List[Dict],
+        journal: Optional[UploadJournal] = None,
+        index: Optional[UploadIndex] = None,
+    ) -> bool:
+        """Upload presigned task files and point the task at the uploaded paths."""
+        logger.debug("Uploading files to Redbrick")
+        num_items = len(point["items"])
+        pending_items = [
+            upload for upload in uploads[:num_items] if upload.get("presignedUrl")
+        ]
+        pending_heat_maps = [
+            upload for upload in uploads[num_items:] if upload.get("presignedUrl")
+        ]
+        uploaded_items, uploaded_heatmaps = await asyncio.gather(
+            upload_files(
+                [
+                    (upload["path"], upload["presignedUrl"], upload["fileType"])
+                    for upload in pending_items
+                ],
+                f"Uploading items for {point['name'][:57]}{point['name'][57:] and '...'}",
+                session=session,
+                raise_errors=False,
+            ),
+            upload_files(
+                [
+                    (upload["path"], upload["presignedUrl"], upload["fileType"])
+                    for upload in pending_heat_maps
+                ],
+                f"Uploading heat maps for {point['name'][:57]}{point['name'][57:] and '...'}",
+                session=session,
+                raise_errors=False,
+            ),
+        )
 
-            if not all(uploaded_items) or not all(uploaded_heatmaps):
-                log_error(f"Failed to upload {point['name']}")
-                return {
-                    "name": point["name"],
-                    "error": f"Failed to upload {point['name']}",
-                }
+        for upload, uploaded in zip(
+            pending_items + pending_heat_maps, uploaded_items + uploaded_heatmaps
+        ):
+            if not uploaded:
+                continue
+            del upload["presignedUrl"]
+            if journal:
+                journal.add_file(point["name"], upload["hash"], upload["filePath"])
+            if index:
+                index.add(upload["hash"], upload["filePath"])
 
-            point["items"] = [
-                presigned_items[idx]["filePath"] for idx in range(len(point["items"]))
-            ]
-            for idx, heat_map in enumerate(point.get("heatMaps") or []):
-                heat_map["item"] = presigned_items[heatmap_start_idx + idx]["filePath"]
+        if not all(uploaded_items) or not all(uploaded_heatmaps):
+            return False
 
-        try:
-            labels_map = await process_segmentation_upload(
-                self.context,
-                session,
-                self.org_id,
-                self.project_id,
-                point,
-                label_storage_id,
-                project_label_storage_id,
-                label_validate,
-            )
-        except ValueError as err:
-            logger.warning(
-                f"Failed to process segmentations: `{err}` for `{point['name']}`"
-            )
-            return {}
+        point["items"] = [upload["filePath"] for upload in uploads[:num_items]]
+        for heat_map, upload in zip(point.get("heatMaps") or [], uploads[num_items:]):
+            heat_map["item"] = upload["filePath"]
+        return True
 
+    async def _create_task(
+        self,
+        session: aiohttp.ClientSession,
+        storage_id: str,
+        point: Dict,
+        is_ground_truth: bool,
+        labels_map: List[Dict],
+        update_items: bool,
+    ) -> Dict:
         try:
             # Basic structural validations, rest handled by API
             assert_validation(
@@ -371,6 +416,26 @@ class Upload:
 
         return rb_segmentations
 
+    @staticmethod
+    def _apply_segmentation_mapping(
+        point: Dict, global_segmentations: List[Dict]
+    ) -> None:
+        """Add the categories of the point's (or the global) segment map to its labels."""
+        local_segmentations: List[Dict] = []
+        if point.get("segmentMap"):
+            local_segmentations = Upload._map_segmentation_category(point["segmentMap"])
+        if local_segmentations or global_segmentations:
+            labels = point.get("labels", [])
+            for label in labels:
+                if label.get("dicom", {}).get("instanceid"):
+                    raise ValueError(
+                        "Cannot have dicom segmentations in `labels` "
+                        + f" when segmentMap is given: {point}"
+                    )
+            point["labels"] = labels + (
+                local_segmentations if local_segmentations else global_segmentations
+            )
+
     async def _create_tasks(
         self,
         points: List[Dict],
@@ -381,6 +446,7 @@ class Upload:
         label_validate: bool,
         concurrency: int,
         update_items: bool,
+        journal: Optional[UploadJournal] = None,
     ) -> List[Dict]:
         # pylint: disable=too-many-locals
         try:
@@ -388,71 +454,205 @@ class Upload:
                 segmentation_mapping
             )
             for point in points:
-                local_segmentations: List[Dict] = []
-                if point.get("segmentMap"):
-                    local_segmentations = Upload._map_segmentation_category(
-                        point["segmentMap"]
-                    )
-                if local_segmentations or global_segmentations:
-                    labels = point.get("labels", [])
-                    for label in labels:
-                        if label.get("dicom", {}).get("instanceid"):
-                            log_error(
-                                "Cannot have dicom segmentations in `labels` "
-                                + f" when segmentMap is given: {point}"
-                            )
-                            return points
-                    point["labels"] = labels + (
-                        local_segmentations
-                        if local_segmentations
-                        else global_segmentations
-                    )
+                Upload._apply_segmentation_mapping(point, global_segmentations)
         except ValueError as err:
             log_error(err)
             return points
 
+        tasks: List[Dict] = [{} for _ in points]
+        async for idx, task in self._stream_tasks(
+            points,
+            is_ground_truth,
+            storage_id,
+            label_storage_id,
+            label_validate,
+            concurrency,
+            update_items,
+            journal,
+        ):
+            if not isinstance(task, Exception):
+                tasks[idx] = task
+
+        for point, task in zip(points, tasks):
+            if not task:
+                if update_items:
+                    log_error(f"Error updating items for {point}")
+                else:
+                    log_error(f"Error uploading {point}")
+
+        return tasks
+
+    async def _stream_tasks(
+        self,
+        points: Union[Iterable[Dict], AsyncIterable[Dict]],
+        is_ground_truth: bool,
+        storage_id: str,
+        label_storage_id: str,
+        label_validate: bool,
+        concurrency: int,
+        update_items: bool,
+        journal: Optional[UploadJournal] = None,
+        segmentation_mapping: Optional[Dict] = None,
+    ) -> AsyncIterator[Tuple[int, Any]]:
+        """Create (or update) tasks for points, yielding `(index, task)` as they complete.
+
+        Points are consumed lazily. If `segmentation_mapping` is given, it is
+        applied to each point's labels along the way.
+        Failed points yield their exception instead of a task.
+        """
+        # pylint: disable=too-many-locals, too-many-statements
+        global_segmentations = (
+            None
+            if segmentation_mapping is None
+            else Upload._map_segmentation_category(segmentation_mapping)
+        )
         project_label_storage_id, _ = self.context.project.get_label_storage(
             self.org_id, self.project_id
         )
 
-        conn = aiohttp.TCPConnector()
-        async with aiohttp.ClientSession(connector=conn) as session:
-            coros = [
-                self._create_task(
-                    session,
-                    storage_id,
-                    point,
-                    is_ground_truth,
-                    label_storage_id,
-                    project_label_storage_id,
-                    label_validate,
-                    update_items,
-                )
-                for point in points
-            ]
-            tasks = await gather_with_concurrency(
-                min(concurrency, 10),
-                coros,
-                "Updating items" if update_items else "Creating tasks",
+        async def _presign_batch(_: str, items: List[Tuple[str, str]]) -> List[Dict]:
+            return await self._generate_upload_presigned_url(
+                session,
+                [file_name for file_name, _ in items],
+                [file_type for _, file_type in items],
             )
 
-        await asyncio.sleep(0.250)  # give time to close ssl connections
-
-        temp_dir = os.path.join(config_path(), "temp")
-        if os.path.exists(temp_dir):
-            shutil.rmtree(temp_dir)
+        presigner: RequestBatcher[str, Tuple[str, str], Dict] = RequestBatcher(
+            _presign_batch, MAX_PRESIGN_BATCH_SIZE
+        )
 
-        for point, task in zip(points, tasks):  # type: ignore
-            if not task:
-                if update_items:
-                    log_error(f"Error updating items for {point}")
+        async def _presign_point(state: Dict) -> None:
+            point = state["point"]
+            try:
+                if "uploads" in state:
+                    # Refresh expired urls only, files are already hashed and looked up
+                    await self._presign_uploads(
+                        presigner,
+                        [
+                            upload
+                            for upload in state["uploads"]
+                            if upload.get("presignedUrl")
+                        ],
+                    )
                 else:
-                    log_error(f"Error uploading {point}")
+                    state["uploads"] = await self._presign_task_items(
+                        presigner, point, journal, index
+                    )
+                state["presigned_at"] = time.monotonic()
+            except Exception:  # pylint:disable=broad-except
+                log_error(f"Failed to upload {point['name']}")
+                state["result"] = {
+                    "name": point["name"],
+                    "error": f"Failed to upload {point['name']}",
+                }
 
-        return tasks
+        async def _presign(point: Dict) -> Dict:
+            state: Dict = {"point": point, "result": None}
+            if global_segmentations is not None:
+                try:
+                    Upload._apply_segmentation_mapping(point, global_segmentations)
+                except ValueError as err:
+                    log_error(err)
+                    state["result"] = {**point, "error": err}
+                    return state
+
+            if journal and journal.get_task(point.get("name", "")):
+                logger.debug(f"Skipping already created task: {point['name']}")
+                state["result"] = journal.get_task(point["name"])
+            elif storage_id == StorageMethod.REDBRICK and point.get("items"):
+                await _presign_point(state)
+            return state
+
+        async def _upload(state: Dict) -> Dict:
+            point = state["point"]
+            if (
+                state["result"] is None
+                and any(
+                    upload.get("presignedUrl") for upload in state.get("uploads", [])
+                )
+                and time.monotonic() - state["presigned_at"] > UPLOAD_URL_MAX_AGE
+            ):
+                logger.debug(f"Refreshing upload urls for {point['name']}")
+                await _presign_point(state)
+            if state["result"] is None and state.get("uploads"):
+                if not await self._upload_task_items(
+                    session, point, state["uploads"], journal, index
+                ):
+                    log_error(f"Failed to upload {point['name']}")
+                    state["result"] = {
+                        "name": point["name"],
+                        "error": f"Failed to upload {point['name']}",
+                    }
+            return state
 
-    def _generate_upload_presigned_url(
-        self, files: List[str], file_type: List[str]
+        async def _process_segmentations(state: Dict) -> Dict:
+            if state["result"] is None:
+                try:
+                    state["labels_map"] = await process_segmentation_upload(
+                        self.context,
+                        session,
+                        self.org_id,
+                        self.project_id,
+                        state["point"],
+                        label_storage_id,
+                        project_label_storage_id,
+                        label_validate,
+                    )
+                except ValueError as err:
+                    logger.warning(
+                        f"Failed to process segmentations: `{err}` for `{state['point']['name']}`"
+                    )
+                    state["result"] = {}
+            return state
+
+        async def _create(state: Dict) -> Dict:
+            if state["result"] is not None:
+                return state["result"]
+            task = await self._create_task(
+                session,
+                storage_id,
+                state["point"],
+                is_ground_truth,
+                state["labels_map"],
+                update_items,
+            )
+            if journal and task.get("response"):
+                journal.add_task(task["name"], task)
+            return task
+
+        logger.debug(
+            f"storage={storage_id}, gt={is_ground_truth}, label_storage={label_storage_id}, "
+            + f"project_label_storage={project_label_storage_id}, validate={label_validate}"
+        )
+        index = (
+            UploadIndex(self.org_id, storage_id)
+            if config.upload_dedup and storage_id == StorageMethod.REDBRICK
+            else None
+        )
+        workers = min(concurrency, 10)
+        try:
+            async with self.context.client.aio_session() as session:
+                async for idx, task in stream_pipeline_with_concurrency(
+                    points,
+                    [
+                        (concurrency, _presign),
+                        (workers, _upload),
+                        (workers, _process_segmentations),
+                        (workers, _create),
+                    ],
+                    "Updating items" if update_items else "Creating tasks",
+                ):
+                    yield idx, task
+        finally:
+            presigner.close()
+            if index:
+                index.close()
+            temp_dir = os.path.join(config_path(), "temp")
+            if os.path.exists(temp_dir):
+                shutil.rmtree(temp_dir)
+
+    async def _generate_upload_presigned_url(
+        self, session: aiohttp.ClientSession, files: List[str], file_type: List[str]
     ) -> List[Dict]:
         """
         Generate presigned url's to perform upload.
@@ -480,8 +680,8 @@ class Upload:
             ]
         """
         try:
-            result = self.context.upload.items_upload_presign(
-                self.org_id, self.project_id, files, file_type
+            result = await self.context.upload.items_upload_presign_async(
+                session, self.org_id, self.project_id, files, file_type
             )
         except ValueError as error:
             log_error(error)
@@ -499,6 +699,7 @@ class Upload:
         label_storage_id: Optional[str] = None,
         label_validate: bool = False,
         concurrency: int = 50,
+        resume: bool = False,
     ) -> List[Dict]:
         """
         Create datapoints in project.
@@ -558,6 +759,11 @@ class Upload:
 
         concurrency: int = 50
 
+        resume: bool = False
+            Record uploaded files and created tasks in a local journal, and skip them
+            when rerunning an interrupted upload with the same points.
+            The journal is removed once every point has been created.
+
         Returns
         -------------
         List[Dict]
@@ -583,22 +789,202 @@ class Upload:
             label_validate,
             concurrency,
         )
-        return asyncio.run(
-            self._create_tasks(
-                converted_points,
-                {},
-                is_ground_truth,
+        journal = self._open_journal() if resume else None
+        try:
+            tasks = asyncio.run(
+                self._create_tasks(
+                    converted_points,
+                    {},
+                    is_ground_truth,
+                    storage_id,
+                    label_storage_id or storage_id,
+                    label_validate,
+                    concurrency,
+                    False,
+                    journal,
+                )
+            )
+        finally:
+            if journal:
+                journal.close()
+        if journal and all(task.get("response") for task in tasks):
+            journal.remove()
+        return tasks
+
+    def create_datapoints_stream(
+        self,
+        storage_id: str,
+        points: Union[Iterable[InputTask], AsyncIterable[InputTask]],
+        *,
+        is_ground_truth: bool = False,
+        segmentation_mapping: Optional[Dict] = None,
+        rt_struct: bool = False,
+        label_storage_id: Optional[str] = None,
+        label_validate: bool = False,
+        concurrency: int = 50,
+        resume: bool = False,
+    ) -> Iterator[Dict]:
+        """
+        Create datapoints in project from a stream of points.
+
+        Same as :meth:`create_datapoints`, but ``points`` can be any iterable or
+        async iterable, such as a generator reading from a database. Points are
+        validated and uploaded in rolling windows, and results are yielded as
+        each point completes, so only the points in flight are held in memory.
+        Points named like a point still in flight are skipped as duplicates.
+
+        .. code:: python
+
+            project = redbrick.get_project(org_id, project_id, api_key, url)
+            for task in project.upload.create_datapoints_stream(storage_id, points):
+                if not task.get("response"):
+                    print(task["name"], task.get("error"))
+
+
+        Parameters
+        --------------
+        storage_id: str
+            Your RedBrick AI external storage_id. This can be found under the Storage Tab
+            on the RedBrick AI platform. To directly upload images to rbai,
+            use redbrick.StorageMethod.REDBRICK.
+
+        points: Union[Iterable[:obj:`~redbrick.types.task.InputTask`], AsyncIterable[:obj:`~redbrick.types.task.InputTask`]]
+            Please see the RedBrick AI reference documentation for overview of the format.
+            https://sdk.redbrickai.com/formats/index.html#import.
+
+        is_ground_truth: bool = False
+            If labels are provided in ``points``, and this parameters
+            is set to true, the labels will be added to the Ground Truth stage.
+
+        segmentation_mapping: Optional[Dict] = None
+            Optional mapping of semantic_mask segmentation class ids and RedBrick categories.
+
+        rt_struct: bool = False
+            Upload segmentations from DICOM RT-Struct files.
+
+        label_storage_id: Optional[str] = None
+            Optional label storage id to reference nifti segmentations.
+            Defaults to items storage_id if not specified.
+
+        label_validate: bool = False
+            Validate label nifti instances and segment map.
+
+        concurrency: int = 50
+
+        resume: bool = False
+            Record uploaded files and created tasks in a local journal, and skip them
+            when rerunning an interrupted upload with the same points.
+            The journal is removed once every point has been created.
+
+        Returns
+        -------------
+        Iterator[Dict]
+            Task objects with key `response` if successful, else `error`,
+            in the order they complete.
+        """
+        journal = self._open_journal() if resume else None
+        failed = False
+        try:
+            for task in iterate_in_event_loop(
+                self._stream_datapoints(
+                    storage_id,
+                    points,
+                    is_ground_truth,
+                    segmentation_mapping,
+                    rt_struct,
+                    label_storage_id or storage_id,
+                    label_validate,
+                    concurrency,
+                    journal,
+                )
+            ):
+                failed = failed or not task.get("response")
+                yield task
+        finally:
+            if journal:
+                journal.close()
+        if journal and not failed:
+            journal.remove()
+
+    async def _stream_datapoints(
+        self,
+        storage_id: str,
+        points: Union[Iterable[InputTask], AsyncIterable[InputTask]],
+        is_ground_truth: bool,
+        segmentation_mapping: Optional[Dict],
+        rt_struct: bool,
+        label_storage_id: str,
+        label_validate: bool,
+        concurrency: int,
+        journal: Optional[UploadJournal],
+    ) -> AsyncIterator[Dict]:
+        # pylint: disable=too-many-locals
+        uploading: Set[str] = set()
+        names: Dict[int, str] = {}
+        window_size = max(1, concurrency) * MAX_CONCURRENCY
+        cur_dir = os.getcwd()
+
+        async def _prepare(window: List[Dict]) -> List[Dict]:
+            return await self._prepare_points(
+                window,
                 storage_id,
-                label_storage_id or storage_id,
+                label_storage_id,
+                segmentation_mapping,
+                cur_dir,
+                uploading,
+                None,
+                rt_struct,
                 label_validate,
                 concurrency,
-                False,
             )
+
+        async def _prepared_points() -> AsyncIterator[Dict]:
+            window: List[Dict] = []
+            idx = 0
+            async for point in iterate_async(points):
+                window.append(point)  # type: ignore
+                if len(window) < window_size:
+                    continue
+                for prepared in await _prepare(window):
+                    names[idx] = prepared["name"]
+                    idx += 1
+                    yield prepared
+                window = []
+            for prepared in await _prepare(window) if window else []:
+                names[idx] = prepared["name"]
+                idx += 1
+                yield prepared
+
+        async for idx, task in self._stream_tasks(
+            _prepared_points(),
+            is_ground_truth,
+            storage_id,
+            label_storage_id,
+            label_validate,
+            concurrency,
+            False,
+            journal,
+            {},
+        ):
+            name = names.pop(idx, None)
+            # Duplicate names are only skipped while in flight, keeping memory bounded
+            if name:
+                uploading.discard(name)
+            if isinstance(task, Exception) or not task:
+                log_error(f"Error uploading {name}")
+                task = {
+                    "name": name,
+                    "error": task or f"Failed to upload {name}",
+                }
+            yield task
+
+    def _open_journal(self) -> UploadJournal:
+        return UploadJournal(
+            os.path.join(config_path(), "journals", f"{self.project_id}.jsonl")
         )
 
     async def _delete_tasks(self, task_ids: List[str], concurrency: int) -> bool:
-        conn = aiohttp.TCPConnector()
-        async with aiohttp.ClientSession(connector=conn) as session:
+        async with self.context.client.aio_session() as session:
             coros = [
                 self.context.upload.delete_tasks(
                     session,
@@ -609,7 +995,6 @@ class Upload:
                 for batch in range(0, len(task_ids), concurrency)
             ]
             success = await gather_with_concurrency(10, coros, "Deleting tasks")
-        await asyncio.sleep(0.250)  # give time to close ssl connections
         return all(success)
 
     def delete_tasks(self, task_ids: List[str], concurrency: int = 50) -> bool:
@@ -638,8 +1023,7 @@ class Upload:
     async def _delete_tasks_by_name(
         self, task_names: List[str], concurrency: int
     ) -> bool:
-        conn = aiohttp.TCPConnector()
-        async with aiohttp.ClientSession(connector=conn) as session:
+        async with self.context.client.aio_session() as session:
             coros = [
                 self.context.upload.delete_tasks_by_name(
                     session,
@@ -650,7 +1034,6 @@ class Upload:
                 for batch in range(0, len(task_names), concurrency)
             ]
             success = await gather_with_concurrency(10, coros, "Deleting tasks")
-        await asyncio.sleep(0.250)  # give time to close ssl connections
         return all(success)
 
     def delete_tasks_by_name(
@@ -678,260 +1061,338 @@ class Upload:
         concurrency = min(concurrency, 50)
         return asyncio.run(self._delete_tasks_by_name(task_names, concurrency))
 
-    async def generate_items_list(
+    async def iter_items_list(
         self,
-        items_list: List[List[str]],
+        directories: Iterable[Tuple[Optional[str], List[List[str]]]],
         import_file_type: str,
         as_study: bool,
         concurrency: int = 50,
-    ) -> List[Dict]:
-        """Generate items list from local files."""
-        # pylint: disable=too-many-locals, too-many-branches
-        logger.debug(f"Concurrency: {concurrency} for {len(items_list)} items")
-        grouped_items_list: Dict[str, List[str]] = {}
-        for items in items_list:
-            if not items:
-                continue
-            items_dir = os.path.dirname(items[0])
-            if as_study:
-                items_dir = os.path.dirname(items_dir)
-
-            if items_dir not in grouped_items_list:
-                grouped_items_list[items_dir] = []
-            grouped_items_list[items_dir].extend(items)
-
-        logger.debug(f"Grouped items list: {len(grouped_items_list)}")
-
-        items_list = list(grouped_items_list.values())
-        total_groups = len(items_list)
-        items_map: Dict[str, str] = {}
-
-        if import_file_type == ImportTypes.DICOM3D:
-            for items in items_list:
-                for idx, item in enumerate(items):
-                    file_ext, file_type = get_file_type(item)
-                    if (
-                        not file_ext or file_type != "application/dicom"
-                    ) and is_dicom_file(item):
-                        items[idx] = item + ".dcm"
-                        items_map[items[idx]] = item
+    ) -> AsyncIterator[Dict]:
+        """Generate items from local files, while the files are being found.
 
-        is_win = sys.platform.startswith("win")
-        conn = aiohttp.TCPConnector()
-        async with aiohttp.ClientSession(connector=conn) as session:
-            coros = [
-                self.context.upload.generate_items_list(
-                    session,
-                    [
-                        item
-                        for items in items_list[batch : batch + concurrency]
-                        for item in items
-                    ],
-                    import_file_type,
+        Takes `(directory, item groups)` pairs in the order of
+        :func:`redbrick.utils.files.iter_files_recursive`, and processes the
+        groups of a directory as soon as it has been completely scanned.
+        Groups with no directory are processed once `directories` is exhausted.
+
+        DICOM3D files are grouped into series locally, from their headers, when
+        `redbrick.config.dicom_grouping_workers` is set.
+        """
+        # pylint: disable=too-many-locals, import-outside-toplevel
+        from redbrick.utils.dicom import group_dicom_series
+
+        def _batches() -> Iterator[Tuple[List[List[str]], Dict[str, str]]]:
+            grouped_items_list: Dict[str, List[str]] = {}
+            batch: List[List[str]] = []
+            for directory, groups in directories:
+                for items in groups:
+                    if not items:
+                        continue
+                    items_dir = os.path.dirname(items[0])
+                    if as_study:
+                        items_dir = os.path.dirname(items_dir)
+                    grouped_items_list.setdefault(
+                        os.path.normpath(items_dir), []
+                    ).extend(items)
+
+                if directory is not None:
+                    directory = os.path.normpath(directory)
+                    if directory in grouped_items_list:
+                        batch.append(grouped_items_list.pop(directory))
+                        if len(batch) >= concurrency:
+                            yield _prepare(batch)
+                            batch = []
+
+            batch.extend(grouped_items_list.values())
+            for idx in range(0, len(batch), concurrency):
+                yield _prepare(batch[idx : idx + concurrency])
+
+        def _prepare(
+            batch: List[List[str]],
+        ) -> Tuple[List[List[str]], Dict[str, str]]:
+            items_map: Dict[str, str] = {}
+            if import_file_type == ImportTypes.DICOM3D and not local_grouping:
+                for items in batch:
+                    for idx, item in enumerate(items):
+                        file_ext, file_type = get_file_type(item)
+                        if (
+                            not file_ext or file_type != "application/dicom"
+                        ) and is_dicom_file(item):
+                            items[idx] = item + ".dcm"
+                            items_map[items[idx]] = item
+            return batch, items_map
+
+        async def _generate(
+            prepared: Tuple[List[List[str]], Dict[str, str]]
+        ) -> List[Dict]:
+            batch, items_map = prepared
+            if local_grouping:
+                return await run_in_process_pool(
+                    "dicom_grouping",
+                    group_dicom_series,
+                    batch,
                     as_study,
-                    is_win,
+                    workers=config.dicom_grouping_workers,
+                    max_tasks_per_child=config.dicom_grouping_max_tasks_per_child,
                 )
-                for batch in range(0, total_groups, concurrency)
-            ]
-            outputs = await gather_with_concurrency(MAX_CONCURRENCY, coros)
-
-        await asyncio.sleep(0.250)  # give time to close ssl connections
 
-        output_data: List[Dict] = []
-        for output in outputs:
-            output_data.extend(json.loads(output))
-
-        if import_file_type == ImportTypes.DICOM3D:
+            output = await self.context.upload.generate_items_list(
+                session,
+                [item for items in batch for item in items],
+                import_file_type,
+                as_study,
+                is_win,
+            )
+            output_data: List[Dict] = json.loads(output)
             for data in output_data:
                 for idx, item in enumerate(data["items"]):
                     if item in items_map:
                         data["items"][idx] = items_map[item]
+            return output_data
 
-        return output_data
+        logger.debug(f"Concurrency: {concurrency}")
+        concurrency = max(1, concurrency)
+        local_grouping = (
+            import_file_type == ImportTypes.DICOM3D
+            and config.dicom_grouping_workers > 0
+        )
+        is_win = sys.platform.startswith("win")
+        async with self.context.client.aio_session() as session:
+            # Batches are prepared in a worker thread, overlapping the requests
+            async for output_data in iterate_with_concurrency(
+                MAX_CONCURRENCY, _batches(), _generate
+            ):
+                for data in output_data:
+                    yield data
 
-    def prepare_json_files(
+    async def generate_items_list(
         self,
-        files_data: List[List[InputTask]],
+        items_list: List[List[str]],
+        import_file_type: str,
+        as_study: bool,
+        concurrency: int = 50,
+    ) -> List[Dict]:
+        """Generate items list from local files."""
+        logger.debug(f"Generating items for {len(items_list)} groups")
+        return [
+            data
+            async for data in self.iter_items_list(
+                [(None, items_list)], import_file_type, as_study, concurrency
+            )
+        ]
+
+    async def _prepare_points(
+        self,
+        file_data: List[Dict],
         storage_id: str,
         label_storage_id: str,
         task_segment_map: Optional[Dict],
-        task_dirs: Optional[List[str]] = None,
+        task_dir: str,
+        uploading: Set[str],
         uploaded: Optional[Set[str]] = None,
         rt_struct: bool = False,
         label_validate: bool = False,
         concurrency: int = 50,
     ) -> List[Dict]:
-        """Prepare items from json files for upload."""
+        """Validate and prepare the items of a json file for upload.
+
+        Names of the returned points are added to `uploading`.
+        """
         # pylint: disable=too-many-locals, too-many-branches
-        # pylint: disable=too-many-statements, import-outside-toplevel
-        logger.debug(f"Preparing {len(files_data)} files for upload")
+        # pylint: disable=too-many-statements, too-many-nested-blocks
         points: List[Dict] = []
-        uploading = set()
-        logger.info("Validating files")
-        if not task_dirs:
-            cur_dir = os.getcwd()
-            task_dirs = [cur_dir] * len(files_data)
-        for file_data, task_dir in tqdm.tqdm(  # pylint: disable=too-many-nested-blocks
-            zip(files_data, task_dirs), leave=config.log_info
+        if not file_data:
+            return []
+        if not isinstance(file_data, list) or any(
+            not isinstance(obj, dict) for obj in file_data
         ):
-            if not file_data:
-                continue
-            if not isinstance(file_data, list) or any(
-                not isinstance(obj, dict) for obj in file_data
+            logger.warning("Invalid items list")
+            return []
+
+        for item in file_data:
+            if (
+                item.get("items")
+                and isinstance(item.get("segmentations"), list)
+                and len(item.get("segmentations", [])) > 1
             ):
-                logger.warning("Invalid items list")
+                logger.warning(
+                    "Items list contains multiple segmentations."
+                    + " Please use new import format: "
+                    + "https://sdk.redbrickai.com/formats/index.html#import"
+                )
                 continue
 
+        if task_segment_map:
             for item in file_data:
-                if (
-                    item.get("items")
-                    and isinstance(item.get("segmentations"), list)
-                    and len(item.get("segmentations", [])) > 1
-                ):
-                    logger.warning(
-                        "Items list contains multiple segmentations."
-                        + " Please use new import format: "
-                        + "https://sdk.redbrickai.com/formats/index.html#import"
-                    )
-                    continue
-
-            if task_segment_map:
-                for item in file_data:
-                    item["segmentMap"] = item.get("segmentMap", task_segment_map)  # type: ignore
+                item["segmentMap"] = item.get("segmentMap", task_segment_map)  # type: ignore
 
-            if rt_struct:
-                file_data = asyncio.run(
-                    convert_rt_struct_to_nii_labels(
-                        self.context,
-                        self.org_id,
-                        self.taxonomy,
-                        file_data,
-                        storage_id,
-                        label_storage_id,
-                        label_validate,
-                        task_dir,
-                    )
-                )
-
-            file_data = asyncio.run(
-                validate_json(self.context, file_data, storage_id, concurrency)
+        if rt_struct:
+            file_data = await convert_rt_struct_to_nii_labels(  # type: ignore
+                self.context,
+                self.org_id,
+                self.taxonomy,
+                file_data,  # type: ignore
+                storage_id,
+                label_storage_id,
+                label_validate,
+                task_dir,
             )
-            if not file_data:
-                continue
-
-            if storage_id == str(StorageMethod.REDBRICK):
-                logger.info("Looking in your local file system for items")
-            for item in file_data:
-                if (
-                    not isinstance(item.get("items"), list)
-                    or not item["items"]
-                    or not all(isinstance(i, str) for i in item["items"])
-                ):
-                    logger.warning(f"Invalid {item}")
-                    continue
 
-                if "name" not in item:
-                    item["name"] = item["items"][0]
-                if (uploaded and item["name"] in uploaded) or item["name"] in uploading:
-                    logger.info(f"Skipping duplicate item name: {item['name']}")
-                    continue
+        file_data = await validate_json(
+            self.context, file_data, storage_id, concurrency  # type: ignore
+        )
+        if not file_data:
+            return []
+
+        if storage_id == str(StorageMethod.REDBRICK):
+            logger.info("Looking in your local file system for items")
+        for item in file_data:
+            if (
+                not isinstance(item.get("items"), list)
+                or not item["items"]
+                or not all(isinstance(i, str) for i in item["items"])
+            ):
+                logger.warning(f"Invalid {item}")
+                continue
 
-                if "segmentations" in item:
-                    if isinstance(item["segmentations"], list):
-                        item["segmentations"] = {
-                            str(idx): segmentation
-                            for idx, segmentation in enumerate(item["segmentations"])
-                        }
-                    if "labelsMap" not in item and isinstance(
-                        item["segmentations"], dict
-                    ):
-                        item["labelsMap"] = [
-                            (
-                                {"labelName": segmentation, "seriesIndex": int(idx)}
-                                if segmentation
-                                else None
-                            )
-                            for idx, segmentation in item["segmentations"].items()
-                        ]
-                    del item["segmentations"]
-                elif "labelsPath" in item:
-                    if "labelsMap" not in item:
-                        item["labelsMap"] = [
-                            {
-                                "labelName": item["labelsPath"],
-                                "seriesIndex": 0,
-                            }
-                        ]
-                    del item["labelsPath"]
+            if "name" not in item:
+                item["name"] = item["items"][0]
+            if (uploaded and item["name"] in uploaded) or item["name"] in uploading:
+                logger.info(f"Skipping duplicate item name: {item['name']}")
+                continue
 
-                for label_map in item.get("labelsMap", []) or []:
-                    if not isinstance(label_map, dict) or not label_map.get(
-                        "labelName"
-                    ):
-                        continue
-                    if not isinstance(label_map["labelName"], list):
-                        label_map["labelName"] = [label_map["labelName"]]
-                    label_map["labelName"] = [
+            if "segmentations" in item:
+                if isinstance(item["segmentations"], list):
+                    item["segmentations"] = {
+                        str(idx): segmentation
+                        for idx, segmentation in enumerate(item["segmentations"])
+                    }
+                if "labelsMap" not in item and isinstance(item["segmentations"], dict):
+                    item["labelsMap"] = [
                         (
-                            label_name
-                            if os.path.isabs(label_name)
-                            or not os.path.exists(os.path.join(task_dir, label_name))
-                            else os.path.abspath(os.path.join(task_dir, label_name))
+                            {"labelName": segmentation, "seriesIndex": int(idx)}
+                            if segmentation
+                            else None
                         )
-                        for label_name in label_map["labelName"]
+                        for idx, segmentation in item["segmentations"].items()
                     ]
-                    if len(label_map["labelName"]) == 1:
-                        label_map["labelName"] = label_map["labelName"][0]
-
-                for series_info in item.get("seriesInfo", []) or []:
-                    for instance_id, mask in (
-                        series_info.get("masks", {}) or {}
-                    ).items():
-                        series_info["masks"][instance_id] = (
-                            mask
-                            if not isinstance(mask, str)
-                            or os.path.isabs(mask)
-                            or not os.path.exists(os.path.join(task_dir, mask))
-                            else os.path.abspath(os.path.join(task_dir, mask))
-                        )
+                del item["segmentations"]
+            elif "labelsPath" in item:
+                if "labelsMap" not in item:
+                    item["labelsMap"] = [
+                        {
+                            "labelName": item["labelsPath"],
+                            "seriesIndex": 0,
+                        }
+                    ]
+                del item["labelsPath"]
 
-                if storage_id != str(StorageMethod.REDBRICK):
-                    uploading.add(item["name"])
-                    points.append(item)
+            for label_map in item.get("labelsMap", []) or []:
+                if not isinstance(label_map, dict) or not label_map.get("labelName"):
                     continue
-
-                for idx, path in enumerate(item["items"]):
-                    item_path = (
-                        path if os.path.isabs(path) else os.path.join(task_dir, path)
+                if not isinstance(label_map["labelName"], list):
+                    label_map["labelName"] = [label_map["labelName"]]
+                label_map["labelName"] = [
+                    (
+                        label_name
+                        if os.path.isabs(label_name)
+                        or not os.path.exists(os.path.join(task_dir, label_name))
+                        else os.path.abspath(os.path.join(task_dir, label_name))
                     )
-                    if os.path.isfile(item_path):
-                        item["items"][idx] = item_path
-                    else:
-                        if path != DUMMY_FILE_PATH:
-                            logger.warning(
-                                f"Could not find {path}. "
-                                + "Perhaps you forgot to supply the --storage argument"
-                            )
-                        break
-
-                for idx, heat_map in enumerate(item.get("heatMaps") or []):
-                    heat_map_path = (
-                        heat_map["item"]
-                        if os.path.isabs(heat_map["item"])
-                        else os.path.join(task_dir, heat_map["item"])
+                    for label_name in label_map["labelName"]
+                ]
+                if len(label_map["labelName"]) == 1:
+                    label_map["labelName"] = label_map["labelName"][0]
+
+            for series_info in item.get("seriesInfo", []) or []:
+                for instance_id, mask in (series_info.get("masks", {}) or {}).items():
+                    series_info["masks"][instance_id] = (
+                        mask
+                        if not isinstance(mask, str)
+                        or os.path.isabs(mask)
+                        or not os.path.exists(os.path.join(task_dir, mask))
+                        else os.path.abspath(os.path.join(task_dir, mask))
                     )
-                    if os.path.isfile(heat_map_path):
-                        item["heatMaps"][idx]["item"] = heat_map_path
-                    else:
+
+            if storage_id != str(StorageMethod.REDBRICK):
+                uploading.add(item["name"])
+                points.append(item)
+                continue
+
+            for idx, path in enumerate(item["items"]):
+                item_path = (
+                    path if os.path.isabs(path) else os.path.join(task_dir, path)
+                )
+                if os.path.isfile(item_path):
+                    item["items"][idx] = item_path
+                else:
+                    if path != DUMMY_FILE_PATH:
                         logger.warning(
-                            f"Could not find {heat_map['item']}. "
+                            f"Could not find {path}. "
                             + "Perhaps you forgot to supply the --storage argument"
                         )
-                        break
+                    break
 
+            for idx, heat_map in enumerate(item.get("heatMaps") or []):
+                heat_map_path = (
+                    heat_map["item"]
+                    if os.path.isabs(heat_map["item"])
+                    else os.path.join(task_dir, heat_map["item"])
+                )
+                if os.path.isfile(heat_map_path):
+                    item["heatMaps"][idx]["item"] = heat_map_path
                 else:
-                    uploading.add(item["name"])
-                    points.append(item)
+                    logger.warning(
+                        f"Could not find {heat_map['item']}. "
+                        + "Perhaps you forgot to supply the --storage argument"
+                    )
+                    break
+
+            else:
+                uploading.add(item["name"])
+                points.append(item)
+
+        return points
+
+    def prepare_json_files(
+        self,
+        files_data: List[List[InputTask]],
+        storage_id: str,
+        label_storage_id: str,
+        task_segment_map: Optional[Dict],
+        task_dirs: Optional[List[str]] = None,
+        uploaded: Optional[Set[str]] = None,
+        rt_struct: bool = False,
+        label_validate: bool = False,
+        concurrency: int = 50,
+    ) -> List[Dict]:
+        """Prepare items from json files for upload."""
+        logger.debug(f"Preparing {len(files_data)} files for upload")
+        points: List[Dict] = []
+        uploading: Set[str] = set()
+        logger.info("Validating files")
+        if not task_dirs:
+            cur_dir = os.getcwd()
+            task_dirs = [cur_dir] * len(files_data)
+        for file_data, task_dir in tqdm.tqdm(
+            zip(files_data, task_dirs), leave=config.log_info
+        ):
+            points.extend(
+                asyncio.run(
+                    self._prepare_points(
+                        file_data,
+                        storage_id,
+                        label_storage_id,
+                        task_segment_map,
+                        task_dir,
+                        uploading,
+                        uploaded,
+                        rt_struct,
+                        label_validate,
+                        concurrency,
+                    )
+                )
+            )
 
         return points
 
@@ -1063,8 +1524,7 @@ class Upload:
     async def _update_tasks_priorities(
         self, tasks: List[Dict], concurrency: int
     ) -> List[str]:
-        conn = aiohttp.TCPConnector()
-        async with aiohttp.ClientSession(connector=conn) as session:
+        async with self.context.client.aio_session() as session:
             coros = [
                 self.context.upload.update_priority(
                     session,
@@ -1077,7 +1537,6 @@ class Upload:
             errors = await gather_with_concurrency(
                 10, coros, "Updating tasks' priorities"
             )
-        await asyncio.sleep(0.250)  # give time to close ssl connections
         return [error for error in errors if error]
 
     def update_tasks_priority(self, tasks: List[Dict], concurrency: int = 50) -> None:
@@ -1161,8 +1620,7 @@ class Upload:
         time_spent_ms: Optional[int],
         extra_data: Optional[Dict],
     ) -> List[Dict]:
-        conn = aiohttp.TCPConnector()
-        async with aiohttp.ClientSession(connector=conn) as session:
+        async with self.context.client.aio_session() as session:
             coros = [
                 self._update_task_labels(
                     session,
@@ -1177,7 +1635,6 @@ class Upload:
                 for task in tasks
             ]
             temp = await gather_with_concurrency(10, coros, "Updating tasks")
-        await asyncio.sleep(0.250)  # give time to close ssl connections
         return [val for val in temp if val]
 
     def update_tasks_labels(
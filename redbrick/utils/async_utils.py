@@ -1,13 +1,250 @@
 """Async utils."""
 
 import asyncio
-from typing import Any, Awaitable, Coroutine, List, Tuple, TypeVar, Optional, Iterable
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextvars import ContextVar
+from functools import partial
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Coroutine,
+    Deque,
+    Dict,
+    Generic,
+    Hashable,
+    Iterator,
+    List,
+    Set,
+    Sized,
+    Tuple,
+    TypeVar,
+    Optional,
+    Iterable,
+    Union,
+)
 import tqdm.asyncio  # type: ignore
 
 from redbrick.common.constants import MAX_CONCURRENCY
 from redbrick.config import config
 
 ReturnType = TypeVar("ReturnType")  # pylint: disable=invalid-name
+InputType = TypeVar("InputType")  # pylint: disable=invalid-name
+KeyType = TypeVar("KeyType", bound=Hashable)  # pylint: disable=invalid-name
+
+_EXHAUSTED = object()
+
+_process_pools: Dict[str, Tuple[Tuple[int, int], ProcessPoolExecutor]] = {}
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency limiter.
+
+    The limit starts at `initial_limit`, grows by one after each window of healthy
+    completions up to `max_limit`, and is halved on congestion (413/5xx, timeouts)
+    or, unless `latency_threshold` is None, when p95 latency degrades past a
+    threshold of its decaying baseline.
+    """
+
+    def __init__(
+        self,
+        max_limit: int,
+        min_limit: int = 1,
+        initial_limit: Optional[int] = None,
+        latency_window: int = 32,
+        latency_threshold: Optional[float] = 2.0,
+        baseline_decay: float = 0.1,
+    ) -> None:
+        """Construct AdaptiveLimiter."""
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.limit = max(
+            self.min_limit,
+            min(self.max_limit, initial_limit or self.max_limit),
+        )
+        self.latency_threshold = latency_threshold
+        self.baseline_decay = baseline_decay
+
+        self._in_flight = 0
+        self._healthy = 0
+        self._last_decrease = 0.0
+        self._latencies: Deque[float] = deque(maxlen=latency_window)
+        self._baseline_p95: Optional[float] = None
+        self._condition = asyncio.Condition()
+
+    async def acquire(self) -> float:
+        """Wait for a free slot and return the start time."""
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._in_flight < self.limit)
+            self._in_flight += 1
+        return time.monotonic()
+
+    async def release(self, start_time: float, congested: bool = False) -> None:
+        """Free a slot and adapt the limit from the task outcome."""
+        if congested:
+            self.congestion(start_time)
+        else:
+            self._record_latency(time.monotonic() - start_time)
+
+        async with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+    def congestion(self, start_time: Optional[float] = None) -> None:
+        """Multiplicative decrease, once per round of in-flight tasks."""
+        if start_time is not None and start_time < self._last_decrease:
+            return
+        self.limit = max(self.min_limit, self.limit // 2)
+        self._healthy = 0
+        self._latencies.clear()
+        self._last_decrease = time.monotonic()
+
+    def _record_latency(self, latency: float) -> None:
+        self._latencies.append(latency)
+        if (
+            self.latency_threshold is not None
+            and len(self._latencies) == self._latencies.maxlen
+        ):
+            ordered = sorted(self._latencies)
+            p95 = ordered[int(0.95 * (len(ordered) - 1))]
+            baseline = self._baseline_p95
+            # Exponentially weighted, so the baseline follows lasting latency shifts
+            self._baseline_p95 = (
+                p95
+                if baseline is None
+                else baseline + self.baseline_decay * (p95 - baseline)
+            )
+            if baseline is not None and p95 > self.latency_threshold * baseline:
+                self.congestion()
+                return
+
+        self._healthy += 1
+        if self._healthy >= self.limit and self.limit < self.max_limit:
+            self.limit += 1
+            self._healthy = 0
+
+
+# Limiter (and slot start time) of the task currently running in this context
+_current_limiter: ContextVar[Optional[Tuple[AdaptiveLimiter, float]]] = ContextVar(
+    "current_limiter", default=None
+)
+
+
+def report_congestion() -> None:
+    """Signal backend congestion to the limiter running the current task, if any."""
+    current = _current_limiter.get()
+    if current:
+        current[0].congestion(current[1])
+
+
+def is_congestion_error(error: BaseException) -> bool:
+    """Check if an error indicates that the backend or network is overloaded."""
+    return isinstance(error, (TimeoutError, asyncio.TimeoutError, ConnectionError))
+
+
+class RequestBatcher(Generic[KeyType, InputType, ReturnType]):
+    """Coalesce concurrent requests for the same key into batched calls.
+
+    Items submitted within `max_delay` seconds of each other are sent together
+    (flushed early once `max_batch_size` items are pending), and every submitter
+    receives the results for its own items, in order.
+    """
+
+    def __init__(
+        self,
+        func: Callable[[KeyType, List[InputType]], Awaitable[List[ReturnType]]],
+        max_batch_size: int = 100,
+        max_delay: float = 0.05,
+    ) -> None:
+        """Construct RequestBatcher."""
+        self.func = func
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_delay = max_delay
+
+        self._pending: Dict[
+            KeyType, List[Tuple[List[InputType], "asyncio.Future[List[ReturnType]]"]]
+        ] = {}
+        self._sizes: Dict[KeyType, int] = {}
+        self._timers: Dict[KeyType, asyncio.TimerHandle] = {}
+        self._tasks: Set["asyncio.Future[None]"] = set()
+
+    async def submit(
+        self, key: KeyType, items: Iterable[InputType]
+    ) -> List[ReturnType]:
+        """Queue items for the next batch of `key` and wait for their results."""
+        items = list(items)
+        if not items:
+            return []
+
+        loop = asyncio.get_running_loop()
+        future: "asyncio.Future[List[ReturnType]]" = loop.create_future()
+        self._pending.setdefault(key, []).append((items, future))
+        self._sizes[key] = self._sizes.get(key, 0) + len(items)
+
+        if self._sizes[key] >= self.max_batch_size:
+            self._flush(key)
+        elif key not in self._timers:
+            self._timers[key] = loop.call_later(self.max_delay, self._flush, key)
+
+        return await future
+
+    def close(self) -> None:
+        """Drop queued and in-flight batches, cancelling their timers and submitters."""
+        for timer in self._timers.values():
+            timer.cancel()
+        for requests in self._pending.values():
+            for _, future in requests:
+                future.cancel()
+        for task in self._tasks:
+            task.cancel()
+        self._timers.clear()
+        self._pending.clear()
+        self._sizes.clear()
+
+    def _flush(self, key: KeyType) -> None:
+        timer = self._timers.pop(key, None)
+        if timer:
+            timer.cancel()
+        self._sizes.pop(key, None)
+        requests = self._pending.pop(key, [])
+        if requests:
+            task = asyncio.ensure_future(self._send(key, requests))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send(
+        self,
+        key: KeyType,
+        requests: List[Tuple[List[InputType], "asyncio.Future[List[ReturnType]]"]],
+    ) -> None:
+        items = [item for batch, _ in requests for item in batch]
+        try:
+            results = await self.func(key, items)
+            if len(results) != len(items):
+                raise ValueError(
+                    f"Batched request returned {len(results)} results for {len(items)} items"
+                )
+        except asyncio.CancelledError:
+            for _, future in requests:
+                future.cancel()
+            raise
+        except Exception as error:  # pylint: disable=broad-except
+            for _, future in requests:
+                if not future.done():
+                    future.set_exception(error)
+            return
+
+        offset = 0
+        for batch, future in requests:
+            if not future.done():
+                future.set_result(results[offset : offset + len(batch)])
+            offset += len(batch)
 
 
 async def return_value(value: ReturnType) -> ReturnType:
@@ -21,8 +258,13 @@ async def gather_with_concurrency(
     progress_bar_name: Optional[str] = None,
     keep_progress_bar: bool = True,
     return_exceptions: bool = False,
+    max_limit: Optional[int] = None,
 ) -> List[ReturnType]:
-    """Utilizes a Semaphore to limit concurrency to n."""
+    """Run tasks with at most n at a time, backing off on reported congestion.
+
+    Pass `max_limit` to let the limit grow past n (up to `max_limit`) while p95
+    latency stays healthy; only do so when each task is a single request.
+    """
     # pylint: disable=too-many-locals
     if not tasks:
         return []
@@ -49,11 +291,23 @@ async def gather_with_concurrency(
                     raise exc
         return output
 
-    semaphore = asyncio.Semaphore(max_concurrency)
+    limiter = (
+        AdaptiveLimiter(max_limit, initial_limit=max_concurrency)
+        if max_limit and max_limit > max_concurrency
+        else AdaptiveLimiter(max_concurrency, latency_threshold=None)
+    )
 
     async def sem_task(task: Awaitable[ReturnType]) -> ReturnType:
-        async with semaphore:
+        start_time = await limiter.acquire()
+        _current_limiter.set((limiter, start_time))
+        congested = False
+        try:
             return await task
+        except Exception as exc:
+            congested = is_congestion_error(exc)
+            raise
+        finally:
+            await limiter.release(start_time, congested)
 
     coros = [sem_task(task) for task in tasks]
     if not progress_bar_name:
@@ -84,3 +338,261 @@ async def gather_with_concurrency(
         result.append((idx, value))
 
     return [res[1] for res in sorted(result, key=lambda x: x[0])]
+
+
+async def iterate_with_concurrency(
+    max_concurrency: int,
+    items: Iterable[InputType],
+    func: Callable[[InputType], Awaitable[ReturnType]],
+    ordered: bool = True,
+) -> AsyncIterator[ReturnType]:
+    """Map `func` over `items` keeping at most n tasks in flight.
+
+    Items are pulled lazily in a worker thread, so a blocking producer
+    (e.g. a paginated API iterator) overlaps with the running tasks.
+    Results are yielded in input order, or as they complete if `ordered` is False.
+    """
+    loop = asyncio.get_running_loop()
+    iterator = iter(items)
+    max_concurrency = max(1, max_concurrency)
+    pending: Deque["asyncio.Future[ReturnType]"] = deque()
+    next_item = loop.run_in_executor(None, next, iterator, _EXHAUSTED)
+    exhausted = False
+
+    try:
+        while True:
+            while not exhausted and len(pending) < max_concurrency:
+                item = await next_item
+                if item is _EXHAUSTED:
+                    exhausted = True
+                    break
+                pending.append(asyncio.ensure_future(func(item)))  # type: ignore
+                next_item = loop.run_in_executor(None, next, iterator, _EXHAUSTED)
+
+            if not pending:
+                break
+
+            if ordered:
+                yield await pending.popleft()
+                continue
+
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in [future for future in pending if future in done]:
+                pending.remove(future)
+                yield future.result()
+    finally:
+        for future in pending:
+            future.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+
+def iterate_in_event_loop(aiterator: AsyncIterator[ReturnType]) -> Iterator[ReturnType]:
+    """Drive an async iterator from synchronous code using a single event loop."""
+    loop = asyncio.new_event_loop()
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(
+                    aiterator.__anext__()  # pylint: disable=unnecessary-dunder-call
+                )
+            except StopAsyncIteration:
+                break
+    finally:
+        try:
+            loop.run_until_complete(aiterator.aclose())  # type: ignore
+            loop.run_until_complete(loop.shutdown_asyncgens())
+        finally:
+            loop.close()
+
+
+async def iterate_async(
+    items: Union[Iterable[InputType], AsyncIterable[InputType]],
+) -> AsyncIterator[InputType]:
+    """Iterate over an iterable or async iterable from async code.
+
+    Items of lazy iterables are pulled in a worker thread, so a blocking
+    producer does not stall the event loop.
+    """
+    if isinstance(items, AsyncIterable):
+        async for item in items:
+            yield item
+        return
+
+    if isinstance(items, (list, tuple)):
+        for item in items:
+            yield item
+        return
+
+    loop = asyncio.get_running_loop()
+    iterator: Iterator[Any] = iter(items)
+    while True:
+        next_item: Any = await loop.run_in_executor(None, next, iterator, _EXHAUSTED)
+        if next_item is _EXHAUSTED:
+            return
+        yield next_item
+
+
+async def stream_pipeline_with_concurrency(
+    items: Union[Iterable[Any], AsyncIterable[Any]],
+    stages: List[Tuple[int, Callable[[Any], Awaitable[Any]]]],
+    progress_bar_name: Optional[str] = None,
+    keep_progress_bar: bool = True,
+) -> AsyncIterator[Tuple[int, Any]]:
+    """Pass items through a chain of async stages, yielding `(index, result)` pairs.
+
+    Every stage is a (workers, func) pair fed by a bounded queue, so slow stages
+    apply backpressure while the others keep running on later items.
+    Items are consumed lazily and results are yielded as they complete, so only
+    the items in flight are held in memory. Failed items yield their exception.
+    """
+    # pylint: disable=too-many-locals
+    if not config.log_info:
+        keep_progress_bar = False
+
+    queues: List["asyncio.Queue[Optional[Tuple[int, Any]]]"] = [
+        asyncio.Queue(maxsize=2 * max(1, workers)) for workers, _ in stages
+    ]
+    results: "asyncio.Queue[Optional[Tuple[int, Any]]]" = asyncio.Queue(
+        maxsize=2 * max(1, stages[-1][0])
+    )
+    feed_errors: List[Exception] = []
+    progress = (
+        tqdm.tqdm(
+            total=len(items) if isinstance(items, Sized) else None,
+            desc=progress_bar_name,
+            leave=keep_progress_bar,
+        )
+        if progress_bar_name
+        else None
+    )
+
+    async def _worker(stage: int) -> None:
+        func = stages[stage][1]
+        output = queues[stage + 1] if stage + 1 < len(stages) else results
+        while True:
+            entry = await queues[stage].get()
+            if entry is None:
+                break
+            idx, value = entry
+            try:
+                value = await func(value)
+            except Exception as exc:  # pylint: disable=broad-except
+                await results.put((idx, exc))
+                continue
+            await output.put((idx, value))
+
+    async def _stage(stage: int) -> None:
+        workers = max(1, stages[stage][0])
+        await asyncio.gather(*(_worker(stage) for _ in range(workers)))
+        if stage + 1 < len(stages):
+            for _ in range(max(1, stages[stage + 1][0])):
+                await queues[stage + 1].put(None)
+        else:
+            await results.put(None)
+
+    async def _feed() -> None:
+        try:
+            idx = 0
+            async for item in iterate_async(items):
+                await queues[0].put((idx, item))
+                idx += 1
+        except Exception as exc:  # pylint: disable=broad-except
+            feed_errors.append(exc)
+        finally:
+            for _ in range(max(1, stages[0][0])):
+                await queues[0].put(None)
+
+    tasks = [asyncio.ensure_future(_feed())] + [
+        asyncio.ensure_future(_stage(stage)) for stage in range(len(stages))
+    ]
+    try:
+        while True:
+            entry = await results.get()
+            if entry is None:
+                break
+            if progress is not None:
+                progress.update()
+            yield entry
+        await asyncio.gather(*tasks)
+        if feed_errors:
+            raise feed_errors[0]
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if progress is not None:
+            progress.close()
+
+
+async def pipeline_with_concurrency(
+    items: Iterable[Any],
+    stages: List[Tuple[int, Callable[[Any], Awaitable[Any]]]],
+    progress_bar_name: Optional[str] = None,
+    keep_progress_bar: bool = True,
+    return_exceptions: bool = False,
+) -> List[Any]:
+    """Pass items through a chain of async stages, each with its own worker pool.
+
+    See :func:`stream_pipeline_with_concurrency`. Results are returned in input order.
+    """
+    items = list(items)
+    if not items:
+        return []
+
+    results: List[Any] = [None] * len(items)
+    async for idx, value in stream_pipeline_with_concurrency(
+        items, stages, progress_bar_name, keep_progress_bar
+    ):
+        results[idx] = value
+
+    if not return_exceptions:
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+    return results
+
+
+def get_process_pool(
+    pool: str, workers: int, max_tasks_per_child: int = 0
+) -> ProcessPoolExecutor:
+    """Get (or create) the shared process pool named `pool`.
+
+    The pool is recreated when its worker settings change.
+    """
+    settings = (workers, max_tasks_per_child)
+    if pool in _process_pools:
+        if _process_pools[pool][0] == settings:
+            return _process_pools[pool][1]
+        _process_pools.pop(pool)[1].shutdown(wait=False)
+
+    if max_tasks_per_child > 0 and sys.version_info >= (3, 11):
+        executor = ProcessPoolExecutor(workers, max_tasks_per_child=max_tasks_per_child)
+    else:
+        executor = ProcessPoolExecutor(workers)
+    _process_pools[pool] = (settings, executor)
+    return executor
+
+
+async def run_in_process_pool(
+    pool: str,
+    func: Callable[..., ReturnType],
+    *args: Any,
+    workers: int,
+    max_tasks_per_child: int = 0,
+) -> ReturnType:
+    """Run a CPU-bound function in the process pool named `pool`.
+
+    With no workers, it runs in the event loop's default thread pool instead.
+    """
+    loop = asyncio.get_running_loop()
+    if workers <= 0:
+        return await loop.run_in_executor(None, partial(func, *args))
+
+    executor = get_process_pool(pool, workers, max_tasks_per_child)
+    try:
+        return await loop.run_in_executor(executor, partial(func, *args))
+    except BrokenProcessPool:
+        if pool in _process_pools and _process_pools[pool][1] is executor:
+            del _process_pools[pool]
+        raise
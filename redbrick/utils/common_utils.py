@@ -32,3 +32,12 @@ def hash_sha256(message: Union[str, bytes]) -> str:
     sha256 = hashlib.sha256()
     sha256.update(message.encode() if isinstance(message, str) else message)
     return sha256.hexdigest()
+
+
+def hash_file_sha256(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """Return SHA256 of a file's contents, read in chunks."""
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as file_:
+        for chunk in iter(lambda: file_.read(chunk_size), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
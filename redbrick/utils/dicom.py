@@ -1,18 +1,21 @@
 """Dicom/nifti related functions."""
 
 import os
-from typing import Any, Dict, List, Optional, Set, Tuple, Union, TypedDict
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Union, TypedDict
 from asyncio import BoundedSemaphore
 import shutil
 from uuid import uuid4
 from redbrick.types.taxonomy import ObjectType, Taxonomy
 
+from redbrick.config import config
+from redbrick.utils.async_utils import run_in_process_pool
 from redbrick.utils.common_utils import config_path
-from redbrick.utils.files import uniquify_path
+from redbrick.utils.files import is_gzipped_data, uniquify_path
 from redbrick.utils.logging import log_error, logger
 from redbrick.types.task import SegmentMap as TypeSegmentMap
 
 # pylint: disable=too-many-locals, import-outside-toplevel, too-many-branches, too-many-statements
+# pylint: disable=too-many-lines
 
 
 semaphore = BoundedSemaphore(1)
@@ -27,6 +30,40 @@ class LabelMapData(TypedDict):
     masks: Optional[Union[str, List[str]]]
 
 
+def load_mask(img: Any, dtype: Optional[Any] = None) -> Any:
+    """Load the voxel data of a label map as integers.
+
+    Unscaled integer data keeps its stored dtype (memory-mapped for uncompressed
+    files), anything else is rounded into the smallest integer dtype that holds
+    its range. Pass `dtype` to convert to a specific dtype instead.
+    """
+    import numpy  # type: ignore
+
+    stored_dtype = numpy.dtype(img.dataobj.dtype)
+    if (
+        getattr(img.dataobj, "slope", 1.0) == 1.0
+        and getattr(img.dataobj, "inter", 0.0) == 0.0
+        and stored_dtype.kind in "biuf"
+    ):
+        data = numpy.asanyarray(img.dataobj)
+    else:
+        data = img.get_fdata(caching="unchanged")
+
+    if data.dtype.kind == "b":
+        data = data.view(numpy.uint8)
+    elif data.dtype.kind == "f":
+        data = numpy.round(data)
+        if dtype is None:
+            low, high = (int(data.min()), int(data.max())) if data.size else (0, 0)
+            dtype = numpy.result_type(
+                numpy.min_scalar_type(low), numpy.min_scalar_type(high)
+            )
+
+    if dtype is not None:
+        data = data.astype(dtype, copy=False)
+    return data
+
+
 def merge_segmentations(
     input_file: str,
     input_instance: int,
@@ -46,7 +83,7 @@ def merge_segmentations(
             log_error(f"{input_file} is not a valid NIfTI1 file.")
             return False
 
-        input_data = input_img.get_fdata(caching="unchanged")
+        input_data = load_mask(input_img)
 
         if os.path.isfile(output_file):
             output_img = nib_load(output_file)
@@ -57,8 +94,7 @@ def merge_segmentations(
 
             output_affine = output_img.affine
             output_header = output_img.header
-            output_data = output_img.get_fdata(caching="unchanged")
-            output_data = numpy.round(output_data).astype(numpy.uint16)
+            output_data = numpy.array(load_mask(output_img, numpy.uint16))
         else:
             output_affine = input_img.affine
             output_header = input_img.header
@@ -79,6 +115,40 @@ def merge_segmentations(
         return False
 
 
+def _voxels_by_value(data: Any) -> Callable[[Any], Any]:
+    """Index the voxels of a volume by value in a single pass.
+
+    Returns a lookup of the flat (C-order) voxel indices equal to a given value.
+    """
+    import numpy  # type: ignore
+
+    flat = data.reshape(-1)
+    indices = numpy.flatnonzero(flat)
+    values = flat[indices]
+    order = numpy.argsort(values, kind="stable")
+    indices, values = indices[order], values[order]
+    uniques, starts, counts = numpy.unique(
+        values, return_index=True, return_counts=True
+    )
+    bounds = {
+        value: (start, start + count)
+        for value, start, count in zip(
+            uniques.tolist(), starts.tolist(), counts.tolist()
+        )
+    }
+    empty = numpy.empty(0, dtype=indices.dtype)
+
+    def lookup(value: Any) -> Any:
+        if value == 0:
+            return numpy.flatnonzero(flat == 0)
+        if value not in bounds:
+            return empty
+        start, end = bounds[value]
+        return indices[start:end]
+
+    return lookup
+
+
 def convert_to_binary(
     mask: str, labels: List[Dict], dirname: str
 ) -> Tuple[bool, List[str]]:
@@ -95,22 +165,24 @@ def convert_to_binary(
 
     affine = img.affine
     header = img.header
-    data = img.get_fdata(caching="unchanged")
-
+    data = load_mask(img)
+    voxels = _voxels_by_value(data)
     files: List[str] = []
 
     for label in labels:
         instances: Set[int] = set(
             [label["dicom"]["instanceid"]] + (label["dicom"].get("groupids", []) or [])
         )
+        indices = [voxels(instance) for instance in instances]
+        if not any(len(index) for index in indices):
+            continue
+
         new_data = numpy.zeros(
             data.shape, dtype=numpy.uint8 if max(instances) <= 255 else numpy.uint16
         )
-        for instance in instances:
-            new_data[data == instance] = 1
-
-        if not numpy.any(new_data):
-            continue
+        flat_data = new_data.reshape(-1)
+        for index in indices:
+            flat_data[index] = 1
 
         filename = os.path.join(
             dirname, f"instance-{label['dicom']['instanceid']}.nii.gz"
@@ -127,6 +199,89 @@ def convert_to_binary(
     return True, files
 
 
+def _remap_values(data: Any, mapping: Dict[int, int]) -> Any:
+    """Remap label values through a lookup table, unmapped values become 0."""
+    import numpy  # type: ignore
+
+    if data.dtype.kind in "iu" and data.size:
+        low, high = int(data.min()), int(data.max())
+        if low >= 0 and high < 2**16:
+            lut = numpy.zeros(high + 1, dtype=numpy.uint16)
+            for value, category in mapping.items():
+                if 0 <= value <= high:
+                    lut[value] = category
+            return lut[data]
+
+    voxels = _voxels_by_value(data)
+    output = numpy.zeros(data.shape, dtype=numpy.uint16)
+    flat_output = output.reshape(-1)
+    for value, category in mapping.items():
+        flat_output[voxels(value)] = category
+    return output
+
+
+def _convert_to_semantic_binary(labels: List[Dict], dirname: str) -> List[str]:
+    """Merge binary instance files into one binary file per category."""
+    import numpy  # type: ignore
+    from nibabel.loadsave import load as nib_load, save as nib_save  # type: ignore
+    from nibabel.nifti1 import Nifti1Image  # type: ignore
+
+    categories: Dict[int, List[Dict]] = {}
+    for label in labels:
+        categories.setdefault(label["classid"] + 1, []).append(label)
+
+    files: List[str] = []
+    for category, category_labels in categories.items():
+        output_filename = os.path.join(dirname, f"category-{category}.nii.gz")
+        output_img: Any = None
+        output_data: Any = None
+        if os.path.isfile(output_filename):
+            try:
+                output_img = nib_load(output_filename)
+                if not isinstance(output_img, Nifti1Image):
+                    log_error(f"{output_filename} is not a valid NIfTI1 file.")
+                    for label in category_labels:
+                        log_error(f"Error processing semantic mask for: {label}")
+                    continue
+                output_data = numpy.array(load_mask(output_img, numpy.uint16))
+            except Exception as err:  # pylint: disable=broad-except
+                log_error(err)
+                for label in category_labels:
+                    log_error(f"Error processing semantic mask for: {label}")
+                continue
+
+        merged = False
+        for label in category_labels:
+            input_filename = os.path.join(
+                dirname, f"instance-{label['dicom']['instanceid']}.nii.gz"
+            )
+            try:
+                input_img = nib_load(input_filename)
+                if not isinstance(input_img, Nifti1Image):
+                    log_error(f"{input_filename} is not a valid NIfTI1 file.")
+                    log_error(f"Error processing semantic mask for: {label}")
+                    continue
+                input_data = load_mask(input_img)
+            except Exception as err:  # pylint: disable=broad-except
+                log_error(err)
+                log_error(f"Error processing semantic mask for: {label}")
+                continue
+
+            if output_img is None:
+                output_img = input_img
+                output_data = numpy.zeros(input_data.shape, dtype=numpy.uint16)
+            output_data[input_data == 1] = 1
+            merged = True
+
+        if merged and output_img is not None:
+            new_img = Nifti1Image(output_data, output_img.affine, output_img.header)
+            new_img.set_data_dtype(numpy.uint16)
+            nib_save(new_img, output_filename)
+            files.append(output_filename)
+
+    return files
+
+
 def convert_to_semantic(
     masks: List[str],
     taxonomy: Taxonomy,
@@ -135,6 +290,10 @@ def convert_to_semantic(
     binary_mask: bool,
 ) -> Tuple[bool, List[str]]:
     """Convert segmentation to semantic."""
+    import numpy  # type: ignore
+    from nibabel.loadsave import load as nib_load, save as nib_save  # type: ignore
+    from nibabel.nifti1 import Nifti1Image  # type: ignore
+
     if not taxonomy.get("isNew"):
         log_error("Taxonomy V1 is not supported")
         return False, masks
@@ -143,45 +302,40 @@ def convert_to_semantic(
         log_error(f"Cannot process labels: {labels}")
         return False, masks
 
-    input_filename = output_filename = masks[0]
-    if not binary_mask:
-        input_filename = f"{output_filename}.old.nii.gz"
-        os.rename(output_filename, input_filename)
+    if binary_mask:
+        return True, _convert_to_semantic_binary(labels, dirname)
 
-    visited: Set[int] = set()
-    files: Set[str] = set()
+    output_filename = masks[0]
+    input_filename = f"{output_filename}.old.nii.gz"
+    os.rename(output_filename, input_filename)
+
+    # Instances always take their category, group ids only if not yet assigned
+    mapping: Dict[int, int] = {}
     for label in labels:
-        instance = label["dicom"]["instanceid"]
         category = label["classid"] + 1
-        if binary_mask:
-            input_filename = os.path.join(dirname, f"instance-{instance}.nii.gz")
-            output_filename = os.path.join(dirname, f"category-{category}.nii.gz")
-            merged = merge_segmentations(input_filename, 1, True, output_filename, 1)
-        else:
-            merged = merge_segmentations(
-                input_filename, instance, True, output_filename, category
-            )
-            visited.add(instance)
-            for group_id in label["dicom"].get("groupids", []) or []:
-                if group_id in visited:
-                    continue
-                group_merged = merge_segmentations(
-                    input_filename, group_id, True, output_filename, category
-                )
-                if group_merged:
-                    visited.add(group_id)
-                else:
-                    log_error(f"Error processing semantic mask for: {label}")
-
-        if merged:
-            files.add(output_filename)
-        else:
-            log_error(f"Error processing semantic mask for: {label}")
+        mapping[label["dicom"]["instanceid"]] = category
+        for group_id in label["dicom"].get("groupids", []) or []:
+            mapping.setdefault(group_id, category)
 
-    if not binary_mask:
+    files: List[str] = []
+    try:
+        if labels:
+            # Not memory-mapped, the input file is removed below
+            img = nib_load(input_filename, mmap=False)
+            if not isinstance(img, Nifti1Image):
+                raise ValueError(f"{input_filename} is not a valid NIfTI1 file.")
+            output_data = _remap_values(load_mask(img), mapping)
+            new_img = Nifti1Image(output_data, img.affine, img.header)
+            new_img.set_data_dtype(numpy.uint16)
+            nib_save(new_img, output_filename)
+            files.append(output_filename)
+    except Exception as err:  # pylint: disable=broad-except
+        log_error(err)
+        log_error(f"Error processing semantic mask for: {labels}")
+    finally:
         os.remove(input_filename)
 
-    return True, list(files)
+    return True, files
 
 
 def convert_nii_to_png(
@@ -223,12 +377,12 @@ def convert_nii_to_png(
             continue
 
         input_filename = os.path.basename(mask)[:-7]
-        mask_data = mask_img.get_fdata(caching="unchanged")
+        mask_data = load_mask(mask_img)
         if mask_data.shape[2] != 1:
             log_error(f"{mask} is not a 2D image")
             continue
 
-        mask_arr = numpy.round(mask_data).astype(numpy.uint16).swapaxes(0, 1)
+        mask_arr = mask_data.swapaxes(0, 1)
         mask_arr = mask_arr.reshape(mask_arr.shape[0], mask_arr.shape[1])
         if binary_mask:
             color_mask = numpy.zeros((mask_arr.shape[0], mask_arr.shape[1], 3))
@@ -293,7 +447,7 @@ def convert_png_to_nii(masks: Dict[str, Tuple[int, ...]]) -> None:
         masks[mask + ".nii.gz"] = inst_ids
 
 
-async def process_nifti_download(
+def _process_nifti_download(
     labels: List[Dict],
     labels_path: Optional[str],
     png_mask: bool,
@@ -303,105 +457,135 @@ async def process_nifti_download(
     taxonomy: Taxonomy,
     volume_index: Optional[int],
 ) -> LabelMapData:
-    """Process nifti download file."""
+    """Process nifti download file (CPU-bound)."""
     label_map_data = LabelMapData(
         semantic_mask=False, binary_mask=False, png_mask=False, masks=labels_path
     )
-    async with semaphore:
-        try:
-            if not (labels_path and os.path.isfile(labels_path)):
-                return label_map_data
-
-            filtered_labels = [
-                label
-                for label in labels
-                if label.get("dicom")
-                and (
-                    volume_index is None
-                    or label.get("volumeindex") is None
-                    or label["volumeindex"] == volume_index
-                )
-            ]
-
-            binary_mask = (
-                binary_mask
-                if binary_mask is not None
-                else any(label["dicom"].get("groupids") for label in filtered_labels)
+    try:
+        if not (labels_path and os.path.isfile(labels_path)):
+            return label_map_data
+
+        filtered_labels = [
+            label
+            for label in labels
+            if label.get("dicom")
+            and (
+                volume_index is None
+                or label.get("volumeindex") is None
+                or label["volumeindex"] == volume_index
             )
+        ]
 
-            if not (png_mask or binary_mask or semantic_mask):
-                return label_map_data
+        binary_mask = (
+            binary_mask
+            if binary_mask is not None
+            else any(label["dicom"].get("groupids") for label in filtered_labels)
+        )
 
-            dirname = (
-                os.path.splitext(labels_path)[0]
-                if labels_path.endswith(".gz")
-                else labels_path
-            )
-            dirname = os.path.splitext(dirname)[0]
-            shutil.rmtree(dirname, ignore_errors=True)
-            os.makedirs(dirname, exist_ok=True)
+        if not (png_mask or binary_mask or semantic_mask):
+            return label_map_data
 
-            if binary_mask:
+        dirname = (
+            os.path.splitext(labels_path)[0]
+            if labels_path.endswith(".gz")
+            else labels_path
+        )
+        dirname = os.path.splitext(dirname)[0]
+        shutil.rmtree(dirname, ignore_errors=True)
+        os.makedirs(dirname, exist_ok=True)
+
+        if binary_mask:
+            (
+                label_map_data["binary_mask"],
+                label_map_data["masks"],
+            ) = convert_to_binary(labels_path, filtered_labels, dirname)
+        else:
+            label_map_data["masks"] = [labels_path]
+
+        if semantic_mask and label_map_data["masks"]:
+            (
+                label_map_data["semantic_mask"],
+                label_map_data["masks"],
+            ) = convert_to_semantic(
                 (
-                    label_map_data["binary_mask"],
-                    label_map_data["masks"],
-                ) = convert_to_binary(labels_path, filtered_labels, dirname)
-            else:
-                label_map_data["masks"] = [labels_path]
+                    [label_map_data["masks"]]
+                    if isinstance(label_map_data["masks"], str)
+                    else label_map_data["masks"]
+                ),
+                taxonomy,
+                filtered_labels,
+                dirname,
+                label_map_data["binary_mask"],
+            )
 
-            if semantic_mask and label_map_data["masks"]:
+        if label_map_data["semantic_mask"]:
+            for path in os.listdir(dirname):
+                if path.startswith("instance-"):
+                    os.remove(os.path.join(dirname, path))
+
+        if png_mask and label_map_data["masks"]:
+            label_map_data["png_mask"], label_map_data["masks"] = convert_nii_to_png(
                 (
-                    label_map_data["semantic_mask"],
-                    label_map_data["masks"],
-                ) = convert_to_semantic(
-                    (
-                        [label_map_data["masks"]]
-                        if isinstance(label_map_data["masks"], str)
-                        else label_map_data["masks"]
-                    ),
-                    taxonomy,
-                    filtered_labels,
-                    dirname,
-                    label_map_data["binary_mask"],
-                )
+                    [label_map_data["masks"]]
+                    if isinstance(label_map_data["masks"], str)
+                    else label_map_data["masks"]
+                ),
+                color_map,
+                filtered_labels,
+                dirname,
+                label_map_data["binary_mask"],
+                label_map_data["semantic_mask"],
+                bool(taxonomy.get("isNew")),
+            )
 
-            if label_map_data["semantic_mask"]:
-                for path in os.listdir(dirname):
-                    if path.startswith("instance-"):
-                        os.remove(os.path.join(dirname, path))
-
-            if png_mask and label_map_data["masks"]:
-                label_map_data["png_mask"], label_map_data["masks"] = (
-                    convert_nii_to_png(
-                        (
-                            [label_map_data["masks"]]
-                            if isinstance(label_map_data["masks"], str)
-                            else label_map_data["masks"]
-                        ),
-                        color_map,
-                        filtered_labels,
-                        dirname,
-                        label_map_data["binary_mask"],
-                        label_map_data["semantic_mask"],
-                        bool(taxonomy.get("isNew")),
-                    )
-                )
+        if label_map_data["png_mask"]:
+            for path in os.listdir(dirname):
+                if path.startswith("instance-") or path.startswith("category-"):
+                    os.remove(os.path.join(dirname, path))
 
-            if label_map_data["png_mask"]:
-                for path in os.listdir(dirname):
-                    if path.startswith("instance-") or path.startswith("category-"):
-                        os.remove(os.path.join(dirname, path))
+        if not os.listdir(dirname):
+            shutil.rmtree(dirname)
 
-            if not os.listdir(dirname):
-                shutil.rmtree(dirname)
+    except Exception as error:  # pylint: disable=broad-except
+        log_error(f"Failed to process {labels_path}: {error}")
 
-        except Exception as error:  # pylint: disable=broad-except
-            log_error(f"Failed to process {labels_path}: {error}")
+    return label_map_data
 
-        return label_map_data
 
+async def process_nifti_download(
+    labels: List[Dict],
+    labels_path: Optional[str],
+    png_mask: bool,
+    color_map: Dict,
+    semantic_mask: bool,
+    binary_mask: Optional[bool],
+    taxonomy: Taxonomy,
+    volume_index: Optional[int],
+) -> LabelMapData:
+    """Process nifti download file."""
+    try:
+        return await run_in_process_pool(
+            "mask",
+            _process_nifti_download,
+            labels,
+            labels_path,
+            png_mask,
+            color_map,
+            semantic_mask,
+            binary_mask,
+            taxonomy,
+            volume_index,
+            workers=config.mask_workers,
+            max_tasks_per_child=config.mask_max_tasks_per_child,
+        )
+    except Exception as error:  # pylint: disable=broad-except
+        log_error(f"Failed to process {labels_path}: {error}")
+        return LabelMapData(
+            semantic_mask=False, binary_mask=False, png_mask=False, masks=labels_path
+        )
 
-async def process_nifti_upload(
+
+def _process_nifti_upload(
     files: Union[str, List[str]],
     instances: Dict[int, Optional[List[int]]],
     binary_mask: bool,
@@ -410,207 +594,228 @@ async def process_nifti_upload(
     masks: Dict[str, str],
     label_validate: bool,
 ) -> Tuple[Optional[str], Dict[int, List[int]]]:
-    """Process nifti upload files."""
+    """Process nifti upload files (CPU-bound)."""
     # pylint: disable=too-many-locals, too-many-branches, import-outside-toplevel
     # pylint: disable=too-many-statements, too-many-return-statements, unused-argument
-    async with semaphore:
-        import numpy  # type: ignore
-        from nibabel.loadsave import load as nib_load, save as nib_save  # type: ignore
-        from nibabel.nifti1 import Nifti1Image  # type: ignore
-        from nibabel.nifti2 import Nifti2Image  # type: ignore
+    import numpy  # type: ignore
+    from nibabel.loadsave import load as nib_load, save as nib_save  # type: ignore
+    from nibabel.nifti1 import Nifti1Image  # type: ignore
+    from nibabel.nifti2 import Nifti2Image  # type: ignore
 
-        if isinstance(files, str):
-            files = [files]
-        if not files or any(
-            not isinstance(file_, str) or not os.path.isfile(file_) for file_ in files
-        ):
-            return None, {}
+    if isinstance(files, str):
+        files = [files]
+    if not files or any(
+        not isinstance(file_, str) or not os.path.isfile(file_) for file_ in files
+    ):
+        return None, {}
 
-        reverse_masks: Dict[str, Tuple[int, ...]] = {}
-        for inst_id, mask in masks.items():
-            reverse_masks[mask] = reverse_masks.setdefault(mask, tuple()) + (
-                int(inst_id),
-            )
+    reverse_masks: Dict[str, Tuple[int, ...]] = {}
+    for inst_id, mask in masks.items():
+        reverse_masks[mask] = reverse_masks.setdefault(mask, tuple()) + (int(inst_id),)
 
-        if png_mask:
-            if not binary_mask:
-                log_error("PNG mask upload only supports binary masks")
+    if png_mask:
+        if not binary_mask:
+            log_error("PNG mask upload only supports binary masks")
+            return None, {}
+
+        for mask, inst_ids in reverse_masks.items():
+            if len(inst_ids) > 1:
+                log_error(
+                    f"PNG mask upload only supports single instance per file: '{mask}'"
+                )
                 return None, {}
 
-            for mask, inst_ids in reverse_masks.items():
-                if len(inst_ids) > 1:
-                    log_error(
-                        f"PNG mask upload only supports single instance per file: '{mask}'"
-                    )
-                    return None, {}
+        convert_png_to_nii(reverse_masks)
+        files = list(reverse_masks.keys())
 
-            convert_png_to_nii(reverse_masks)
-            files = list(reverse_masks.keys())
+    if len(files) == 1 and not label_validate:
+        return files[0], {}
 
-        if len(files) == 1 and not label_validate:
-            return files[0], {}
+    if binary_mask:
+        for file, instance_numbers in reverse_masks.items():
+            if len(instance_numbers) > 1:
+                log_error(
+                    f"Each instance must have a unique file if binary_mask is True: '{file}' ({instance_numbers})"
+                )
+                return None, {}
 
-        if binary_mask:
-            for file, instance_numbers in reverse_masks.items():
-                if len(instance_numbers) > 1:
-                    log_error(
-                        f"Each instance must have a unique file if binary_mask is True: '{file}' ({instance_numbers})"
-                    )
-                    return None, {}
+    try:
+        base_img = nib_load(files[0])
 
-        try:
-            base_img = nib_load(files[0])
+        if not isinstance(base_img, Nifti1Image) and not isinstance(
+            base_img, Nifti2Image
+        ):
+            return None, {}
 
-            if not isinstance(base_img, Nifti1Image) and not isinstance(
-                base_img, Nifti2Image
-            ):
-                return None, {}
+        base_data = load_mask(base_img, numpy.uint16)
+        if base_img.get_data_dtype() != numpy.uint16:
+            base_img.set_data_dtype(numpy.uint16)
 
-            if base_img.get_data_dtype() != numpy.uint16:
-                base_data = base_img.get_fdata(caching="unchanged")
-                base_data = numpy.round(base_data).astype(numpy.uint16)  # type: ignore
-                base_img.set_data_dtype(numpy.uint16)
-            else:
-                base_data = numpy.asanyarray(base_img.dataobj, dtype=numpy.uint16)
+        if base_data.ndim != 3:
+            return None, {}
 
-            if base_data.ndim != 3:
-                return None, {}
+        used_instances: Set[int] = set()
+        instance_keys: Set[int] = set()
+        instance_map: Dict[int, Set[int]] = {}
+        instance_pool = set(range(1, 65536))
+        for instance_id, instance_groups in instances.items():
+            instance_keys.add(instance_id)
+            if instance_groups:
+                instance_pool -= set(instance_groups)
+                for instance_group in instance_groups:
+                    instance_map.setdefault(instance_group, set()).add(instance_id)
+        instance_pool -= instance_keys
+
+        group_instances = sorted(instance_pool, reverse=True)
+
+        if binary_mask and files[0] in reverse_masks:
+            instance_number = reverse_masks[files[0]][0]
+            base_data[numpy.nonzero(base_data)] = instance_number
+            used_instances.add(instance_number)
+        elif label_validate:
+            non_zero_base_data = base_data[numpy.nonzero(base_data)]
+            used_instances = (
+                set(x.item() for x in numpy.unique(non_zero_base_data).round())
+                & instance_keys
+            )
 
-            used_instances: Set[int] = set()
-            instance_keys: Set[int] = set()
-            instance_map: Dict[int, Set[int]] = {}
-            instance_pool = set(range(1, 65536))
-            for instance_id, instance_groups in instances.items():
-                instance_keys.add(instance_id)
-                if instance_groups:
-                    instance_pool -= set(instance_groups)
-                    for instance_group in instance_groups:
-                        instance_map.setdefault(instance_group, set()).add(instance_id)
-            instance_pool -= instance_keys
-
-            group_instances = sorted(instance_pool, reverse=True)
-
-            if binary_mask and files[0] in reverse_masks:
-                instance_number = reverse_masks[files[0]][0]
-                base_data[numpy.nonzero(base_data)] = instance_number
-                used_instances.add(instance_number)
-            elif label_validate:
-                non_zero_base_data = base_data[numpy.nonzero(base_data)]
-                used_instances = (
-                    set(x.item() for x in numpy.unique(non_zero_base_data).round())
-                    & instance_keys
-                )
+        for file_ in files[1:]:
+            img = nib_load(file_)
+            if not isinstance(img, Nifti1Image) and not isinstance(img, Nifti2Image):
+                return None, {}
 
-            for file_ in files[1:]:
-                img = nib_load(file_)
-                if not isinstance(img, Nifti1Image) and not isinstance(
-                    img, Nifti2Image
-                ):
-                    return None, {}
+            data = load_mask(img, numpy.uint16)
+
+            # Take the non-zero indices of the mask. These are the indices
+            # that we want to merge from the current mask into the base mask.
+            non_zero_indices = numpy.nonzero(data)
+
+            # Take the values of the base mask at the current mask's non-zero
+            # indices. These may be:
+            #   - 0 (no instance),
+            #   - a value from instances (an instance), or
+            #   - another value not in instances (an overlap group).
+            base_values = base_data[non_zero_indices]
+
+            # Take the values of the current mask at the current mask's non-zero
+            # indices. These will all be positive integers representing instances.
+            mask_values = data[non_zero_indices]
+
+            # We identify the unique pairs of base and mask values, and update all
+            # indices that have the same pair at once.
+            unique_pairs, inv = numpy.unique(
+                numpy.column_stack([base_values, mask_values]),
+                axis=0,
+                return_inverse=True,
+            )
+            for i, (base_v_, mask_v) in enumerate(unique_pairs):
+                base_v: int = base_v_.round().item()
+                if binary_mask and file_ in reverse_masks:
+                    instance_number = reverse_masks[file_][0]
+                else:
+                    instance_number = mask_v.round().item()
 
-                if img.get_data_dtype() != numpy.uint16:
-                    data = img.get_fdata(caching="unchanged")
-                    data = numpy.round(data).astype(numpy.uint16)  # type: ignore
+                if instance_number in instance_keys:
+                    used_instances.add(instance_number)
                 else:
-                    data = numpy.asanyarray(img.dataobj, dtype=numpy.uint16)
-
-                # Take the non-zero indices of the mask. These are the indices
-                # that we want to merge from the current mask into the base mask.
-                non_zero_indices = numpy.nonzero(data)
-
-                # Take the values of the base mask at the current mask's non-zero
-                # indices. These may be:
-                #   - 0 (no instance),
-                #   - a value from instances (an instance), or
-                #   - another value not in instances (an overlap group).
-                base_values = base_data[non_zero_indices]
-
-                # Take the values of the current mask at the current mask's non-zero
-                # indices. These will all be positive integers representing instances.
-                mask_values = data[non_zero_indices]
-
-                # We identify the unique pairs of base and mask values, and update all
-                # indices that have the same pair at once.
-                unique_pairs, inv = numpy.unique(
-                    numpy.column_stack([base_values, mask_values]),
-                    axis=0,
-                    return_inverse=True,
-                )
-                for i, (base_v_, mask_v) in enumerate(unique_pairs):
-                    base_v: int = base_v_.round().item()
-                    if binary_mask and file_ in reverse_masks:
-                        instance_number = reverse_masks[file_][0]
-                    else:
-                        instance_number = mask_v.round().item()
+                    raise ValueError(
+                        f"Instance ID: {instance_number} is not present in segmentMap.\n"
+                        + "Multiple segmentations with overlapping groups isn't supported yet."
+                    )
+
+                # Determine the indices into the base mask that have the current value pair
+                v_indices = tuple(d[inv == i] for d in non_zero_indices)
 
-                    if instance_number in instance_keys:
-                        used_instances.add(instance_number)
+                if base_v == 0:
+                    # No instance, so we can just set the base value to the instance number
+                    base_data[v_indices] = instance_number
+                else:
+                    # An existing instance or group, so we create a new group with the
+                    # current instance and merge it with the overlapping instance or group.
+                    next_group_number = group_instances.pop()
+                    base_data[v_indices] = next_group_number
+                    instance_map[next_group_number] = {instance_number}
+                    if base_v in instance_keys:
+                        instance_map[next_group_number].add(base_v)
+                    elif base_v in instance_map:
+                        instance_map[next_group_number].update(instance_map[base_v])
                     else:
                         raise ValueError(
-                            f"Instance ID: {instance_number} is not present in segmentMap.\n"
-                            + "Multiple segmentations with overlapping groups isn't supported yet."
+                            f"Instance ID: {base_v} is not present in segmentMap"
                         )
 
-                    # Determine the indices into the base mask that have the current value pair
-                    v_indices = tuple(d[inv == i] for d in non_zero_indices)
+        if label_validate and used_instances != instance_keys:
+            raise ValueError(
+                "Instance IDs in segmentation file(s) and segmentMap do not match.\n"
+                + f"Segmentation file(s) have instances: {used_instances} and "
+                + f"segmentMap has instances: {instance_keys}\n"
+                + f"Segmentation(s): {files}"
+            )
 
-                    if base_v == 0:
-                        # No instance, so we can just set the base value to the instance number
-                        base_data[v_indices] = instance_number
-                    else:
-                        # An existing instance or group, so we create a new group with the
-                        # current instance and merge it with the overlapping instance or group.
-                        next_group_number = group_instances.pop()
-                        base_data[v_indices] = next_group_number
-                        instance_map[next_group_number] = {instance_number}
-                        if base_v in instance_keys:
-                            instance_map[next_group_number].add(base_v)
-                        elif base_v in instance_map:
-                            instance_map[next_group_number].update(instance_map[base_v])
-                        else:
-                            raise ValueError(
-                                f"Instance ID: {base_v} is not present in segmentMap"
-                            )
-
-            if label_validate and used_instances != instance_keys:
-                raise ValueError(
-                    "Instance IDs in segmentation file(s) and segmentMap do not match.\n"
-                    + f"Segmentation file(s) have instances: {used_instances} and "
-                    + f"segmentMap has instances: {instance_keys}\n"
-                    + f"Segmentation(s): {files}"
-                )
+        pool_size = len(group_instances)
+        while pool_size and group_instances[pool_size - 1] < 256:
+            group_instances.pop()
+            pool_size -= 1
 
-            pool_size = len(group_instances)
-            while pool_size and group_instances[pool_size - 1] < 256:
-                group_instances.pop()
-                pool_size -= 1
+        if pool_size == (65536 - 256) and not any(v >= 256 for v in instance_keys):
+            base_img.set_data_dtype(numpy.uint8)
+            base_data = numpy.asarray(base_data, dtype=numpy.uint8)
+        else:
+            base_data = numpy.asarray(base_data, dtype=numpy.uint16)
 
-            if pool_size == (65536 - 256) and not any(v >= 256 for v in instance_keys):
-                base_img.set_data_dtype(numpy.uint8)
-                base_data = numpy.asarray(base_data, dtype=numpy.uint8)
-            else:
-                base_data = numpy.asarray(base_data, dtype=numpy.uint16)
+        if isinstance(base_img, Nifti1Image):
+            new_img = Nifti1Image(base_data, base_img.affine, base_img.header)
+        else:
+            new_img = Nifti2Image(base_data, base_img.affine, base_img.header)
 
-            if isinstance(base_img, Nifti1Image):
-                new_img = Nifti1Image(base_data, base_img.affine, base_img.header)
-            else:
-                new_img = Nifti2Image(base_data, base_img.affine, base_img.header)
+        dirname = os.path.join(config_path(), "temp", str(uuid4()))
+        os.makedirs(dirname, exist_ok=True)
+        filename = uniquify_path(os.path.join(dirname, "label.nii.gz"))
+        nib_save(new_img, filename)
 
-            dirname = os.path.join(config_path(), "temp", str(uuid4()))
-            os.makedirs(dirname, exist_ok=True)
-            filename = uniquify_path(os.path.join(dirname, "label.nii.gz"))
-            nib_save(new_img, filename)
+        group_map: Dict[int, List[int]] = {}
+        for group_id, sub_ids in instance_map.items():
+            for sub_id in sub_ids:
+                group_map.setdefault(sub_id, []).append(group_id)
 
-            group_map: Dict[int, List[int]] = {}
-            for group_id, sub_ids in instance_map.items():
-                for sub_id in sub_ids:
-                    group_map.setdefault(sub_id, []).append(group_id)
+        return (filename, group_map)
 
-            return (filename, group_map)
+    except Exception as error:  # pylint: disable=broad-except
+        log_error(error)
+        return None, {}
 
-        except Exception as error:  # pylint: disable=broad-except
-            log_error(error)
-            return None, {}
+
+async def process_nifti_upload(
+    files: Union[str, List[str]],
+    instances: Dict[int, Optional[List[int]]],
+    binary_mask: bool,
+    semantic_mask: bool,
+    png_mask: bool,
+    masks: Dict[str, str],
+    label_validate: bool,
+) -> Tuple[Optional[str], Dict[int, List[int]]]:
+    """Process nifti upload files.
+
+    Runs in the segmentation worker pool (`config.segmentation_workers`), inputs and
+    the merged label map are exchanged by file path.
+    """
+    try:
+        return await run_in_process_pool(
+            "segmentation",
+            _process_nifti_upload,
+            files,
+            instances,
+            binary_mask,
+            semantic_mask,
+            png_mask,
+            masks,
+            label_validate,
+            workers=config.segmentation_workers,
+            max_tasks_per_child=config.segmentation_max_tasks_per_child,
+        )
+    except Exception as error:  # pylint: disable=broad-except
+        log_error(error)
+        return None, {}
 
 
 async def convert_nii_to_rtstruct(
@@ -655,8 +860,7 @@ async def convert_nii_to_rtstruct(
                     return None, {}
 
                 # Load NIfTI file
-                data = img.get_fdata(caching="unchanged")
-                data = numpy.round(data).astype(numpy.uint16)  # type: ignore
+                data = load_mask(img, numpy.uint16)
 
                 if data.ndim != 3:
                     return None, {}
@@ -853,3 +1057,142 @@ async def convert_rtstruct_to_nii(
             Nifti1Image(nii_mask.swapaxes(0, 1), numpy.diag([1, 2, 3, 1])),
             new_segment_map,
         )
+
+
+DICOM_GROUPING_TAGS = [
+    "StudyInstanceUID",
+    "SeriesInstanceUID",
+    "SeriesNumber",
+    "InstanceNumber",
+    "ImagePositionPatient",
+    "ImageOrientationPatient",
+]
+
+
+def read_dicom_header(path: str) -> Optional[Dict[str, Any]]:
+    """Read the series grouping attributes of a DICOM file, if it is one.
+
+    Only the header is parsed, reading stops before the pixel data.
+    """
+    import gzip
+    from pydicom import dcmread  # type: ignore
+
+    try:
+        with open(path, "rb") as file_:
+            gzipped = is_gzipped_data(file_.read(2))
+        opener: Callable[..., Any] = gzip.open if gzipped else open
+        with opener(path, "rb") as dicom_file:
+            dataset = dcmread(
+                dicom_file, stop_before_pixels=True, specific_tags=DICOM_GROUPING_TAGS
+            )
+    except Exception:  # pylint: disable=broad-except
+        return None
+
+    if not dataset.get("SeriesInstanceUID"):
+        return None
+
+    def _floats(value: Any) -> Optional[List[float]]:
+        try:
+            return [float(val) for val in value] if value else None
+        except (TypeError, ValueError):
+            return None
+
+    def _int(value: Any) -> Optional[int]:
+        try:
+            return int(value) if value not in (None, "") else None
+        except (TypeError, ValueError):
+            return None
+
+    return {
+        "studyId": str(dataset.get("StudyInstanceUID", "")),
+        "seriesId": str(dataset.get("SeriesInstanceUID")),
+        "seriesNumber": _int(dataset.get("SeriesNumber")),
+        "instanceNumber": _int(dataset.get("InstanceNumber")),
+        "position": _floats(dataset.get("ImagePositionPatient")),
+        "orientation": _floats(dataset.get("ImageOrientationPatient")),
+    }
+
+
+def _sort_instances(instances: List[Tuple[str, Dict[str, Any]]]) -> List[str]:
+    """Order the files of a series by slice position, or instance number."""
+    from natsort import natsort_keygen, ns
+
+    path_key = natsort_keygen(alg=ns.IGNORECASE)
+    orientations = {tuple(header["orientation"] or ()) for _, header in instances}
+    if len(orientations) == 1 and all(
+        header["position"] and len(header["position"]) == 3 for _, header in instances
+    ):
+        orientation = next(iter(orientations))
+        if len(orientation) == 6:
+            row, col = orientation[:3], orientation[3:]
+            normal = (
+                row[1] * col[2] - row[2] * col[1],
+                row[2] * col[0] - row[0] * col[2],
+                row[0] * col[1] - row[1] * col[0],
+            )
+            instances = sorted(
+                instances,
+                key=lambda instance: (
+                    sum(
+                        pos * axis for pos, axis in zip(instance[1]["position"], normal)
+                    ),
+                    path_key(instance[0]),
+                ),
+            )
+            return [path for path, _ in instances]
+
+    instances = sorted(
+        instances,
+        key=lambda instance: (
+            instance[1]["instanceNumber"] is None,
+            instance[1]["instanceNumber"] or 0,
+            path_key(instance[0]),
+        ),
+    )
+    return [path for path, _ in instances]
+
+
+def group_dicom_series(groups: List[List[str]], as_study: bool) -> List[Dict]:
+    """Group local DICOM files into items lists, from their headers.
+
+    Files of each group are split by series (or study, if `as_study`), and
+    ordered by slice position. Files that are not DICOM are skipped.
+    """
+    output: List[Dict] = []
+    for items in groups:
+        studies: Dict[str, Dict[str, List[Tuple[str, Dict[str, Any]]]]] = {}
+        for path in items:
+            header = read_dicom_header(path)
+            if header is None:
+                logger.debug(f"Skipping non-DICOM file: {path}")
+                continue
+            studies.setdefault(header["studyId"] if as_study else "", {}).setdefault(
+                header["seriesId"], []
+            ).append((path, header))
+
+        for series in studies.values():
+            series_items = [
+                _sort_instances(instances)
+                for instances in sorted(
+                    series.values(),
+                    key=lambda instances: (
+                        instances[0][1]["seriesNumber"] is None,
+                        instances[0][1]["seriesNumber"] or 0,
+                        instances[0][1]["seriesId"],
+                    ),
+                )
+            ]
+            if not as_study:
+                output.extend({"items": paths} for paths in series_items)
+                continue
+
+            study: Dict[str, Any] = {"items": [], "seriesInfo": []}
+            for paths in series_items:
+                start = len(study["items"])
+                study["items"].extend(paths)
+                study["seriesInfo"].append(
+                    {"itemsIndices": list(range(start, start + len(paths)))}
+                )
+            output.append(study)
+
+    return output
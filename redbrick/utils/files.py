@@ -1,24 +1,40 @@
 """Handler for file upload/download."""
 
 import os
+import base64
 import gzip
-from typing import Any, Dict, List, Optional, Tuple, Set
+import heapq
+import json
+import tempfile
+import threading
+import zlib
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import IO, Any, Dict, Iterable, Iterator, List, Optional, Tuple, Set
+from urllib.parse import parse_qs, quote, urlsplit
+from uuid import uuid4
 
 import asyncio
 import aiohttp
 from yarl import URL
-from tenacity import Retrying, RetryError
+from tenacity import AsyncRetrying, Retrying, RetryError
 from tenacity.retry import retry_if_not_exception_type
 from tenacity.stop import stop_after_attempt
 from tenacity.wait import wait_random_exponential
 from natsort import natsorted, ns
 
-from redbrick.common.constants import MAX_FILE_BATCH_SIZE, MAX_RETRY_ATTEMPTS
-from redbrick.utils.async_utils import gather_with_concurrency
+from redbrick.common.constants import (
+    DOWNLOAD_CHUNK_SIZE,
+    MAX_FILE_BATCH_SIZE,
+    MAX_PART_CONCURRENCY,
+    MAX_RETRY_ATTEMPTS,
+    MAX_SCAN_WORKERS,
+    MAX_UPLOAD_PARTS,
+    UPLOAD_PART_SIZE,
+)
+from redbrick.utils.async_utils import gather_with_concurrency, report_congestion
 from redbrick.utils.logging import log_error, logger
 from redbrick.config import config
 
-
 IMAGE_FILE_TYPES = {
     "png": "image/png",
     "jpg": "image/jpeg",
@@ -83,50 +99,100 @@ def get_file_type(file_path: str) -> Tuple[str, str]:
     return file_ext, FILE_TYPES[file_ext]
 
 
-def find_files_recursive(
-    root: str, file_types: Set[str], multiple: bool = False
-) -> List[List[str]]:
-    """Find files recursively in a directory, that belong to a list of allowed file types."""
-    if not os.path.isdir(root):
-        return []
+def _is_allowed_file(name: str, file_types: Set[str]) -> bool:
+    return "*" in file_types or (
+        name.rsplit(".", 1)[-1].lower() in file_types
+        or (
+            "." in name
+            and name.rsplit(".", 1)[-1].lower() == "gz"
+            and name.rsplit(".", 2)[-2].lower() in file_types
+        )
+    )
+
 
-    items = []
-    list_items = []
+def _scan_directory(
+    path: str, file_types: Set[str], multiple: bool
+) -> Tuple[List[str], List[List[str]]]:
+    """Scan a single directory, returning its sub-directories and item groups."""
+    subdirs: List[str] = []
+    items: List[List[str]] = []
+    list_items: List[str] = []
     discard_list_items = False
 
-    for item in os.listdir(root):
-        if item.startswith("."):
-            continue
-        path = os.path.join(root, item)
-        if os.path.isdir(path):
-            items.extend(find_files_recursive(path, file_types, multiple))
-            discard_list_items = True
-        elif os.path.isfile(path) and (  # pylint: disable=too-many-boolean-expressions
-            "*" in file_types
-            or (
-                item.rsplit(".", 1)[-1].lower() in file_types
-                or (
-                    "." in item
-                    and item.rsplit(".", 1)[-1].lower() == "gz"
-                    and item.rsplit(".", 2)[-2].lower() in file_types
-                )
-            )
-        ):
-            if multiple:
-                if not discard_list_items:
-                    list_items.append(path)
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.name.startswith("."):
+                continue
+            # DirEntry caches the file type from the directory listing
+            if entry.is_dir():
+                subdirs.append(entry.path)
+                discard_list_items = True
+            elif entry.is_file() and _is_allowed_file(entry.name, file_types):
+                if multiple:
+                    if not discard_list_items:
+                        list_items.append(entry.path)
+                else:
+                    items.append([entry.path])
             else:
-                items.append([path])
-        else:
-            discard_list_items = True
+                discard_list_items = True
 
     if (
-        not discard_list_items
+        multiple
+        and not discard_list_items
         and len({item.rsplit(".", 1)[-1].lower() for item in list_items}) == 1
     ):
         items.append(list(natsorted(list_items, alg=ns.IGNORECASE)))  # type: ignore
 
-    return items
+    return subdirs, items
+
+
+def iter_files_recursive(
+    root: str,
+    file_types: Set[str],
+    multiple: bool = False,
+    workers: int = MAX_SCAN_WORKERS,
+) -> Iterator[Tuple[str, List[List[str]]]]:
+    """Scan a directory tree in parallel, yielding `(directory, item groups)`.
+
+    Directories are yielded depth-first, in directory listing order, once their
+    whole sub-tree has been scanned, so consumers can start processing before
+    the scan finishes. Sub-directories are scanned ahead in worker threads.
+    """
+    if not os.path.isdir(root):
+        return
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        pending: Set[Future] = set()
+
+        def _submit(path: str) -> Future:
+            future = executor.submit(_scan_directory, path, file_types, multiple)
+            pending.add(future)
+            return future
+
+        def _walk(path: str, future: Future) -> Iterator[Tuple[str, List[List[str]]]]:
+            subdirs, items = future.result()
+            pending.discard(future)
+            children = [(subdir, _submit(subdir)) for subdir in subdirs]
+            for subdir, child in children:
+                yield from _walk(subdir, child)
+            yield path, items
+
+        try:
+            yield from _walk(root, _submit(root))
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def find_files_recursive(
+    root: str, file_types: Set[str], multiple: bool = False
+) -> List[List[str]]:
+    """Find files recursively in a directory, that belong to a list of allowed file types."""
+    return [
+        items
+        for _, groups in iter_files_recursive(root, file_types, multiple)
+        for items in groups
+    ]
 
 
 def uniquify_path(path: str) -> str:
@@ -153,20 +219,116 @@ def is_gzipped_data(data: bytes) -> bool:
 def is_dicom_file(file_name: str) -> bool:
     """Check if data is dicom."""
     with open(file_name, "rb") as fp_:
-        data = fp_.read()
+        data = fp_.read(132)
 
     if is_gzipped_data(data):
-        data = gzip.decompress(data)
+        try:
+            with gzip.open(file_name, "rb") as fp_:
+                data = fp_.read(132)
+        except (OSError, EOFError):
+            return False
 
     return data[128:132] == b"\x44\x49\x43\x4d"
 
 
+def is_block_blob_url(url: str) -> bool:
+    """Check if a presigned url is an Azure blob SAS url, which accepts block uploads."""
+    parsed = urlsplit(url)
+    return (parsed.hostname or "").endswith(
+        ".blob.core.windows.net"
+    ) and "sig" in parse_qs(parsed.query)
+
+
+async def _upload_blocks(
+    session: aiohttp.ClientSession,
+    path: str,
+    url: str,
+    file_type: str,
+    timeout: aiohttp.ClientTimeout,
+) -> None:
+    """Upload a file as parallel blocks of an Azure block blob, then commit them.
+
+    Each block is retried on its own, so a failure only resends that block,
+    and the final block list commit is retried the same way.
+    """
+    size = os.path.getsize(path)
+    part_size = max(UPLOAD_PART_SIZE, -(-size // MAX_UPLOAD_PARTS))
+    block_ids = [
+        base64.b64encode(f"{idx:08d}".encode()).decode()
+        for idx in range(max(1, -(-size // part_size)))
+    ]
+    request_params: Dict[str, Any] = {"timeout": timeout}
+    if not config.verify_ssl:
+        request_params["ssl"] = False
+
+    def _read_block(idx: int) -> bytes:
+        with open(path, "rb") as file_:
+            file_.seek(idx * part_size)
+            return file_.read(part_size)
+
+    async def _upload_block(idx: int) -> None:
+        data = await asyncio.get_running_loop().run_in_executor(None, _read_block, idx)
+        block_url = f"{url}&comp=block&blockid={quote(block_ids[idx], safe='')}"
+        async for attempt in AsyncRetrying(
+            reraise=True,
+            stop=stop_after_attempt(MAX_RETRY_ATTEMPTS),
+            wait=wait_random_exponential(min=5, max=30),
+            retry=retry_if_not_exception_type(KeyboardInterrupt),
+        ):
+            with attempt:
+                async with session.put(
+                    block_url, data=data, **request_params
+                ) as response:
+                    if response.status in (413, 429) or response.status >= 500:
+                        report_congestion()
+                    if response.status not in (200, 201):
+                        raise ConnectionError(
+                            f"Error in uploading block {idx} of {path}: {response.status}"
+                        )
+
+    await gather_with_concurrency(
+        MAX_PART_CONCURRENCY, [_upload_block(idx) for idx in range(len(block_ids))]
+    )
+
+    block_list = "".join(f"<Latest>{block_id}</Latest>" for block_id in block_ids)
+    async for attempt in AsyncRetrying(
+        reraise=True,
+        stop=stop_after_attempt(MAX_RETRY_ATTEMPTS),
+        wait=wait_random_exponential(min=5, max=30),
+        retry=retry_if_not_exception_type(KeyboardInterrupt),
+    ):
+        with attempt:
+            async with session.put(
+                f"{url}&comp=blocklist",
+                data=f'<?xml version="1.0" encoding="utf-8"?><BlockList>{block_list}</BlockList>',
+                headers={
+                    "Content-Type": "application/xml",
+                    "x-ms-blob-content-type": file_type,
+                },
+                **request_params,
+            ) as response:
+                if response.status in (413, 429) or response.status >= 500:
+                    report_congestion()
+                if response.status not in (200, 201):
+                    raise ConnectionError(
+                        f"Error in committing blocks of {path}: {response.status}"
+                    )
+
+
 async def upload_files(
     files: List[Tuple[str, str, str]],
     progress_bar_name: Optional[str] = "Uploading files",
     segmentations_upload: bool = False,
+    session: Optional[aiohttp.ClientSession] = None,
+    raise_errors: bool = True,
 ) -> List[bool]:
-    """Upload files from local path to url (file path, presigned url, file type)."""
+    """Upload files from local path to url (file path, presigned url, file type).
+
+    Reuses the given session's connection pool, or opens a temporary one.
+    Files of at least `config.multipart_threshold` bytes going to block blob
+    storage are uploaded in parallel blocks.
+    Failed uploads raise, or are reported as False if `raise_errors` is False.
+    """
     timeout = aiohttp.ClientTimeout(connect=60)
     verify_ssl = config.verify_ssl
 
@@ -187,6 +349,14 @@ async def upload_files(
         if not verify_ssl:
             request_params["ssl"] = False
 
+        if (
+            config.multipart_threshold > 0
+            and is_block_blob_url(url)
+            and os.path.getsize(path) >= config.multipart_threshold
+        ):
+            await _upload_blocks(session, path, url, file_type, timeout)
+            return True
+
         try:
             for attempt in Retrying(
                 reraise=True,
@@ -199,6 +369,8 @@ async def upload_files(
                         request_params["data"] = f_
                         async with session.put(url, **request_params) as response:
                             status = response.status
+                            if status in (413, 429) or status >= 500:
+                                report_congestion()
         except RetryError as error:
             raise Exception("Unknown problem occurred") from error
 
@@ -207,18 +379,84 @@ async def upload_files(
 
         raise ConnectionError(f"Error in uploading {path} to RedBrick")
 
-    conn = aiohttp.TCPConnector()
-    async with aiohttp.ClientSession(connector=conn) as session:
-        coros = [
-            _upload_file(session, path, url, file_type)
-            for path, url, file_type in files
-        ]
-        uploaded = await gather_with_concurrency(
-            MAX_FILE_BATCH_SIZE, coros, progress_bar_name, keep_progress_bar=False
-        )
+    if session is None:
+        conn = aiohttp.TCPConnector()
+        async with aiohttp.ClientSession(connector=conn) as temp_session:
+            uploaded = await upload_files(
+                files,
+                progress_bar_name,
+                segmentations_upload,
+                temp_session,
+                raise_errors,
+            )
+        await asyncio.sleep(0.250)  # give time to close ssl connections
+        return uploaded
+
+    coros = [
+        _upload_file(session, path, url, file_type) for path, url, file_type in files
+    ]
+    uploaded = await gather_with_concurrency(
+        MAX_FILE_BATCH_SIZE,
+        coros,
+        progress_bar_name,
+        keep_progress_bar=False,
+        return_exceptions=not raise_errors,
+    )
+    return [result is True for result in uploaded]
+
+
+async def _stream_to_file(
+    response: aiohttp.ClientResponse, path: str, decompress: bool, compress: bool
+) -> int:
+    """Stream a response body into a file, (de)compressing gzip on the fly.
+
+    Returns the number of bytes received, memory use is bounded by the chunk size.
+    Raises `zlib.error` if a body to decompress is not a complete gzip stream.
+    """
+    chunks = response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE)
+    head = b""
+    async for chunk in chunks:
+        head += chunk
+        if len(head) >= 2:
+            break
+
+    if not head:
+        return 0
+
+    size = len(head)
+    is_gzipped = is_gzipped_data(head)
+    with open(path, "wb") as file_:
+        if decompress and is_gzipped:
+            decompressors = [zlib.decompressobj(16 + zlib.MAX_WBITS)]
+
+            def _write_decompressed(data: bytes) -> None:
+                file_.write(decompressors[-1].decompress(data))
+                # Handle multi-member gzip streams
+                while decompressors[-1].eof and decompressors[-1].unused_data:
+                    data = decompressors[-1].unused_data
+                    decompressors[-1] = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                    file_.write(decompressors[-1].decompress(data))
+
+            _write_decompressed(head)
+            async for chunk in chunks:
+                size += len(chunk)
+                _write_decompressed(chunk)
+            file_.write(decompressors[-1].flush())
+            if not decompressors[-1].eof:
+                raise zlib.error("Truncated gzip stream")
+        elif compress and not is_gzipped:
+            with gzip.GzipFile(fileobj=file_, mode="wb") as gzip_file:
+                gzip_file.write(head)
+                async for chunk in chunks:
+                    size += len(chunk)
+                    gzip_file.write(chunk)
+        else:
+            file_.write(head)
+            async for chunk in chunks:
+                size += len(chunk)
+                file_.write(chunk)
 
-    await asyncio.sleep(0.250)  # give time to close ssl connections
-    return uploaded
+    return size
 
 
 async def download_files(
@@ -227,13 +465,18 @@ async def download_files(
     keep_progress_bar: bool = True,
     overwrite: bool = False,
     zipped: bool = False,
+    session: Optional[aiohttp.ClientSession] = None,
 ) -> List[Optional[str]]:
-    """Download files from url to local path (presigned url, file path)."""
+    """Download files from url to local path (presigned url, file path).
+
+    Reuses the given session's connection pool, or opens a temporary one.
+    """
+    # pylint: disable=too-many-statements
 
     async def _download_file(
         session: aiohttp.ClientSession, url: Optional[str], path: Optional[str]
     ) -> Optional[str]:
-        # pylint: disable=no-member
+        # pylint: disable=no-member, too-many-branches
         if not url or not path:
             logger.debug(f"Downloading empty '{url}' to '{path}'")
             return None
@@ -241,8 +484,10 @@ async def download_files(
         if not overwrite and os.path.isfile(path):
             return path
 
-        headers: Dict = {}
-        data: Optional[bytes] = None
+        if zipped and not path.endswith(".gz"):
+            path += ".gz"
+        temp_path = f"{path}.{uuid4().hex}.part"
+        size = 0
 
         try:
             for attempt in Retrying(
@@ -259,31 +504,54 @@ async def download_files(
                         URL(url, encoded=True), **request_params
                     ) as response:
                         if response.status == 200:
-                            headers = dict(response.headers)
-                            data = await response.read()
+                            try:
+                                size = await _stream_to_file(
+                                    response,
+                                    temp_path,
+                                    not zipped
+                                    and response.headers.get("Content-Encoding")
+                                    == "gzip",
+                                    zipped,
+                                )
+                            except zlib.error as error:
+                                # Not (entirely) gzipped after all, keep the body as served
+                                logger.debug(f"Keeping raw body of '{url}': {error}")
+                                async with session.get(
+                                    URL(url, encoded=True), **request_params
+                                ) as raw_response:
+                                    if raw_response.status != 200:
+                                        raise
+                                    size = await _stream_to_file(
+                                        raw_response, temp_path, False, zipped
+                                    )
+                        elif response.status == 429 or response.status >= 500:
+                            report_congestion()
         except RetryError as error:
             log_error(error)
             raise Exception("Unknown problem occurred") from error
+        finally:
+            if not size and os.path.isfile(temp_path):
+                os.remove(temp_path)
 
-        if not data:
+        if not size:
             logger.debug(f"Received empty data from '{url}'")
             return None
 
-        if not zipped and headers.get("Content-Encoding") == "gzip":
-            try:
-                data = gzip.decompress(data)
-            except Exception:  # pylint: disable=broad-except
-                pass
-        if zipped and not is_gzipped_data(data):
-            data = gzip.compress(data)
-        if zipped and not path.endswith(".gz"):
-            path += ".gz"
         if not overwrite:
             path = uniquify_path(path)
-        with open(path, "wb") as file_:
-            file_.write(data)
+        os.replace(temp_path, path)
         return path
 
+    async def _download_all(session: aiohttp.ClientSession) -> List[Any]:
+        coros = [_download_file(session, url, path) for url, path in files]
+        return await gather_with_concurrency(
+            MAX_FILE_BATCH_SIZE,
+            coros,
+            progress_bar_name,
+            keep_progress_bar,
+            True,
+        )
+
     dirs: Set[str] = set()
     for _, path in files:
         if not path:
@@ -296,17 +564,142 @@ async def download_files(
             os.makedirs(parent, exist_ok=True)
         dirs.add(parent)
 
-    conn = aiohttp.TCPConnector()
-    async with aiohttp.ClientSession(connector=conn) as session:
-        coros = [_download_file(session, url, path) for url, path in files]
-        paths = await gather_with_concurrency(
-            MAX_FILE_BATCH_SIZE,
-            coros,
-            progress_bar_name,
-            keep_progress_bar,
-            True,
-        )
-        await session.close()
+    if session is None:
+        conn = aiohttp.TCPConnector()
+        async with aiohttp.ClientSession(connector=conn) as temp_session:
+            paths = await _download_all(temp_session)
+        await asyncio.sleep(0.250)  # give time to close ssl connections
+    else:
+        paths = await _download_all(session)
 
-    await asyncio.sleep(0.250)  # give time to close ssl connections
     return [(path if isinstance(path, str) else None) for path in paths]
+
+
+class JSONStreamWriter:
+    """Buffered writer of a JSON array (or JSON Lines) file, finalized atomically.
+
+    Records are written compactly to a temporary file next to `path`, which
+    replaces `path` on `close`. With `ordered`, records are sorted by the key
+    passed to `write`; sorted runs are spilled to disk to bound memory.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        json_lines: bool = False,
+        ordered: bool = False,
+        flush_size: int = 1000,
+    ) -> None:
+        """Create the temporary output file."""
+        self.path = path
+        self.json_lines = json_lines
+        self.ordered = ordered
+        self.flush_size = flush_size
+
+        self._lock = threading.Lock()
+        self._buffer: List[Tuple[Any, int, str]] = []
+        self._runs: List[IO[str]] = []
+        self._sequence = 0
+        self._count = 0
+
+        self._temp_path = f"{path}.{uuid4().hex}.tmp"
+        self._file = open(  # pylint: disable=consider-using-with
+            self._temp_path, "w", encoding="utf-8"
+        )
+        if not json_lines:
+            self._file.write("[")
+
+    def __enter__(self) -> "JSONStreamWriter":
+        """Enter context."""
+        return self
+
+    def __exit__(self, exc_type: Any, *_: Any) -> None:
+        """Finalize on success, discard output on error."""
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def __len__(self) -> int:
+        """Get number of written records."""
+        return self._sequence
+
+    def write(self, record: Any, key: Any = None) -> None:
+        """Write record, sorted by `key` (default: write order) when ordered."""
+        data = json.dumps(record, separators=(",", ":"))
+        with self._lock:
+            self._buffer.append(
+                (self._sequence if key is None else key, self._sequence, data)
+            )
+            self._sequence += 1
+            if len(self._buffer) >= self.flush_size:
+                self._flush()
+
+    def close(self) -> None:
+        """Write remaining records and move the file into place."""
+        with self._lock:
+            if self._file.closed:
+                return
+            self._flush()
+            if self.ordered:
+                self._write_records(
+                    data
+                    for _, _, data in heapq.merge(
+                        *(self._read_run(run) for run in self._runs)
+                    )
+                )
+                self._close_runs()
+            if not self.json_lines:
+                self._file.write("]")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            os.replace(self._temp_path, self.path)
+
+    def abort(self) -> None:
+        """Discard the output, keeping any previous file at `path`."""
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.close()
+            self._close_runs()
+            os.remove(self._temp_path)
+
+    def _flush(self) -> None:
+        """Write buffered records, or spill them as a sorted run when ordered."""
+        if not self._buffer:
+            return
+        if self.ordered:
+            self._buffer.sort(key=lambda item: (item[0], item[1]))
+            # pylint: disable=consider-using-with
+            run = tempfile.TemporaryFile("w+", encoding="utf-8")
+            for key, sequence, data in self._buffer:
+                run.write(json.dumps([key, sequence]) + "\n" + data + "\n")
+            run.seek(0)
+            self._runs.append(run)
+        else:
+            self._write_records(data for _, _, data in self._buffer)
+            self._file.flush()
+        self._buffer = []
+
+    def _write_records(self, records: Iterable[str]) -> None:
+        """Write serialized records to the output file."""
+        for data in records:
+            if self.json_lines:
+                self._file.write(data + "\n")
+            else:
+                self._file.write(("," if self._count else "") + data)
+            self._count += 1
+
+    def _close_runs(self) -> None:
+        """Close spilled runs."""
+        for run in self._runs:
+            run.close()
+        self._runs = []
+
+    @staticmethod
+    def _read_run(run: IO[str]) -> Iterator[Tuple[Any, int, str]]:
+        """Read a spilled run."""
+        for header in run:
+            key, sequence = json.loads(header)
+            yield key, sequence, run.readline().rstrip("\n")
@@ -17,6 +17,10 @@ class PaginationIterator:
         self.datapoints_batch: Optional[List[Dict]] = None
         self.datapoints_batch_index: Optional[int] = None
 
+        # First non-empty value returned by `func` after the entries and cursor
+        # (e.g. the server-issued cacheTime watermark of a paged query)
+        self.watermark: Optional[Any] = None
+
         self.func = func
         self.concurrency = concurrency
         self.limit = limit
@@ -50,8 +54,9 @@ class PaginationIterator:
         ):
             # When no data is returned in the current iteration,
             # but there is still more data, go for the next iteration
+            extras: List[Any]
             while True:
-                self.datapoints_batch, self.cursor, *_ = self.func(
+                self.datapoints_batch, self.cursor, *extras = self.func(
                     (
                         max(0, min(self.concurrency, self.limit - self.total))
                         if self.limit is not None
@@ -59,6 +64,8 @@ class PaginationIterator:
                     ),
                     self.cursor,
                 )
+                if self.watermark is None and extras and extras[0] is not None:
+                    self.watermark = extras[0]
                 if (
                     self.limit is not None
                     and self.total + len(self.datapoints_batch) >= self.limit
@@ -5,9 +5,10 @@ import json
 import asyncio
 import shutil
 from uuid import uuid4
-from typing import List, Dict, TypeVar, Union, Optional, Sequence
+from typing import Any, List, Dict, TypeVar, Union, Optional, Sequence
 
 import aiohttp
+from redbrick.config import config
 from redbrick.common.context import RBContext
 from redbrick.common.enums import StorageMethod
 from redbrick.types.taxonomy import Taxonomy
@@ -16,26 +17,176 @@ from redbrick.utils.files import NIFTI_FILE_TYPES, download_files, upload_files
 
 from redbrick.utils.logging import log_error, logger
 from redbrick.common.constants import MAX_CONCURRENCY
-from redbrick.utils.async_utils import gather_with_concurrency
+from redbrick.utils.async_utils import gather_with_concurrency, run_in_process_pool
 from redbrick.types.task import InputTask, OutputTask
 
 
+LOCAL_TASK_KEYS = frozenset(["name", "series", "priority", "metaData", "preAssign"])
+LOCAL_SERIES_KEYS = frozenset(
+    [
+        "name",
+        "items",
+        "metaData",
+        "segmentations",
+        "binaryMask",
+        "semanticMask",
+        "pngMask",
+    ]
+)
+
+
+def _is_str_map(value: Any) -> bool:
+    return isinstance(value, dict) and all(
+        isinstance(key, str) and isinstance(val, str) for key, val in value.items()
+    )
+
+
+def _is_str_list(value: Any) -> bool:
+    return (
+        isinstance(value, list)
+        and bool(value)
+        and all(isinstance(val, str) for val in value)
+    )
+
+
+def convert_to_import_format(task: Any) -> Optional[Dict]:
+    """Validate and convert a task to import format locally.
+
+    Returns None when the task has to be validated by the server, e.g. it
+    contains annotations, or does not match the documented format.
+    """
+    # pylint: disable=too-many-return-statements, too-many-branches
+    # pylint: disable=too-many-boolean-expressions
+    if (
+        not isinstance(task, dict)
+        or not task.keys() <= LOCAL_TASK_KEYS
+        or not isinstance(task.get("name"), str)
+        or not task["name"]
+        or not isinstance(task.get("series"), list)
+        or not task["series"]
+    ):
+        return None
+    if "priority" in task and (
+        not isinstance(task["priority"], (int, float))
+        or isinstance(task["priority"], bool)
+        or not 0 <= task["priority"] <= 1
+    ):
+        return None
+    if "metaData" in task and not _is_str_map(task["metaData"]):
+        return None
+    if "preAssign" in task and (
+        not isinstance(task["preAssign"], dict)
+        or any(
+            not isinstance(stage, str)
+            or not (isinstance(users, str) or _is_str_list(users))
+            for stage, users in task["preAssign"].items()
+        )
+    ):
+        return None
+
+    converted: Dict[str, Any] = {
+        key: task[key]
+        for key in ("name", "priority", "metaData", "preAssign")
+        if key in task
+    }
+    items: List[str] = []
+    series_info: List[Dict] = []
+    labels_map: List[Optional[Dict]] = []
+    for volume_index, series in enumerate(task["series"]):
+        if not isinstance(series, dict) or not series.keys() <= LOCAL_SERIES_KEYS:
+            return None
+        series_items: Any = (
+            [series["items"]]
+            if isinstance(series.get("items"), str)
+            else series.get("items")
+        )
+        if not _is_str_list(series_items) or (
+            "name" in series and not isinstance(series["name"], str)
+        ):
+            return None
+        if "metaData" in series and not _is_str_map(series["metaData"]):
+            return None
+
+        info: Dict[str, Any] = {
+            "itemsIndices": list(range(len(items), len(items) + len(series_items)))
+        }
+        items.extend(series_items)
+        for key in ("name", "metaData"):
+            if key in series:
+                info[key] = series[key]
+        for key in ("binaryMask", "semanticMask", "pngMask"):
+            if key in series:
+                if not isinstance(series[key], bool):
+                    return None
+                info[key] = series[key]
+        series_info.append(info)
+
+        segmentations = series.get("segmentations")
+        if segmentations is None:
+            labels_map.append(None)
+        elif (isinstance(segmentations, str) and segmentations) or _is_str_list(
+            segmentations
+        ):
+            labels_map.append({"labelName": segmentations, "seriesIndex": volume_index})
+        else:
+            return None
+
+    converted["items"] = items
+    converted["seriesInfo"] = series_info
+    if any(labels_map):
+        converted["labelsMap"] = labels_map
+    return converted
+
+
+def convert_tasks_to_import_format(tasks: List[Any]) -> List[Optional[Dict]]:
+    """Validate and convert tasks to import format locally, where possible."""
+    return [convert_to_import_format(task) for task in tasks]
+
+
 async def validate_json(
     context: RBContext,
     input_data: List[InputTask],
     storage_id: str,
     concurrency: int,
 ) -> List[Dict]:
-    """Validate and convert to import format."""
+    """Validate and convert to import format.
+
+    Tasks in the documented format, including their segmentation files, are
+    converted locally; tasks with other annotations, or in any other format,
+    are sent to the server.
+    """
     # pylint: disable=too-many-locals
-    total_input_data = len(input_data)
+    workers = config.validation_workers
+    chunk_size = max(1, -(-len(input_data) // max(1, workers)))
+    local_data: List[Optional[Dict]] = [
+        task
+        for chunk in await asyncio.gather(
+            *(
+                run_in_process_pool(
+                    "validation",
+                    convert_tasks_to_import_format,
+                    input_data[start : start + chunk_size],
+                    workers=workers,
+                    max_tasks_per_child=config.validation_max_tasks_per_child,
+                )
+                for start in range(0, len(input_data), chunk_size)
+            )
+        )
+        for task in chunk
+    ]
+    server_data = [
+        task for task, converted in zip(input_data, local_data) if converted is None
+    ]
+    if not server_data:
+        return local_data  # type: ignore
+
+    total_input_data = len(server_data)
     logger.debug(f"Concurrency: {concurrency} for {total_input_data} items")
     inputs: List[List[InputTask]] = []
     for batch in range(0, total_input_data, concurrency):
-        inputs.append(input_data[batch : batch + concurrency])
+        inputs.append(server_data[batch : batch + concurrency])
 
-    conn = aiohttp.TCPConnector()
-    async with aiohttp.ClientSession(connector=conn) as session:
+    async with context.client.aio_session() as session:
         coros = [
             context.upload.validate_and_convert_to_import_format(
                 session, json.dumps(data, separators=(",", ":")), True, storage_id
@@ -44,9 +195,11 @@ async def validate_json(
         ]
         outputs = await gather_with_concurrency(MAX_CONCURRENCY, coros)
 
-    await asyncio.sleep(0.250)  # give time to close ssl connections
-
-    output_data: List[Dict] = []
+    # Server results replace their inputs in place, keeping the input order
+    server_indices = [idx for idx, task in enumerate(local_data) if task is None]
+    output_data: List[List[Dict]] = [
+        [task] if task is not None else [] for task in local_data
+    ]
     for idx, (inp, out) in enumerate(zip(inputs, outputs)):
         if not out.get("isValid"):
             start = idx * concurrency
@@ -61,11 +214,22 @@ async def validate_json(
             )
             return []
 
-        output_data.extend(
+        converted: List[Dict] = (
             json.loads(out["converted"]) if out.get("converted") else inp  # type: ignore
         )
+        positions = server_indices[idx * concurrency : idx * concurrency + len(inp)]
+        if len(converted) == len(inp):
+            for position, task in zip(positions, converted):
+                output_data[position] = [task]
+        else:
+            start = idx * concurrency
+            logger.warning(
+                f"Batch: {start}-{start + len(inp)} of {total_input_data} "
+                + f"converted to {len(converted)} tasks"
+            )
+            output_data[positions[0]] = converted
 
-    return output_data
+    return [task for tasks in output_data for task in tasks]
 
 
 T = TypeVar("T", InputTask, OutputTask)
@@ -150,18 +314,20 @@ async def convert_rt_struct_to_nii_labels(
                 presigned_items = context.export.presign_items(
                     org_id, storage_id, items
                 )
-                await download_files(
-                    list(
-                        zip(
-                            presigned_items,
-                            [
-                                os.path.join(temp_img_dir, f"{idx + 1}.dcm")
-                                for idx in range(len(items))
-                            ],
-                        )
-                    ),
-                    f"Downloading items into: {temp_img_dir}",
-                )
+                async with context.client.aio_session() as session:
+                    await download_files(
+                        list(
+                            zip(
+                                presigned_items,
+                                [
+                                    os.path.join(temp_img_dir, f"{idx + 1}.dcm")
+                                    for idx in range(len(items))
+                                ],
+                            )
+                        ),
+                        f"Downloading items into: {temp_img_dir}",
+                        session=session,
+                    )
 
             if label_storage_id == StorageMethod.REDBRICK:
                 logger.info(
@@ -181,18 +347,20 @@ async def convert_rt_struct_to_nii_labels(
                 presigned_segs = context.export.presign_items(
                     org_id, label_storage_id, segmentations
                 )
-                await download_files(
-                    list(
-                        zip(
-                            presigned_segs,
-                            [
-                                os.path.join(temp_seg_dir, f"{idx + 1}.dcm")
-                                for idx in range(len(presigned_segs))
-                            ],
-                        )
-                    ),
-                    f"Downloading segmentations into: {temp_seg_dir}",
-                )
+                async with context.client.aio_session() as session:
+                    await download_files(
+                        list(
+                            zip(
+                                presigned_segs,
+                                [
+                                    os.path.join(temp_seg_dir, f"{idx + 1}.dcm")
+                                    for idx in range(len(presigned_segs))
+                                ],
+                            )
+                        ),
+                        f"Downloading segmentations into: {temp_seg_dir}",
+                        session=session,
+                    )
 
             mask, segment_map = await convert_rtstruct_to_nii(
                 [os.path.join(temp_seg_dir, seg) for seg in os.listdir(temp_seg_dir)],
@@ -323,6 +491,7 @@ async def process_segmentation_upload(
                         list(zip(presigned_paths, download_paths)),
                         f"Downloading labels for {task.get('name') or task['items'][0]}",
                         False,
+                        session=session,
                     )
                     for ext_path, down_path in zip(external_paths, downloaded_paths):
                         if down_path:
@@ -408,6 +577,7 @@ async def process_segmentation_upload(
                         ],
                         f"Downloading labels for {task.get('name') or task['items'][0]}",
                         False,
+                        session=session,
                     )
                 )[0]
 
@@ -432,6 +602,7 @@ async def process_segmentation_upload(
                         "Uploading labels for "
                         + f"{task['name'][:57]}{task['name'][57:] and '...'}",
                         True,
+                        session,
                     )
                 )[0]:
                     label_map["labelName"] = presigned["filePath"]
@@ -443,3 +614,135 @@ async def process_segmentation_upload(
             raise ValueError("Invalid label files")
 
     return labels_map or []
+
+
+LogT = TypeVar("LogT", bound="AppendOnlyLog")
+
+
+class AppendOnlyLog:
+    """Append-only JSONL file whose entries are replayed into memory on open.
+
+    Subclasses define the record shape by implementing `_load`.
+    """
+
+    def __init__(self, path: str) -> None:
+        """Open (or create) the log at path."""
+        self.path = path
+
+        if os.path.isfile(path):
+            with open(path, "r", encoding="utf-8") as file_:
+                for line in file_:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Partially written entry from an interrupted run
+                        continue
+                    self._load(entry)
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        self._file = open(  # pylint: disable=consider-using-with
+            path, "a", encoding="utf-8"
+        )
+
+    def __enter__(self: LogT) -> LogT:
+        """Enter context."""
+        return self
+
+    def __exit__(self, *_: Any) -> None:
+        """Exit context."""
+        self.close()
+
+    def _load(self, entry: Dict) -> None:
+        """Apply an entry read back from the log."""
+        raise NotImplementedError
+
+    def _append(self, entry: Dict) -> None:
+        """Write an entry to the log."""
+        self._file.write(json.dumps(entry, separators=(",", ":"), default=str) + "\n")
+        self._file.flush()
+
+    def close(self) -> None:
+        """Close the log file."""
+        self._file.close()
+
+
+class UploadJournal(AppendOnlyLog):
+    """Append-only JSONL journal of finished upload work.
+
+    Records uploaded files (by point name and content hash) and created tasks,
+    so that an interrupted upload can be rerun without repeating finished work.
+    """
+
+    def __init__(self, path: str) -> None:
+        """Open (or create) the journal at path."""
+        self._files: Dict[str, str] = {}
+        self._tasks: Dict[str, Dict] = {}
+        super().__init__(path)
+
+    @staticmethod
+    def _file_key(name: str, file_hash: str) -> str:
+        return f"{name}\n{file_hash}"
+
+    def _load(self, entry: Dict) -> None:
+        if entry.get("type") == "file":
+            self._files[self._file_key(entry["name"], entry["hash"])] = entry[
+                "filePath"
+            ]
+        elif entry.get("type") == "task":
+            self._tasks[entry["name"]] = entry["task"]
+
+    def get_file(self, name: str, file_hash: str) -> Optional[str]:
+        """Get the uploaded file path of a point's file, if already uploaded."""
+        return self._files.get(self._file_key(name, file_hash))
+
+    def add_file(self, name: str, file_hash: str, file_path: str) -> None:
+        """Record an uploaded file of a point."""
+        self._files[self._file_key(name, file_hash)] = file_path
+        self._append(
+            {"type": "file", "name": name, "hash": file_hash, "filePath": file_path}
+        )
+
+    def get_task(self, name: str) -> Optional[Dict]:
+        """Get the created task for a point, if already created."""
+        return self._tasks.get(name)
+
+    def add_task(self, name: str, task: Dict) -> None:
+        """Record a created task."""
+        self._tasks[name] = task
+        self._append({"type": "task", "name": name, "task": task})
+
+    def remove(self) -> None:
+        """Close and delete the journal."""
+        self.close()
+        if os.path.isfile(self.path):
+            os.remove(self.path)
+
+
+class UploadIndex(AppendOnlyLog):
+    """Append-only content-addressed index of files uploaded to a storage.
+
+    Maps the SHA256 of a file's contents to its uploaded `filePath`, so that
+    identical files can be referenced instead of uploaded again.
+    """
+
+    def __init__(self, org_id: str, storage_id: str) -> None:
+        """Open (or create) the index of a storage."""
+        self._files: Dict[str, str] = {}
+        super().__init__(
+            os.path.join(config_path(), "upload-index", org_id, f"{storage_id}.jsonl")
+        )
+
+    def _load(self, entry: Dict) -> None:
+        self._files[entry["hash"]] = entry["filePath"]
+
+    def get(self, file_hash: str) -> Optional[str]:
+        """Get the uploaded file path of contents with this hash, if any."""
+        return self._files.get(file_hash)
+
+    def add(self, file_hash: str, file_path: str) -> None:
+        """Record an uploaded file."""
+        if self._files.get(file_hash) == file_path:
+            return
+        self._files[file_hash] = file_path
+        self._append({"hash": file_hash, "filePath": file_path})
@@ -8,6 +8,7 @@ from redbrick import RBContext, _populate_context
 from redbrick.common.client import RBClient
 from redbrick.export import Export
 from redbrick.repo import ExportRepo
+from redbrick.upload import Upload
 from redbrick.stage import LabelStage, ReviewStage
 
 
@@ -77,3 +78,25 @@ def mock_export(
         review_stages=[ReviewStage("Review_1"), ReviewStage("Review_2")],
     )
     return export
+
+
+@pytest.fixture(scope="function")
+def mock_upload(
+    rb_context_full: RBContext,  # pylint: disable=redefined-outer-name
+) -> Upload:
+    """Get a new mock Upload object for each test"""
+    return Upload(
+        context=rb_context_full,
+        org_id="mock_org_id",
+        project_id="mock_project_id",
+        taxonomy={
+            "orgId": "mock_org_id",
+            "taxId": "mock_tax_id",
+            "name": "mock_taxonomy",
+            "studyClassify": [],
+            "seriesClassify": [],
+            "instanceClassify": [],
+            "objectTypes": [],
+            "createdAt": datetime.datetime.now().isoformat(),
+        },
+    )
@@ -0,0 +1,74 @@
+"""Fixtures for tests in `tests.test_utils.test_upload.py`"""
+
+import typing as t
+
+
+# Tasks in the documented import format, with their conversion by the server
+import_format_conversions: t.List[t.Tuple[t.Dict, t.Dict]] = [
+    (
+        {"name": "single", "series": [{"items": "scan.nii.gz"}]},
+        {
+            "name": "single",
+            "items": ["scan.nii.gz"],
+            "seriesInfo": [{"itemsIndices": [0]}],
+        },
+    ),
+    (
+        {
+            "name": "study",
+            "priority": 0.25,
+            "metaData": {"site": "A"},
+            "preAssign": {"Label": "user@example.com", "Review_1": ["a@b.com"]},
+            "series": [
+                {
+                    "name": "ct",
+                    "items": ["ct/1.dcm", "ct/2.dcm"],
+                    "metaData": {"phase": "arterial"},
+                    "segmentations": "ct-label.nii.gz",
+                },
+                {"items": "mr.nii.gz"},
+                {
+                    "name": "pet",
+                    "items": "pet.nii.gz",
+                    "segmentations": ["pet-1.nii.gz", "pet-2.nii.gz"],
+                    "binaryMask": True,
+                    "semanticMask": False,
+                },
+            ],
+        },
+        {
+            "name": "study",
+            "priority": 0.25,
+            "metaData": {"site": "A"},
+            "preAssign": {"Label": "user@example.com", "Review_1": ["a@b.com"]},
+            "items": ["ct/1.dcm", "ct/2.dcm", "mr.nii.gz", "pet.nii.gz"],
+            "seriesInfo": [
+                {
+                    "itemsIndices": [0, 1],
+                    "name": "ct",
+                    "metaData": {"phase": "arterial"},
+                },
+                {"itemsIndices": [2]},
+                {
+                    "itemsIndices": [3],
+                    "name": "pet",
+                    "binaryMask": True,
+                    "semanticMask": False,
+                },
+            ],
+            "labelsMap": [
+                {"labelName": "ct-label.nii.gz", "seriesIndex": 0},
+                None,
+                {"labelName": ["pet-1.nii.gz", "pet-2.nii.gz"], "seriesIndex": 2},
+            ],
+        },
+    ),
+    (
+        {"name": "png", "series": [{"items": ["a.png", "b.png"], "pngMask": True}]},
+        {
+            "name": "png",
+            "items": ["a.png", "b.png"],
+            "seriesInfo": [{"itemsIndices": [0, 1], "pngMask": True}],
+        },
+    ),
+]
@@ -3,8 +3,9 @@
 import argparse
 import json
 import os
+import shutil
 from datetime import datetime
-from unittest.mock import patch, Mock
+from unittest.mock import AsyncMock, patch, Mock
 
 import pytest
 
@@ -144,16 +145,12 @@ def test_handle_export(
         # call method
         controller.handle_export()
 
-        cache_hash = controller.project.conf.get_section("datapoints").get("cache")
-        assert isinstance(cache_hash, str)
+        assert "cache" not in controller.project.conf.get_section("datapoints")
+        assert controller.project.cache.get_data("datapoints", _cache_hash) is None
 
-        old_cached_task_ids = controller.project.cache.get_data(
-            "datapoints", cache_hash
-        )
-        assert old_cached_task_ids is None
-
-        cached_task_ids = controller.project.cache.get_data("tasks", cache_hash)
-        cache = controller.project.cache.get_entity(cached_task_ids[0])
+        with controller.project.cache.task_store() as store:
+            cached_task_ids = list(store.task_ids())
+            cache = store.get_task(cached_task_ids[0])
         assert cached_task_ids == ["mock_task_id"]
         assert isinstance(cache, dict)
         assert cache["taskId"] == cached_task_ids[0]
@@ -162,3 +159,120 @@ def test_handle_export(
         assert os.path.isdir(os.path.join(project_path, "segmentations"))
         assert os.path.isfile(os.path.join(project_path, "class_map.json"))
         assert os.path.isfile(os.path.join(project_path, "tasks.json"))
+
+
+@pytest.mark.unit
+def test_handle_export__incremental(mock_export_controller, monkeypatch):
+    """Test that `CLIExportController.handle_export` only re-exports changed tasks"""
+    controller: CLIExportController
+    controller, project_path = mock_export_controller
+    monkeypatch.chdir(project_path)
+
+    def _task(task_id, stage, updated_at):
+        return {
+            "taskId": task_id,
+            "name": f"name-{task_id}",
+            "currentStageName": stage,
+            "updatedAt": updated_at,
+            "labelsMap": [{"labelName": f"{task_id}.nii.gz"}],
+        }
+
+    refreshed = [_task("task-a", "Label", "1"), _task("task-b", "END", "1")]
+
+    def _export_task(task, _taxonomy, _writer, _image_dir, segmentation_dir, *_):
+        label = os.path.join(segmentation_dir, task["name"], "label.nii.gz")
+        os.makedirs(os.path.dirname(label), exist_ok=True)
+        with open(label, "wb"):
+            pass
+        return {"taskId": task["taskId"], "series": [{"segmentations": label}]}
+
+    mock_export = AsyncMock(side_effect=_export_task)
+
+    def _export(export_type=controller.TYPE_LATEST, destination="."):
+        controller.args = argparse.Namespace(
+            type=export_type,
+            with_files=False,
+            dicom_to_nifti=False,
+            old_format=False,
+            without_masks=False,
+            semantic=False,
+            binary_mask=False,
+            single_mask=False,
+            no_consensus=False,
+            png=False,
+            rt_struct=False,
+            clear_cache=False,
+            concurrency=10,
+            stage=None,
+            destination=destination,
+        )
+        controller.handle_export()
+        refreshed.clear()
+        with open(
+            os.path.join(destination, "tasks.json"), "r", encoding="utf-8"
+        ) as task_file:
+            return [task["taskId"] for task in json.load(task_file)]
+
+    export = controller.project.project.export
+    mock_count = Mock(return_value=2)
+    mock_task_ids = Mock(side_effect=lambda: ["task-a", "task-b"])
+    with patch.object(
+        controller.project.project.context.project,
+        "get_taxonomy",
+        Mock(return_value={"isNew": True, "objectTypes": []}),
+    ), patch.object(
+        controller.project.project.context.export,
+        "datapoints_in_project",
+        mock_count,
+    ), patch.object(
+        export, "_get_raw_data_latest", Mock(side_effect=lambda *_: iter(refreshed))
+    ), patch.object(
+        export, "export_nifti_label_data", mock_export
+    ), patch.object(
+        export, "_get_task_ids", mock_task_ids
+    ):
+        assert _export() == ["task-a", "task-b"]
+        assert mock_export.await_count == 2
+        assert mock_task_ids.call_count == 1
+
+        # Unchanged projects are not reconciled
+        assert _export() == ["task-a", "task-b"]
+        assert mock_export.await_count == 2
+        assert mock_task_ids.call_count == 1
+
+        refreshed.append(_task("task-b", "END", "2"))
+        assert _export() == ["task-a", "task-b"]
+        assert mock_export.await_count == 3
+        assert mock_export.await_args[0][0]["updatedAt"] == "2"
+
+        # Exported files that went missing are written again
+        task_dir = os.path.join("segmentations", "name-task-a")
+        shutil.rmtree(task_dir)
+        assert _export() == ["task-a", "task-b"]
+        assert mock_export.await_count == 4
+        assert os.path.isfile(os.path.join(task_dir, "label.nii.gz"))
+
+        # Filtered out tasks keep their outputs
+        assert _export(controller.TYPE_GROUNDTRUTH) == ["task-b"]
+        assert mock_export.await_count == 4
+        assert os.path.isdir(task_dir)
+
+        assert _export() == ["task-a", "task-b"]
+        assert mock_export.await_count == 4
+
+        # Other destinations are exported separately, without touching this one
+        assert _export(destination="other") == ["task-a", "task-b"]
+        assert mock_export.await_count == 6
+        assert os.path.isdir(task_dir)
+
+        # A deletion is noticed even when a new task keeps the count unchanged
+        image_dir = os.path.join("images", "name-task-a")
+        os.makedirs(image_dir)
+        refreshed.append(_task("task-c", "Label", "3"))
+        mock_task_ids.side_effect = lambda: ["task-b", "task-c"]
+        assert _export() == ["task-b", "task-c"]
+        assert mock_export.await_count == 7
+        assert not os.path.exists(task_dir)
+        assert not os.path.exists(image_dir)
+        with controller.project.cache.task_store() as store:
+            assert list(store.task_ids()) == ["task-b", "task-c"]
@@ -84,8 +84,10 @@ def test_handle_upload(
                 items.append({"response": None, "name": _item})
         return items
 
-    async def mock_gen_item_list(items_list, *args):
-        return [[os.path.basename(pth) for pth in _list] for _list in items_list]
+    async def mock_iter_items_list(directories, *args):
+        for _, groups in directories:
+            for group in groups:
+                yield {"items": group}
 
     def mock_get_taxonomy(
         org_id: str, tax_id: Optional[str], name: Optional[str]
@@ -99,7 +101,7 @@ def test_handle_upload(
     ), patch.object(
         controller.project.project.upload, "_create_tasks", mock_create_tasks
     ), patch.object(
-        controller.project.project.upload, "generate_items_list", mock_gen_item_list
+        controller.project.project.upload, "iter_items_list", mock_iter_items_list
     ), patch.object(
         controller.project.project.context.project, "get_taxonomy", mock_get_taxonomy
     ):
@@ -0,0 +1,114 @@
+"""Tests for redbrick.cli.entity.tasks"""
+
+import sqlite3
+
+import pytest
+
+from redbrick.cli.entity import CLITaskStore
+
+
+@pytest.mark.unit
+def test_task_store(tmpdir, monkeypatch):
+    """Test storing and filtering tasks in `CLITaskStore`"""
+    monkeypatch.setattr(CLITaskStore, "BATCH_SIZE", 2)
+    tasks = [
+        {
+            "taskId": f"task-{idx}",
+            "currentStageName": "Label" if idx % 2 else "END",
+            "updatedAt": f"2024-01-0{idx}T00:00:00+00:00",
+            "labelStorageId": "storage",
+        }
+        for idx in range(1, 6)
+    ]
+    with CLITaskStore(str(tmpdir / "tasks.db")) as store:
+        assert store.set_tasks(iter(tasks)) == 5
+        assert store.set_tasks([{**tasks[0], "currentStageName": "Review"}]) == 1
+        assert len(store) == 5
+        assert "task-1" in store and "task-6" not in store
+        assert store.get_task("task-1")["currentStageName"] == "Review"
+        assert store.get_task("task-6") is None
+
+        assert list(store.task_ids(stage_name="end")) == ["task-2", "task-4"]
+        assert list(store.task_ids(task_id="task-3")) == ["task-3"]
+        assert list(store.task_ids(updated_after="2024-01-03")) == [
+            "task-3",
+            "task-4",
+            "task-5",
+        ]
+        assert [task["taskId"] for task in store.iter_tasks()] == [
+            task["taskId"] for task in tasks
+        ]
+
+        assert store.remove_tasks(["task-1", "task-2", "task-6"]) == 2
+        assert list(store.task_ids()) == ["task-3", "task-4", "task-5"]
+
+    with CLITaskStore(str(tmpdir / "tasks.db")) as store:
+        assert len(store) == 3
+
+
+@pytest.mark.unit
+def test_task_store__exports(tmpdir, monkeypatch):
+    """Test export records of `CLITaskStore` are kept per destination"""
+    monkeypatch.setattr(CLITaskStore, "LOOKUP_BATCH_SIZE", 2)
+    with CLITaskStore(str(tmpdir / "tasks.db")) as store:
+        for task_id in ("task-1", "task-2", "task-3"):
+            store.set_export("/a", task_id, "sig", "shared", [], {"taskId": task_id})
+        store.set_export(
+            "/b", "task-1", "sig", "task-1", ["images/x.png"], {"taskId": "task-1"}
+        )
+
+        assert store.get_export("/a", "task-1") == ("sig", "shared", [])
+        assert store.get_export("/b", "task-1") == ("sig", "task-1", ["images/x.png"])
+        assert store.get_export("/c", "task-1") is None
+        assert list(store.export_ids("/a")) == ["task-1", "task-2", "task-3"]
+        assert [
+            output["taskId"]
+            for output in store.iter_exports("/a", ["task-1", "task-3", "task-4"])
+        ] == ["task-1", "task-3"]
+
+        # Directories are only released once no export in the destination uses them
+        assert store.remove_export("/a", "task-1") is None
+        assert store.remove_export("/a", "task-2") is None
+        assert store.remove_export("/a", "task-3") == "shared"
+        assert list(store.export_ids("/a")) == []
+        assert list(store.export_ids("/b")) == ["task-1"]
+
+
+@pytest.mark.unit
+def test_task_store__migrations(tmpdir, monkeypatch):
+    """Test a failed `CLITaskStore` migration leaves the previous schema intact"""
+    path = str(tmpdir / "tasks.db")
+    monkeypatch.setattr(CLITaskStore, "MIGRATIONS", ("CREATE TABLE a (x);",))
+    CLITaskStore(path).close()
+
+    monkeypatch.setattr(
+        CLITaskStore,
+        "MIGRATIONS",
+        ("CREATE TABLE a (x);", "CREATE TABLE b (x); CREATE TABLE a (x);"),
+    )
+    with pytest.raises(sqlite3.OperationalError):
+        CLITaskStore(path)
+
+    conn = sqlite3.connect(path)
+    try:
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == 1
+        assert conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table'"
+        ).fetchall() == [("a",)]
+    finally:
+        conn.close()
+
+
+@pytest.mark.unit
+def test_migrate_entities(cli_cache):
+    """Test moving per-file entities into the task store"""
+    task_ids = ["task-a", "task-b", "task-missing"]
+    for task_id in task_ids[:2]:
+        cli_cache.set_entity(task_id, {"taskId": task_id})
+
+    with cli_cache.task_store() as store:
+        assert cli_cache.migrate_entities(task_ids, store) == 2
+        assert list(store.task_ids()) == task_ids[:2]
+
+    with pytest.raises(FileNotFoundError):
+        cli_cache.get_entity("task-a")
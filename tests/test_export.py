@@ -1,5 +1,7 @@
 """Tests for redbrick.mock_export.public"""
 
+import asyncio
+import copy
 import os
 import typing as t
 from unittest.mock import patch, Mock, AsyncMock, MagicMock, mock_open
@@ -29,6 +31,24 @@ def test_get_raw_data_latest(mock_export):
     assert tasks[0]["taskId"] == mock_task_id
 
 
+@pytest.mark.unit
+def test_get_raw_data_latest__sync_token(mock_export):
+    """Test `redbrick.export.public.Export._get_raw_data_latest` with a sync token"""
+    resp = copy.deepcopy(repo_fixtures.get_datapoints_latest_resp)
+    resp["tasksPaged"]["cacheTime"] = "2023-10-21T10:00:00+00:00"
+    mock_query = Mock(return_value=resp)
+    mock_export.context.export.client.execute_query = mock_query
+
+    tasks = list(
+        mock_export._get_raw_data_latest(  # pylint: disable=protected-access
+            10, sync_token="2023-10-20T10:00:00+00:00"
+        )
+    )
+    assert len(tasks) == len(resp["tasksPaged"]["entries"])
+    assert mock_query.call_args.args[1]["cacheTime"] == "2023-10-20T10:00:00+00:00"
+    assert mock_export.sync_token == "2023-10-21T10:00:00+00:00"
+
+
 @pytest.mark.asyncio
 @pytest.mark.unit
 @pytest.mark.parametrize(
@@ -53,7 +73,9 @@ async def test_download_task_items(
         return [x[1] for x in url_path_pairs]
 
     mock_convert = AsyncMock(return_value=None)
-    mock_export.context.export.presign_items = lambda a, b, items: items
+    mock_export.context.export.presign_items_async = AsyncMock(
+        side_effect=lambda session, org_id, storage_id, items: items
+    )
     with patch("redbrick.export.public.download_files", mock_download):
         with patch("redbrick.utils.dicom.convert_nii_to_rtstruct", mock_convert):
             (
@@ -73,6 +95,35 @@ async def test_download_task_items(
     assert len(series_dirs) == len(task["series"])
 
 
+@pytest.mark.unit
+def test_presign_items__event_loops(mock_export):
+    """Ensure presign batching survives an export abandoned in another event loop"""
+    mock_export.context.export.presign_items_async = AsyncMock(
+        side_effect=lambda session, org_id, storage_id, items: [
+            f"signed:{item}" for item in items
+        ]
+    )
+
+    async def _abandoned_export():
+        presign = asyncio.ensure_future(
+            mock_export._presign_items(  # pylint: disable=protected-access
+                "storage", ["a"]
+            )
+        )
+        await asyncio.sleep(0)
+        presign.cancel()
+
+    asyncio.run(_abandoned_export())
+    assert asyncio.run(
+        asyncio.wait_for(
+            mock_export._presign_items(  # pylint: disable=protected-access
+                "storage", ["b"]
+            ),
+            5,
+        )
+    ) == ["signed:b"]
+
+
 @pytest.mark.unit
 @pytest.mark.parametrize("get_color_map", [False, True])
 def test_preprocess_export(mock_export, get_color_map):
@@ -137,27 +188,26 @@ async def test_export_nifti_label_data(mock_export, task_file, get_task, returns
             }
         ],
     }
-    open_mock = MagicMock(spec=open)
-    with patch.object(redbrick.export.public, "open", mock_open(mock=open_mock)):
-        task = await mock_export.export_nifti_label_data(
-            datapoint,
-            taxonomy,
-            task_file,
-            None,
-            None,
-            False,
-            None,
-            False,
-            False,
-            False,
-            False,
-            False,
-            False,
-            get_task,
-        )
+    task_writer = MagicMock() if task_file else None
+    task = await mock_export.export_nifti_label_data(
+        datapoint,
+        taxonomy,
+        task_writer,
+        None,
+        None,
+        False,
+        None,
+        False,
+        False,
+        False,
+        False,
+        False,
+        False,
+        get_task,
+    )
     mock_export.process_labels.assert_called_once()
     if task_file:
-        open_mock.assert_called_once()
+        task_writer.write.assert_called_once_with(task, None)
 
     if returns_task:
         assert isinstance(task, dict)
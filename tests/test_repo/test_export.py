@@ -3,7 +3,7 @@ Tests for `redbrick.export.public.ExportRepo`.
 These tests are to ensure data from the API is properly parsed.
 """
 
-from unittest.mock import Mock, patch
+from unittest.mock import AsyncMock, Mock, patch
 
 import pytest
 
@@ -54,6 +54,27 @@ def test_get_datapoints_latest(mock_export_repo):
     assert all(isinstance(x, str) for x in dp_ids)
 
 
+@pytest.mark.unit
+def test_get_task_ids(mock_export_repo):
+    """Test `redbrick.repo.export.Export.get_task_ids`"""
+    mock_query = Mock(
+        return_value={
+            "tasksPaged": {
+                "entries": [{"taskId": "task-1"}, {"taskId": "task-2"}],
+                "cursor": "mock_cursor",
+            }
+        }
+    )
+    with patch.object(mock_export_repo.client, "execute_query", mock_query):
+        entries, cursor = mock_export_repo.get_task_ids(
+            org_id="mock", project_id="mock", first=2
+        )
+
+    assert entries == [{"taskId": "task-1"}, {"taskId": "task-2"}]
+    assert cursor == "mock_cursor"
+    assert mock_query.call_args[0][1]["first"] == 2
+
+
 @pytest.mark.unit
 def test_task_search(mock_export_repo):
     """Test `redbrick.repo.export.Export.task_search`"""
@@ -85,6 +106,19 @@ def test_presign_items(mock_export_repo):
     assert len(resp) == 1
 
 
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_presign_items_async(mock_export_repo):
+    """Test `redbrick.repo.export.Export.presign_items_async`"""
+    mock_query = AsyncMock(return_value=fixtures.presign_items_resp())
+    with patch.object(mock_export_repo.client, "execute_query_async", mock_query):
+        resp = await mock_export_repo.presign_items_async(
+            Mock(), org_id="mock", storage_id="mock", items=[]
+        )
+    assert isinstance(resp, list)
+    assert len(resp) == 1
+
+
 @pytest.mark.unit
 def test_task_events(mock_export_repo):
     """Test `redbrick.repo.export.Export.task_events`"""
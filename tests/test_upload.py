@@ -0,0 +1,151 @@
+"""Tests for redbrick.upload.public"""
+
+import asyncio
+from unittest.mock import AsyncMock, Mock, patch
+
+import pytest
+
+from redbrick.common.enums import StorageMethod
+from redbrick.utils.async_utils import RequestBatcher
+from redbrick.utils.upload import UploadJournal
+
+
+def _presigned(names):
+    return [
+        {"presignedUrl": f"https://upload/{name}", "filePath": f"items/{name}"}
+        for name in names
+    ]
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_presign_task_items__batched(mock_upload):
+    """Test concurrent points are presigned in a single request"""
+    presign = AsyncMock(
+        side_effect=lambda _, items: _presigned(name for name, _ in items)
+    )
+    presigner = RequestBatcher(presign)
+    points = [
+        {"name": f"point-{idx}", "items": [f"scans/{idx}-a.dcm", f"scans/{idx}-b.dcm"]}
+        for idx in range(3)
+    ]
+
+    uploads = await asyncio.gather(
+        *(
+            mock_upload._presign_task_items(  # pylint: disable=protected-access
+                presigner, point
+            )
+            for point in points
+        )
+    )
+    presign.assert_awaited_once()
+    assert [name for name, _ in presign.await_args.args[1]] == [
+        f"{idx}-{suffix}.dcm" for idx in range(3) for suffix in "ab"
+    ]
+    assert [upload["filePath"] for upload in uploads[1]] == [
+        "items/1-a.dcm",
+        "items/1-b.dcm",
+    ]
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_stream_tasks__refreshes_stale_urls(mock_upload, tmp_path):
+    """Test expired upload urls are presigned again without re-hashing files"""
+    item = tmp_path / "scan.dcm"
+    item.write_bytes(b"scan")
+    refreshes = iter(range(2))
+    presign = AsyncMock(
+        side_effect=lambda _, names, __: _presigned(
+            [f"{name}-{next(refreshes)}" for name in names]
+        )
+    )
+    upload_items = AsyncMock(return_value=True)
+    # pylint: disable=protected-access
+    mock_upload._generate_upload_presigned_url = presign
+    mock_upload._upload_task_items = upload_items
+    mock_upload._create_task = AsyncMock(
+        side_effect=lambda _, __, point, *___: {"name": point["name"]}
+    )
+    mock_upload.context.project.get_label_storage = Mock(
+        return_value=("label_storage", None)
+    )
+
+    with patch("redbrick.upload.public.UPLOAD_URL_MAX_AGE", -1), patch(
+        "redbrick.upload.public.hash_file_sha256", Mock(return_value="hash")
+    ) as hasher, patch(
+        "redbrick.upload.public.process_segmentation_upload",
+        AsyncMock(return_value=[]),
+    ), UploadJournal(
+        str(tmp_path / "journal.jsonl")
+    ) as journal:
+        tasks = [
+            task
+            async for _, task in mock_upload._stream_tasks(
+                [{"name": "point", "items": [str(item)]}],
+                False,
+                StorageMethod.REDBRICK,
+                "label_storage",
+                False,
+                2,
+                False,
+                journal,
+            )
+        ]
+
+    assert tasks == [{"name": "point"}]
+    assert presign.await_count == 2
+    assert hasher.call_count == 1
+    uploads = upload_items.await_args.args[2]
+    assert uploads[0]["presignedUrl"] == "https://upload/scan.dcm-1"
+    assert uploads[0]["hash"] == "hash"
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_stream_datapoints__forgets_completed_names(mock_upload):
+    """Test point names are only tracked while their task is in flight"""
+    # pylint: disable=protected-access
+    prepare_points = mock_upload._prepare_points
+    uploading = []
+
+    async def _prepare_points(window, *args):
+        uploading.append(args[4])
+        return await prepare_points(window, *args)
+
+    mock_upload._prepare_points = _prepare_points
+    mock_upload._create_task = AsyncMock(
+        side_effect=lambda _, __, point, *___: {"name": point["name"]}
+    )
+    mock_upload.context.project.get_label_storage = Mock(
+        return_value=("label_storage", None)
+    )
+    points = [{"name": f"point-{idx % 3}", "items": ["scan.dcm"]} for idx in range(4)]
+
+    with patch(
+        "redbrick.upload.public.validate_json", AsyncMock(side_effect=lambda *a: a[1])
+    ), patch(
+        "redbrick.upload.public.process_segmentation_upload",
+        AsyncMock(return_value=[]),
+    ):
+        tasks = [
+            task
+            async for task in mock_upload._stream_datapoints(
+                str(StorageMethod.PUBLIC),
+                points,
+                False,
+                None,
+                False,
+                "label_storage",
+                False,
+                2,
+                None,
+            )
+        ]
+
+    assert sorted(task["name"] for task in tasks) == [
+        "point-0",
+        "point-1",
+        "point-2",
+    ]
+    assert uploading and uploading[0] == set()
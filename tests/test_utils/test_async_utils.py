@@ -1,6 +1,8 @@
 """Tests for `redbrick.utils.async_utils`."""
 
 import asyncio
+import os
+import threading
 import pytest
 
 from redbrick.utils import async_utils
@@ -88,3 +90,296 @@ async def test_gather_with_concurrency__no_tasks():
     tasks = []
     result = await async_utils.gather_with_concurrency(2, tasks)
     assert result == []
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("ordered", [True, False])
+def test_iterate_with_concurrency(ordered):
+    """Ensure `iterate_with_concurrency` bounds in-flight tasks and yields all results"""
+    in_flight = 0
+    max_in_flight = 0
+
+    async def sample_task(index):
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.01 * (5 - index))
+        in_flight -= 1
+        return index
+
+    result = list(
+        async_utils.iterate_in_event_loop(
+            async_utils.iterate_with_concurrency(
+                2, iter(range(5)), sample_task, ordered
+            )
+        )
+    )
+    assert max_in_flight == 2
+    if ordered:
+        assert result == [0, 1, 2, 3, 4]
+    else:
+        assert sorted(result) == [0, 1, 2, 3, 4]
+
+
+@pytest.mark.unit
+def test_iterate_with_concurrency__early_exit():
+    """Ensure pending tasks are cancelled when the consumer stops early"""
+    cancelled = []
+
+    async def sample_task(index):
+        try:
+            await asyncio.sleep(0.01 if index == 0 else 10)
+        except asyncio.CancelledError:
+            cancelled.append(index)
+            raise
+        return index
+
+    iterator = async_utils.iterate_in_event_loop(
+        async_utils.iterate_with_concurrency(3, range(5), sample_task)
+    )
+    assert next(iterator) == 0
+    iterator.close()
+    assert sorted(cancelled) == [1, 2]
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_adaptive_limiter():
+    """Ensure `AdaptiveLimiter` backs off on congestion and recovers additively"""
+    limiter = async_utils.AdaptiveLimiter(8, latency_window=1000)
+    assert limiter.limit == 8
+
+    start_time = await limiter.acquire()
+    await limiter.release(start_time, congested=True)
+    assert limiter.limit == 4
+
+    # Congestion from a task started before the last decrease is ignored
+    limiter.congestion(start_time)
+    assert limiter.limit == 4
+
+    for _ in range(4):
+        await limiter.release(await limiter.acquire())
+    assert limiter.limit == 5
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_adaptive_limiter__grows_and_tracks_latency():
+    """Ensure `AdaptiveLimiter` grows past its initial limit and follows latency"""
+    limiter = async_utils.AdaptiveLimiter(16, initial_limit=4, latency_window=2)
+    assert limiter.limit == 4
+    for _ in range(20):
+        limiter._record_latency(1.0)  # pylint: disable=protected-access
+    assert limiter.limit > 4
+
+    # A lasting latency increase raises the baseline instead of backing off forever
+    limit = limiter.limit
+    for _ in range(50):
+        limiter._record_latency(1.5)  # pylint: disable=protected-access
+    assert limiter.limit >= limit
+    assert limiter._baseline_p95 > 1.4  # pylint: disable=protected-access
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_gather_with_concurrency__limit():
+    """Ensure `gather_with_concurrency` only exceeds n when growth is opted in"""
+    in_flight = 0
+    max_in_flight = 0
+
+    async def sample_task(index):
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.001)
+        in_flight -= 1
+        return index
+
+    result = await async_utils.gather_with_concurrency(
+        2, [sample_task(i) for i in range(50)]
+    )
+    assert result == list(range(50))
+    assert max_in_flight == 2
+
+    max_in_flight = 0
+    await async_utils.gather_with_concurrency(
+        2, [sample_task(i) for i in range(50)], max_limit=4
+    )
+    assert 2 < max_in_flight <= 4
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_gather_with_concurrency__backs_off():
+    """Ensure `gather_with_concurrency` reduces concurrency on reported congestion"""
+    in_flight = 0
+    max_in_flight_after = 0
+
+    async def sample_task(index):
+        nonlocal in_flight, max_in_flight_after
+        in_flight += 1
+        if index >= 8:
+            max_in_flight_after = max(max_in_flight_after, in_flight)
+        async_utils.report_congestion()
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return index
+
+    tasks = [sample_task(i) for i in range(12)]
+    result = await async_utils.gather_with_concurrency(4, tasks)
+    assert result == list(range(12))
+    assert max_in_flight_after == 1
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_request_batcher():
+    """Ensure `RequestBatcher` coalesces concurrent requests per key"""
+    calls = []
+
+    async def batch_func(key, items):
+        calls.append((key, items))
+        if key == "bad":
+            raise ValueError("bad key")
+        return [f"{key}:{item}" for item in items]
+
+    batcher = async_utils.RequestBatcher(batch_func, max_batch_size=4)
+    results = await asyncio.gather(
+        batcher.submit("a", [1, 2]),
+        batcher.submit("b", [3]),
+        batcher.submit("a", [4]),
+        batcher.submit("a", []),
+        batcher.submit("bad", [5]),
+        return_exceptions=True,
+    )
+    assert results[:4] == [["a:1", "a:2"], ["b:3"], ["a:4"], []]
+    assert isinstance(results[4], ValueError)
+    assert sorted(calls) == [("a", [1, 2, 4]), ("b", [3]), ("bad", [5])]
+
+    # Batches are flushed as soon as they are full
+    calls.clear()
+    results = await asyncio.gather(*(batcher.submit("a", [i, i]) for i in range(3)))
+    assert results == [["a:0", "a:0"], ["a:1", "a:1"], ["a:2", "a:2"]]
+    assert calls == [("a", [0, 0, 1, 1]), ("a", [2, 2])]
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_request_batcher__close():
+    """Ensure `RequestBatcher.close` drops queued requests and their timers"""
+    calls = []
+
+    async def batch_func(key, items):
+        calls.append((key, items))
+        return items
+
+    batcher = async_utils.RequestBatcher(batch_func, max_delay=60)
+    submitted = asyncio.ensure_future(batcher.submit("a", [1]))
+    await asyncio.sleep(0)
+    batcher.close()
+    with pytest.raises(asyncio.CancelledError):
+        await submitted
+
+    # Later requests for the same key are scheduled afresh
+    batcher.max_delay = 0
+    assert await batcher.submit("a", [2]) == [2]
+    assert calls == [("a", [2])]
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_pipeline_with_concurrency():
+    """Ensure `pipeline_with_concurrency` chains stages with bounded workers"""
+    in_flight = {"double": 0, "increment": 0}
+    max_in_flight = {"double": 0, "increment": 0}
+
+    def stage(name, func):
+        async def _run(value):
+            in_flight[name] += 1
+            max_in_flight[name] = max(max_in_flight[name], in_flight[name])
+            await asyncio.sleep(0.001 * (value % 3))
+            in_flight[name] -= 1
+            if value == 13:
+                raise ValueError("unlucky")
+            return func(value)
+
+        return _run
+
+    stages = [
+        (3, stage("double", lambda value: value * 2)),
+        (2, stage("increment", lambda value: value + 1)),
+    ]
+    result = await async_utils.pipeline_with_concurrency(
+        range(10), stages, return_exceptions=True
+    )
+    assert result == [value * 2 + 1 for value in range(10)]
+    assert max_in_flight == {"double": 3, "increment": 2}
+
+    with pytest.raises(ValueError):
+        await async_utils.pipeline_with_concurrency(range(20), stages)
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_stream_pipeline_with_concurrency():
+    """Ensure `stream_pipeline_with_concurrency` consumes items lazily"""
+    produced = []
+
+    def items():
+        for value in range(1000):
+            produced.append(value)
+            yield value
+
+    async def double(value):
+        await asyncio.sleep(0)
+        if value == 3:
+            raise ValueError("unlucky")
+        return value * 2
+
+    stream = async_utils.stream_pipeline_with_concurrency(items(), [(2, double)])
+    results = {}
+    async for idx, value in stream:
+        results[idx] = value
+        if len(results) == 10:
+            break
+    await stream.aclose()
+    assert len(produced) < 50
+    assert isinstance(results.pop(3), ValueError)
+    assert all(value == idx * 2 for idx, value in results.items())
+
+    async def async_items():
+        for value in range(5):
+            yield value
+
+    results = dict(
+        [
+            entry
+            async for entry in async_utils.stream_pipeline_with_concurrency(
+                async_items(), [(2, double), (1, double)]
+            )
+        ]
+    )
+    assert sorted(results) == [0, 1, 2, 3, 4]
+    assert results[4] == 16
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_run_in_process_pool():
+    """Ensure `run_in_process_pool` keeps a pool per name, or falls back to a thread"""
+    thread = await async_utils.run_in_process_pool(
+        "test", threading.get_ident, workers=0
+    )
+    assert thread != threading.get_ident()
+    assert "test" not in async_utils._process_pools  # pylint: disable=protected-access
+
+    try:
+        pid = await async_utils.run_in_process_pool("test", os.getpid, workers=1)
+        assert pid != os.getpid()
+        pool = async_utils.get_process_pool("test", 1)
+        assert async_utils.get_process_pool("other", 1) is not pool
+        assert async_utils.get_process_pool("test", 2) is not pool
+    finally:
+        for name in ("test", "other"):
+            async_utils.get_process_pool(name, 1).shutdown()
+            del async_utils._process_pools[name]  # pylint: disable=protected-access
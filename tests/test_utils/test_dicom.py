@@ -1,6 +1,7 @@
 """Tests for `redbrick.utils.dicom`."""
 
 import os
+import shutil
 from unittest.mock import patch
 
 import numpy as np
@@ -40,6 +41,28 @@ def test_merge_segmentations_success(
     assert np.array_equal(output_data, expected)
 
 
+@pytest.mark.unit
+def test_load_mask(tmpdir):
+    """Masks load as integers without going through float64"""
+    data = np.array([[[0, 1], [2, 300]]])
+    int_file = os.path.join(str(tmpdir), "int.nii")
+    nib.Nifti1Image(data, np.eye(4), dtype=np.int16).to_filename(int_file)
+    float_file = os.path.join(str(tmpdir), "float.nii.gz")
+    nib.Nifti1Image(data + 0.1, np.eye(4), dtype=np.float32).to_filename(float_file)
+
+    int_data = dicom.load_mask(nib.load(int_file))
+    assert isinstance(int_data, np.memmap)
+    assert int_data.dtype == np.int16
+    assert np.array_equal(int_data, data)
+
+    float_data = dicom.load_mask(nib.load(float_file))
+    assert float_data.dtype == np.uint16
+    assert np.array_equal(float_data, data)
+
+    small_data = dicom.load_mask(nib.load(float_file), np.uint8)
+    assert small_data.dtype == np.uint8
+
+
 @pytest.mark.unit
 def test_merge_segmentations_nonexistent_input_file(output_nifti_file):
     """Test when the input file does not exist"""
@@ -207,6 +230,50 @@ def test_convert_to_binary_with_high_values(tmpdir, mock_labels):
     assert nib.loadsave.load(new_files[2]).dataobj.dtype == np.uint16
 
 
+@pytest.mark.unit
+@pytest.mark.parametrize("dtype", [np.int16, np.float32])
+def test_convert_to_binary__matches_per_label_masks(tmpdir, dtype):
+    """Single-pass split writes the same bytes as masking each instance"""
+    tmpdir_path = str(tmpdir)
+    nifti_file = os.path.join(tmpdir_path, "test_input.nii.gz")
+    mock_data = np.random.default_rng(0).integers(0, 300, (8, 9, 10)).astype(dtype)
+    img = nib.Nifti1Image(mock_data, np.eye(4), dtype=dtype)
+    img.to_filename(nifti_file)
+    labels = [
+        {"dicom": {"instanceid": 1, "groupids": [2, 3, 0]}},
+        {"dicom": {"instanceid": 260, "groupids": None}},
+        {"dicom": {"instanceid": 500}},
+    ] + [{"dicom": {"instanceid": idx}} for idx in range(4, 300, 7)]
+
+    success, new_files = dicom.convert_to_binary(nifti_file, labels, tmpdir_path)
+    assert success
+
+    img = nib.load(nifti_file)
+    data = img.get_fdata(caching="unchanged")
+    expected_files = []
+    for label in labels:
+        instances = {label["dicom"]["instanceid"]} | set(
+            label["dicom"].get("groupids") or []
+        )
+        expected = np.zeros(
+            data.shape, dtype=np.uint8 if max(instances) <= 255 else np.uint16
+        )
+        for instance in instances:
+            expected[data == instance] = 1
+        if not np.any(expected):
+            continue
+        filename = os.path.join(
+            tmpdir_path, f"instance-{label['dicom']['instanceid']}.nii.gz"
+        )
+        expected_img = nib.Nifti1Image(expected, img.affine, img.header)
+        if expected.dtype == np.uint16:
+            expected_img.set_data_dtype(np.uint16)
+        expected_files.append(filename)
+        assert expected_img.to_bytes() == nib.load(filename).to_bytes()
+
+    assert new_files == expected_files
+
+
 @pytest.mark.unit
 def test_convert_to_semantic_with_binary_mask(nifti_instance_files, mock_labels):
     """Successful conversion to semantic with binary_mask=True"""
@@ -238,6 +305,69 @@ def test_convert_to_semantic_without_binary_mask(nifti_instance_files, mock_labe
     assert files == masks  # files unchanged
 
 
+@pytest.mark.unit
+@pytest.mark.parametrize("binary_mask", [True, False])
+def test_convert_to_semantic__matches_merged_segmentations(tmpdir, binary_mask):
+    """Semantic masks match merging each instance and group id in turn"""
+    tmpdir_path = str(tmpdir)
+    expected_dir = os.path.join(tmpdir_path, "expected")
+    os.makedirs(expected_dir)
+    data = np.random.default_rng(0).integers(0, 12, (6, 7, 8)).astype(np.int16)
+    labels = [
+        {"dicom": {"instanceid": 1, "groupids": [3, 4]}, "classid": 0},
+        {"dicom": {"instanceid": 3, "groupids": [7]}, "classid": 1},
+        {"dicom": {"instanceid": 5, "groupids": [4, 7, 8]}, "classid": 0},
+        {"dicom": {"instanceid": 9, "groupids": None}, "classid": 4},
+    ]
+    masks = [os.path.join(tmpdir_path, "mask.nii.gz")]
+    nib.Nifti1Image(data, np.eye(4), dtype=np.int16).to_filename(masks[0])
+    if binary_mask:
+        _, masks = dicom.convert_to_binary(masks[0], labels, tmpdir_path)
+
+    expected_files = set()
+    visited = set()
+    for label in labels:
+        category = label["classid"] + 1
+        if binary_mask:
+            expected_file = os.path.join(expected_dir, f"category-{category}.nii.gz")
+            dicom.merge_segmentations(
+                os.path.join(
+                    tmpdir_path, f"instance-{label['dicom']['instanceid']}.nii.gz"
+                ),
+                1,
+                True,
+                expected_file,
+                1,
+            )
+        else:
+            expected_file = os.path.join(expected_dir, "mask.nii.gz")
+            for instance in [label["dicom"]["instanceid"]] + [
+                group_id
+                for group_id in label["dicom"]["groupids"] or []
+                if group_id not in visited
+            ]:
+                dicom.merge_segmentations(
+                    masks[0], instance, True, expected_file, category
+                )
+                visited.add(instance)
+        expected_files.add(expected_file)
+
+    result, files = dicom.convert_to_semantic(
+        masks, {"isNew": True}, labels, tmpdir_path, binary_mask
+    )
+    assert result is True
+    assert sorted(os.path.basename(file) for file in files) == sorted(
+        os.path.basename(file) for file in expected_files
+    )
+    for file in files:
+        expected_img = nib.load(os.path.join(expected_dir, os.path.basename(file)))
+        new_img = nib.load(file)
+        assert new_img.get_data_dtype() == np.uint16
+        assert np.array_equal(
+            np.asanyarray(new_img.dataobj), np.asanyarray(expected_img.dataobj)
+        )
+
+
 @pytest.mark.unit
 def test_convert_to_semantic_unsupported_taxonomy(nifti_instance_files, mock_labels):
     """Failed conversion due to unsupported taxonomy"""
@@ -466,6 +596,30 @@ async def test_process_nifti_download(
         assert all(x.endswith(".png") for x in masks)
 
 
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_process_nifti_download__process_pool(
+    nifti_instance_files_png, mock_labels
+):
+    """Test dicom.process_nifti_download offloaded to the mask process pool"""
+    labels_path = nifti_instance_files_png[0]
+    with patch.object(dicom.config, "_state", {"mask_workers": 2}):
+        result = await dicom.process_nifti_download(
+            mock_labels[:2],
+            labels_path,
+            png_mask=False,
+            color_map={},
+            semantic_mask=False,
+            binary_mask=True,
+            taxonomy={"isNew": True},
+            volume_index=1,
+        )
+
+    assert result["binary_mask"] is True
+    assert len(result["masks"]) == 2
+    assert all(os.path.isfile(mask) for mask in result["masks"])
+
+
 @pytest.mark.unit
 @pytest.mark.asyncio
 async def test_process_nifti_upload(tmpdir, nifti_instance_files_png):
@@ -521,6 +675,22 @@ async def test_process_nifti_upload(tmpdir, nifti_instance_files_png):
         assert np.all(mask == expected_masks[instance_id])
 
 
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_process_nifti_upload__process_pool(nifti_instance_files_png):
+    """Test dicom.process_nifti_upload offloaded to the segmentation process pool"""
+    files = nifti_instance_files_png
+    instances = {1, 2, 3, 4, 5, 9}
+    with patch.object(dicom.config, "_state", {"segmentation_workers": 2}):
+        result, group_map = await dicom.process_nifti_upload(
+            files, {inst: None for inst in instances}, True, False, False, {}, True
+        )
+
+    assert isinstance(result, str) and os.path.isfile(result)
+    assert set(group_map) == instances
+    shutil.rmtree(os.path.dirname(result))
+
+
 @pytest.mark.unit
 @pytest.mark.asyncio
 @pytest.mark.parametrize(
@@ -601,3 +771,63 @@ def test_merge_rtstructs(create_rtstructs):
     assert "ROI2" in roi_names
     assert "ROI3" in roi_names
     assert "ROI4" in roi_names
+
+
+@pytest.mark.unit
+def test_group_dicom_series(tmp_path):
+    """Test grouping DICOM files into series and studies from their headers"""
+    import gzip
+    import pydicom  # type: ignore
+
+    study_uid = pydicom.uid.generate_uid()
+    series_uids = [pydicom.uid.generate_uid(), pydicom.uid.generate_uid()]
+    paths = []
+    for series_idx, series_uid in enumerate(series_uids):
+        for slice_idx in range(3):
+            meta = pydicom.dataset.FileMetaDataset()
+            meta.MediaStorageSOPClassUID = pydicom.uid.MRImageStorage
+            meta.MediaStorageSOPInstanceUID = pydicom.uid.generate_uid()
+            meta.TransferSyntaxUID = pydicom.uid.ExplicitVRLittleEndian
+            dataset = pydicom.dataset.FileDataset(
+                "", {}, file_meta=meta, preamble=b"\0" * 128
+            )
+            dataset.is_little_endian = True
+            dataset.is_implicit_VR = False
+            dataset.StudyInstanceUID = study_uid
+            dataset.SeriesInstanceUID = series_uid
+            dataset.SeriesNumber = 2 - series_idx
+            # instance numbers disagree with slice positions
+            dataset.InstanceNumber = slice_idx + 1
+            dataset.ImagePositionPatient = [0, 0, 10 - slice_idx]
+            dataset.ImageOrientationPatient = [1, 0, 0, 0, 1, 0]
+            dataset.BitsAllocated = 16
+            dataset.PixelData = b"\0\0"
+            path = str(tmp_path / f"{series_idx}_{slice_idx}.dcm")
+            dataset.save_as(path, write_like_original=False)
+            paths.append(path)
+
+    with open(paths[0], "rb") as file_:
+        data = file_.read()
+    with gzip.open(paths[0] + ".gz", "wb") as file_:
+        file_.write(data)
+    os.remove(paths[0])
+    paths[0] += ".gz"
+    (tmp_path / "notes.txt").write_text("not dicom")
+    items = paths + [str(tmp_path / "notes.txt")]
+
+    assert dicom.read_dicom_header(str(tmp_path / "notes.txt")) is None
+    assert dicom.read_dicom_header(paths[0])["seriesId"] == series_uids[0]
+
+    series = dicom.group_dicom_series([items], False)
+    assert series == [
+        {"items": [paths[5], paths[4], paths[3]]},
+        {"items": [paths[2], paths[1], paths[0]]},
+    ]
+
+    studies = dicom.group_dicom_series([items], True)
+    assert studies == [
+        {
+            "items": [paths[5], paths[4], paths[3], paths[2], paths[1], paths[0]],
+            "seriesInfo": [{"itemsIndices": [0, 1, 2]}, {"itemsIndices": [3, 4, 5]}],
+        }
+    ]
@@ -1,12 +1,15 @@
 """Tests for `redbrick.utils.files`."""
 
 import gzip
+import json
 import os
 from functools import reduce
 from operator import add
+from typing import List
 from unittest.mock import patch, MagicMock
 
 import pytest
+from tenacity.wait import wait_none
 
 from redbrick.utils import files
 
@@ -44,6 +47,36 @@ def test_find_files_recursive(create_temporary_files):
     assert set(reduce(add, result)) == set(file_paths[:4])
 
 
+@pytest.mark.unit
+def test_iter_files_recursive(tmp_path):
+    """Test files.iter_files_recursive yields directories in depth-first order"""
+    for name in ("a/1.dcm", "a/2.dcm", "a/b/3.dcm", "a/b/c/4.dcm", "d/5.dcm", "6.dcm"):
+        (tmp_path / name).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / name).write_bytes(b"")
+    (tmp_path / "a" / ".hidden").write_bytes(b"")
+
+    root = str(tmp_path)
+    result = list(files.iter_files_recursive(root, {"dcm"}, workers=4))
+    # depth-first, in listing order, with sub-directories before their parent
+    assert [directory for directory, _ in result] == [
+        directory for directory, _, _ in os.walk(root, topdown=False)
+    ]
+    assert result == list(files.iter_files_recursive(root, {"dcm"}, workers=1))
+    groups = dict(result)
+    assert sorted(groups[os.path.join(root, "a")]) == [
+        [os.path.join(root, "a", "1.dcm")],
+        [os.path.join(root, "a", "2.dcm")],
+    ]
+
+    # only leaf directories with a single file type are grouped
+    groups = dict(files.iter_files_recursive(root, {"dcm"}, multiple=True))
+    assert groups[os.path.join(root, "a", "b", "c")] == [
+        [os.path.join(root, "a", "b", "c", "4.dcm")]
+    ]
+    assert not groups[os.path.join(root, "a")]
+    assert not list(files.iter_files_recursive(os.path.join(root, "x"), {"*"}))
+
+
 @pytest.mark.unit
 def test_uniquify_path(create_temporary_files):
     """Test files.uniquify_path function"""
@@ -132,6 +165,84 @@ async def test_upload_files__uncompressed_file(create_temporary_files):
     # assert upload_dataset == file_dataset
 
 
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_upload_files__block_blob(tmpdir):
+    """Test files.upload_files uploads large files as parallel blob blocks"""
+    path = str(tmpdir / "large.dcm")
+    data = bytes(range(25))
+    with open(path, "wb") as file_:
+        file_.write(data)
+    url = "https://account.blob.core.windows.net/container/large.dcm?sv=1&sig=abc"
+
+    mock_response = MagicMock()
+    files.config.multipart_threshold = 10
+    try:
+        with patch.object(files, "UPLOAD_PART_SIZE", 10), patch(
+            "aiohttp.ClientSession.put", return_value=mock_response
+        ) as mock_session:
+            mock_response.__aenter__.return_value.status = 201
+            result = await files.upload_files([(path, url, "application/dicom")])
+    finally:
+        del files.config.multipart_threshold
+
+    assert result == [True]
+    assert mock_session.call_count == 4
+    *blocks, commit = mock_session.mock_calls
+    assert sorted(call[2]["data"] for call in blocks) == [
+        data[:10],
+        data[10:20],
+        data[20:],
+    ]
+    assert all(f"{url}&comp=block&blockid=" in call[1][0] for call in blocks)
+    assert commit[1][0] == f"{url}&comp=blocklist"
+    assert commit[2]["data"].count("<Latest>") == 3
+    assert commit[2]["headers"]["x-ms-blob-content-type"] == "application/dicom"
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_upload_files__block_blob_commit_retry(tmpdir):
+    """Test files.upload_files retries a failed block list commit"""
+    path = str(tmpdir / "large.dcm")
+    with open(path, "wb") as file_:
+        file_.write(bytes(range(25)))
+    url = "https://account.blob.core.windows.net/container/large.dcm?sv=1&sig=abc"
+    commits: List[str] = []
+
+    def mock_put(request_url, **_):
+        response = MagicMock()
+        response.__aenter__.return_value.status = (
+            503 if request_url.endswith("comp=blocklist") and not commits else 201
+        )
+        if request_url.endswith("comp=blocklist"):
+            commits.append(request_url)
+        return response
+
+    files.config.multipart_threshold = 10
+    try:
+        with patch.object(files, "UPLOAD_PART_SIZE", 10), patch.object(
+            files, "wait_random_exponential", return_value=wait_none()
+        ), patch("aiohttp.ClientSession.put", side_effect=mock_put) as mock_session:
+            result = await files.upload_files([(path, url, "application/dicom")])
+    finally:
+        del files.config.multipart_threshold
+
+    assert result == [True]
+    assert mock_session.call_count == 5
+    assert commits == [f"{url}&comp=blocklist"] * 2
+
+
+def mock_chunks(data: bytes, chunk_size: int = 4):
+    """Mock `aiohttp.StreamReader.iter_chunked` over the given data"""
+
+    async def iter_chunked(_):
+        for idx in range(0, len(data), chunk_size):
+            yield data[idx : idx + chunk_size]
+
+    return iter_chunked
+
+
 @pytest.mark.unit
 @pytest.mark.asyncio
 async def test_download_files(tmpdir):
@@ -144,10 +255,115 @@ async def test_download_files(tmpdir):
     with patch("aiohttp.ClientSession.get", return_value=mock_response):
         mock_response.__aenter__.return_value.status = 200
         mock_response.__aenter__.return_value.headers = {}
-        mock_response.__aenter__.return_value.read.return_value = mock_data
+        mock_response.__aenter__.return_value.content.iter_chunked = mock_chunks(
+            mock_data
+        )
         result = await files.download_files([("mock_url", download_path)], zipped=True)
 
     assert result == [download_path + ".gz"]
     assert os.path.isfile(result[0])
     with open(result[0], "rb") as file:
         assert gzip.decompress(file.read()) == mock_data
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_download_files__shared_session(tmpdir, rb_client):
+    """Test files.download_files reuses the client's pooled session"""
+    mock_response = MagicMock()
+    with patch("aiohttp.ClientSession.get", return_value=mock_response):
+        mock_response.__aenter__.return_value.status = 200
+        mock_response.__aenter__.return_value.headers = {}
+        mock_response.__aenter__.return_value.content.iter_chunked = mock_chunks(
+            b"data"
+        )
+        async with rb_client.aio_session() as session:
+            async with rb_client.aio_session() as nested_session:
+                assert nested_session is session
+                result = await files.download_files(
+                    [("mock_url", str(tmpdir / "test"))], session=nested_session
+                )
+            assert not session.closed
+        assert session.closed
+
+    assert result == [str(tmpdir / "test")]
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+@pytest.mark.parametrize("members", [1, 2])
+async def test_download_files__streamed_decompress(tmpdir, members):
+    """Test files.download_files decompresses gzip-encoded bodies while streaming"""
+    mock_data = b"some random data" * 1000
+    body = b"".join(gzip.compress(mock_data) for _ in range(members))
+    mock_response = MagicMock()
+    with patch("aiohttp.ClientSession.get", return_value=mock_response):
+        mock_response.__aenter__.return_value.status = 200
+        mock_response.__aenter__.return_value.headers = {"Content-Encoding": "gzip"}
+        mock_response.__aenter__.return_value.content.iter_chunked = mock_chunks(
+            body, 7
+        )
+        result = await files.download_files([("mock_url", str(tmpdir / "test"))])
+
+    assert result == [str(tmpdir / "test")]
+    assert os.listdir(str(tmpdir)) == ["test"]
+    with open(result[0], "rb") as file:
+        assert file.read() == mock_data * members
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "body",
+    [
+        b"\x1f\x8b" + b"not really gzip" * 1000,
+        gzip.compress(b"truncated" * 1000)[:-10],
+    ],
+    ids=["not_gzipped", "truncated"],
+)
+async def test_download_files__not_gzipped(tmpdir, body):
+    """Test files.download_files keeps the raw body if it is not a complete gzip stream"""
+    mock_response = MagicMock()
+    with patch("aiohttp.ClientSession.get", return_value=mock_response) as mock_get:
+        mock_response.__aenter__.return_value.status = 200
+        mock_response.__aenter__.return_value.headers = {"Content-Encoding": "gzip"}
+        mock_response.__aenter__.return_value.content.iter_chunked = mock_chunks(
+            body, 7
+        )
+        result = await files.download_files([("mock_url", str(tmpdir / "test"))])
+
+    # The body is requested again rather than buffered for the fallback
+    assert mock_get.call_count == 2
+    with open(result[0], "rb") as file:
+        assert file.read() == body
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("json_lines", [False, True])
+def test_json_stream_writer(tmpdir, json_lines):
+    """Test files.JSONStreamWriter writes, orders and finalizes atomically"""
+    path = str(tmpdir / "tasks.json")
+
+    def _read():
+        with open(path, "r", encoding="utf-8") as file:
+            if json_lines:
+                return [json.loads(line) for line in file]
+            return json.load(file)
+
+    with files.JSONStreamWriter(path, json_lines, True, 3) as writer:
+        for idx in [5, 2, 8, 1, 9, 0, 4]:
+            writer.write({"id": idx, "text": "a\nb"}, f"task-{idx}")
+        assert not os.path.exists(path)
+    assert [record["id"] for record in _read()] == [0, 1, 2, 4, 5, 8, 9]
+
+    with pytest.raises(RuntimeError):
+        with files.JSONStreamWriter(path, json_lines) as writer:
+            writer.write({"id": 10})
+            raise RuntimeError
+    assert len(_read()) == 7
+    assert os.listdir(str(tmpdir)) == ["tasks.json"]
+
+    with files.JSONStreamWriter(path, json_lines, flush_size=2) as writer:
+        for idx in [3, 1, 2]:
+            writer.write(idx)
+    assert _read() == [3, 1, 2]
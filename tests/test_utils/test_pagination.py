@@ -119,3 +119,16 @@ def test_pagination_iterator_multiple_iterations():
     items = next(iterator)
     assert len(items) == 1
     assert len(iterator) == 5
+
+
+@pytest.mark.unit
+def test_pagination_iterator_watermark():
+    """Ensure the first non-empty extra value is kept as the watermark"""
+    pages = {
+        None: ([{"id": 0}], "page2", "first"),
+        "page2": ([{"id": 1}], None, "last"),
+    }
+    iterator = pagination.PaginationIterator(lambda _, cursor: pages[cursor])
+    assert iterator.watermark is None
+    assert list(iterator) == [{"id": 0}, {"id": 1}]
+    assert iterator.watermark == "first"
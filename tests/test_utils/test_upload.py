@@ -3,15 +3,17 @@
 from unittest.mock import Mock, patch, AsyncMock
 
 import pytest
+from redbrick.config import config
 from redbrick.common.enums import StorageMethod
 
 from redbrick.utils import upload
+from tests.fixtures import upload as upload_fixtures
 
 
 @pytest.mark.unit
 @pytest.mark.asyncio
 @pytest.mark.parametrize("valid_state", [True, False])
-async def test_validate_json(valid_state):
+async def test_validate_json(valid_state, rb_client):
     """Check upload.validate_json handles valid and invalid payloads correctly"""
     input_data = [
         {"name": "item1"},
@@ -23,6 +25,7 @@ async def test_validate_json(valid_state):
 
     # mock repo upload method
     mock_rb_context = AsyncMock()
+    mock_rb_context.client = rb_client
 
     async def mock_validate_and_convert(
         arg1, input_, *args
@@ -43,6 +46,89 @@ async def test_validate_json(valid_state):
         assert result == []
 
 
+@pytest.mark.unit
+@pytest.mark.parametrize("task, converted", upload_fixtures.import_format_conversions)
+def test_convert_to_import_format(task, converted):
+    """Check local conversion matches the server's on representative tasks"""
+    assert upload.convert_to_import_format(task) == converted
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_validate_json__local(rb_client):
+    """Check upload.validate_json converts plain tasks locally, and the rest remotely"""
+    input_data = [
+        {
+            "name": "task1",
+            "priority": 0.5,
+            "metaData": {"key": "value"},
+            "series": [
+                {"name": "ct", "items": "ct.dcm", "segmentations": "ct.nii.gz"},
+                {"items": ["mr1.dcm", "mr2.dcm"], "metaData": {"k": "v"}},
+            ],
+        },
+        {"name": "task2", "series": [{"items": "a.png", "landmarks": []}]},
+        {"name": "task3", "series": [{"items": "b.png"}]},
+    ]
+
+    mock_rb_context = AsyncMock()
+    mock_rb_context.client = rb_client
+    mock_rb_context.upload.validate_and_convert_to_import_format.return_value = {
+        "isValid": True,
+        "converted": '[{"name": "task2", "items": ["a.png"]}]',
+    }
+
+    chunks = []
+
+    async def mock_run_in_process_pool(pool, func, tasks, workers, **_):
+        chunks.append((pool, len(tasks), workers))
+        return func(tasks)
+
+    with patch.object(upload, "run_in_process_pool", mock_run_in_process_pool):
+        config.validation_workers = 2
+        try:
+            result = await upload.validate_json(
+                mock_rb_context, input_data, "storage_id", 2
+            )
+        finally:
+            del config.validation_workers
+    assert chunks == [("validation", 2, 2), ("validation", 1, 2)]
+    assert result == [
+        {
+            "name": "task1",
+            "priority": 0.5,
+            "metaData": {"key": "value"},
+            "items": ["ct.dcm", "mr1.dcm", "mr2.dcm"],
+            "seriesInfo": [
+                {"itemsIndices": [0], "name": "ct"},
+                {"itemsIndices": [1, 2], "metaData": {"k": "v"}},
+            ],
+            "labelsMap": [{"labelName": "ct.nii.gz", "seriesIndex": 0}, None],
+        },
+        {"name": "task2", "items": ["a.png"]},
+        {"name": "task3", "items": ["b.png"], "seriesInfo": [{"itemsIndices": [0]}]},
+    ]
+    validate = mock_rb_context.upload.validate_and_convert_to_import_format
+    validate.assert_awaited_once()
+    assert '"task2"' in validate.await_args.args[1]
+
+    # Server batches converted to a different number of tasks are kept whole
+    mock_rb_context.upload.validate_and_convert_to_import_format.return_value = {
+        "isValid": True,
+        "converted": '[{"name": "task2"}, {"name": "task4"}]',
+    }
+    result = await upload.validate_json(mock_rb_context, input_data, "storage_id", 2)
+    assert [task["name"] for task in result] == ["task1", "task2", "task4", "task3"]
+
+    assert upload.convert_to_import_format({"name": "x", "series": []}) is None
+    assert (
+        upload.convert_to_import_format(
+            {"name": "x", "priority": 2, "series": [{"items": "a.png"}]}
+        )
+        is None
+    )
+
+
 @pytest.mark.unit
 @pytest.mark.asyncio
 async def test_process_segmentation_upload(
@@ -95,3 +181,44 @@ async def test_process_segmentation_upload(
             )
 
     assert result == [{"labelName": "file_path", "seriesIndex": 0}]
+
+
+@pytest.mark.unit
+def test_upload_journal(tmp_path):
+    """Check UploadJournal persists entries and tolerates truncated lines"""
+    path = str(tmp_path / "journal" / "upload.jsonl")
+    with upload.UploadJournal(path) as journal:
+        journal.add_file("point1", "abc", "items/file1.nii")
+        journal.add_task("point1", {"name": "point1", "response": {"ok": True}})
+    with open(path, "a", encoding="utf-8") as file_:
+        file_.write('{"type":"file","name":"point2"')
+
+    journal = upload.UploadJournal(path)
+    assert journal.get_file("point1", "abc") == "items/file1.nii"
+    assert journal.get_file("point1", "def") is None
+    assert journal.get_file("point2", "abc") is None
+    assert journal.get_task("point1") == {
+        "name": "point1",
+        "response": {"ok": True},
+    }
+    assert journal.get_task("point2") is None
+    journal.remove()
+    assert not (tmp_path / "journal" / "upload.jsonl").exists()
+
+
+@pytest.mark.unit
+def test_upload_index(tmp_path):
+    """Check UploadIndex persists file paths by content hash per storage"""
+    with patch.object(upload, "config_path", return_value=str(tmp_path)):
+        with upload.UploadIndex("org", "storage") as index:
+            assert index.get("abc") is None
+            index.add("abc", "items/file1.nii")
+            index.add("abc", "items/file1.nii")
+
+        with upload.UploadIndex("org", "storage") as index:
+            assert index.get("abc") == "items/file1.nii"
+        with upload.UploadIndex("org", "other") as index:
+            assert index.get("abc") is None
+
+    with open(tmp_path / "upload-index" / "org" / "storage.jsonl", "rb") as file_:
+        assert len(file_.readlines()) == 1